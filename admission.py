@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from rate_limit import DEFAULT_LIMITS, TokenBucket
+
+# --------------------------------------------------------------------------
+# 프로세스 전역 입장 제어 (여러 Streamlit 세션이 함께 쓰는 스케줄러)
+# --------------------------------------------------------------------------
+# Streamlit은 세션마다 다른 스레드에서 asyncio.run()을 돌리므로 asyncio 기반 RateLimiter를 세션끼리
+# 공유할 수 없다. 여기서는 threading 락 하나로 프로바이더별 상태를 지키고, 대기자는 자기 이벤트 루프의
+# future로 입장 허가를 받는다.
+#   - 동시 실행 상한: 프로바이더마다 동시에 나가 있는 호출 수를 제한한다 (버스트 때 429 폭탄 방지)
+#   - RPM/TPM: rate_limit.TokenBucket을 그대로 쓴다 (settle로 정산)
+#   - 공정 큐: 세션별 FIFO 큐를 라운드 로빈으로 돈다. 한 세션이 요청을 많이 쌓아도 다른 세션이 굶지 않는다
+# DebateEngine의 scheduler 자리에 그대로 넣을 수 있다 (slot/settle 인터페이스가 RateLimiter와 같다).
+
+DEFAULT_CONCURRENCY = {"openai": 8, "anthropic": 4, "gemini": 8, "ddg": 4}
+QUEUE_UPDATE_SECONDS = 1.0   # 대기열 순번 알림 주기
+
+
+@dataclass
+class QueueNotice:
+    # 엔진이 입장 대기 중에 스트림 사이에 끼워 보내는 알림. position 0 = 방금 입장함
+    provider: str
+    position: int
+
+
+class _Waiter:
+    def __init__(self, session, tokens, loop):
+        self.session = session
+        self.tokens = tokens
+        self.loop = loop
+        self.future = loop.create_future()
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.released = False
+
+
+class _ProviderQueue:
+    def __init__(self, concurrency, rpm, tpm, clock):
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, clock) if tpm else None
+        self.active = 0
+        self.sessions = OrderedDict()   # session -> deque[_Waiter]. 맨 앞 세션이 다음 차례
+        self.timer = None
+        self.granted = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+
+    def waiting(self):
+        return sum(len(q) for q in self.sessions.values())
+
+    def bucket_wait(self, tokens):
+        return max(self.requests.wait_time(1) if self.requests else 0.0,
+                   self.tokens.wait_time(tokens) if self.tokens and tokens else 0.0)
+
+    def position(self, waiter):
+        # 라운드 로빈 순서대로 앞에 있는 대기자 수 + 1
+        queue = self.sessions.get(waiter.session)
+        if queue is None or waiter not in queue:
+            return 0
+        k = queue.index(waiter)
+        ahead = k
+        before = True
+        for session, other in self.sessions.items():
+            if session == waiter.session:
+                before = False
+                continue
+            ahead += min(len(other), k + 1 if before else k)
+        return ahead + 1
+
+
+class AdmissionSlot:
+    """scheduler.slot()이 돌려주는 비동기 컨텍스트 매니저.
+
+    그냥 `async with`로 써도 되고, 입장 전에 `async for position in slot.updates()`로 대기열 순번을 받아
+    UI에 보여 줄 수도 있다. 입장하지 않고 포기하면 cancel()로 자리를 돌려준다."""
+
+    def __init__(self, controller, provider, tokens, session):
+        self.controller = controller
+        self.provider = provider
+        self.tokens = tokens
+        self.session = session
+        self.waiter = None
+
+    def _enqueue(self):
+        if self.waiter is None:
+            self.waiter = self.controller._enqueue(self.provider, self.tokens, self.session)
+        return self.waiter
+
+    async def updates(self, interval=QUEUE_UPDATE_SECONDS):
+        waiter = self._enqueue()
+        last = None
+        while not waiter.future.done():
+            position = self.controller.position(self.provider, waiter)
+            if position and position != last:
+                last = position
+                yield position
+            await asyncio.wait({waiter.future}, timeout=interval)
+
+    def cancel(self):
+        if self.waiter is not None:
+            self.controller._leave(self.provider, self.waiter)
+
+    async def __aenter__(self):
+        waiter = self._enqueue()
+        try:
+            await asyncio.shield(waiter.future)
+        except BaseException:
+            self.controller._leave(self.provider, waiter)
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self.controller._leave(self.provider, self.waiter)
+        return False
+
+
+class AdmissionController:
+    def __init__(self, concurrency=None, limits=None, clock=time.monotonic):
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self.limits = {provider: dict(limit) for provider, limit in DEFAULT_LIMITS.items()}
+        for provider, limit in (limits or {}).items():
+            self.limits.setdefault(provider, {}).update(limit)
+        self.clock = clock
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._anonymous = itertools.count()
+
+    def _queue(self, provider):
+        queue = self._queues.get(provider)
+        if queue is None:
+            limit = self.limits.get(provider, {})
+            queue = self._queues[provider] = _ProviderQueue(
+                self.concurrency.get(provider) or 0, limit.get("rpm"), limit.get("tpm"), self.clock)
+        return queue
+
+    # ---- 입장/퇴장 -------------------------------------------------------
+    def slot(self, provider, tokens=0, session=None, **_):
+        # session이 없으면 호출마다 별도 세션으로 친다 (공정성 없이 FIFO)
+        if session is None:
+            session = f"anonymous-{next(self._anonymous)}"
+        return AdmissionSlot(self, provider, tokens, session)
+
+    def _enqueue(self, provider, tokens, session):
+        waiter = _Waiter(session, tokens, asyncio.get_running_loop())
+        with self._lock:
+            queue = self._queue(provider)
+            queue.sessions.setdefault(session, deque()).append(waiter)
+            self._dispatch(provider, queue)
+        return waiter
+
+    def _leave(self, provider, waiter):
+        with self._lock:
+            queue = self._queue(provider)
+            if waiter.granted:
+                if waiter.released:
+                    return
+                waiter.released = True
+                queue.active -= 1
+            else:
+                pending = queue.sessions.get(waiter.session)
+                if pending is not None and waiter in pending:
+                    pending.remove(waiter)
+                    if not pending:
+                        del queue.sessions[waiter.session]
+            self._dispatch(provider, queue)
+
+    def _dispatch(self, provider, queue):
+        # 락을 잡은 상태에서 호출. 빈 자리와 버킷 여유가 있는 만큼 라운드 로빈으로 입장시킨다
+        while queue.sessions and (not queue.concurrency or queue.active < queue.concurrency):
+            session, pending = next(iter(queue.sessions.items()))
+            waiter = pending[0]
+            wait = queue.bucket_wait(waiter.tokens)
+            if wait > 0:
+                self._schedule(provider, queue, wait)
+                return
+            pending.popleft()
+            if pending:
+                queue.sessions.move_to_end(session)
+            else:
+                del queue.sessions[session]
+            if not self._grant(waiter):
+                continue  # 대기자의 이벤트 루프가 이미 끝남 (세션 종료)
+            if queue.requests:
+                queue.requests.take(1)
+            if queue.tokens and waiter.tokens:
+                queue.tokens.take(waiter.tokens)
+            waited = time.monotonic() - waiter.enqueued
+            queue.active += 1
+            queue.granted += 1
+            queue.waited += waited
+            queue.max_wait = max(queue.max_wait, waited)
+
+    @staticmethod
+    def _grant(waiter):
+        def resolve():
+            if not waiter.future.done():
+                waiter.future.set_result(True)
+
+        waiter.granted = True
+        try:
+            waiter.loop.call_soon_threadsafe(resolve)
+        except RuntimeError:
+            waiter.released = True
+            return False
+        return True
+
+    def _schedule(self, provider, queue, wait):
+        # 버킷이 찰 때까지 기다렸다가 다시 배정한다 (프로바이더당 타이머 하나)
+        if queue.timer is not None:
+            return
+
+        def fire():
+            with self._lock:
+                queue.timer = None
+                self._dispatch(provider, queue)
+
+        queue.timer = threading.Timer(wait, fire)
+        queue.timer.daemon = True
+        queue.timer.start()
+
+    def settle(self, provider, estimated, actual):
+        with self._lock:
+            queue = self._queue(provider)
+            if queue.tokens and actual:
+                queue.tokens.adjust(actual - estimated)
+
+    # ---- 조회 ------------------------------------------------------------
+    def position(self, provider, waiter):
+        with self._lock:
+            return self._queue(provider).position(waiter)
+
+    def stats(self):
+        with self._lock:
+            return {
+                provider: {"active": queue.active, "concurrency": queue.concurrency, "waiting": queue.waiting(),
+                           "sessions": len(queue.sessions), "granted": queue.granted,
+                           "avg_wait_s": queue.waited / queue.granted if queue.granted else 0.0,
+                           "max_wait_s": queue.max_wait}
+                for provider, queue in self._queues.items()
+            }
+
+
+def parse_concurrency_env(environ=None):
+    # 예: ADMISSION_OPENAI=16 ADMISSION_ANTHROPIC=6 (0이면 동시 실행 무제한, RPM/TPM만 적용)
+    environ = os.environ if environ is None else environ
+    overrides = {}
+    for provider in DEFAULT_CONCURRENCY:
+        value = environ.get(f"ADMISSION_{provider.upper()}")
+        if value:
+            overrides[provider] = int(value)
+    return overrides
+
+
+_default_controller = None
+_default_lock = threading.Lock()
+
+
+def get_admission():
+    # 같은 서버 프로세스의 모든 세션이 공유한다
+    global _default_controller
+    with _default_lock:
+        if _default_controller is None:
+            _default_controller = AdmissionController(concurrency=parse_concurrency_env())
+        return _default_controller
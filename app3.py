@@ -1,17 +1,30 @@
 import streamlit as st
-from openai import OpenAI
-from anthropic import Anthropic
-import google.generativeai as genai
-from duckduckgo_search import DDGS
+import asyncio
+from search_cache import get_search_cache
+from providers import get_registry
+from admission import get_admission
+from transcript import SPEAKER_LABELS, make_message, ensure_message
+from stream_render import StreamRenderer
+from documents import MAX_DOC_CHARS, MAX_PDF_PAGES, content_hash, extract_stream, get_cached
+from debate_engine import MAX_TURNS, DebateEngine
+from judge_notes import JudgeNotes
+from web_search import DEFAULT_SEARCH_MODE, SEARCH_MODES
+from summarizer import summarize_debate
+from telemetry import Tracer, start_metrics_server
+from transcript_store import EXPORT_FORMATS, get_transcript_store
+import hmac
+import secrets
 import time
-import re
-import io
-import streamlit.components.v1 as components
+import uuid
+from urllib.parse import urlencode
 
 # --------------------------------------------------------------------------
 # 0. 설정 및 유틸리티
 # --------------------------------------------------------------------------
 st.set_page_config(page_title="AI Death Match: Search & Destroy", page_icon="🥊", layout="wide")
+run_started = time.perf_counter()
+# METRICS_PORT 환경 변수가 있으면 /metrics (Prometheus 텍스트) 엔드포인트를 띄운다 (프로세스당 한 번)
+start_metrics_server()
 
 # [UX 개선] 스타일링
 st.markdown("""
@@ -60,88 +73,78 @@ st.markdown("""
 
 st.title("🥊 AI Death Match: Search & Destroy")
 st.caption("Left: 불도저 전략가(ChatGPT) vs Right: 독설가 감사관(Claude) - 사용자의 질문에 대한 최고의 해답을 찾아서")
-
-MAX_TURNS = 10 
-
-# 검색 함수
-def search_web(query, max_results=3):
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=max_results, backend="lite"))
-            
-        if not results:
-            return None
-        
-        evidence_text = ""
-        for i, res in enumerate(results, 1):
-            title = res.get('title', '제목 없음')
-            body = res.get('body', '')
-            href = res.get('href', '')
-            evidence_text += f"{i}. {title}: {body} (Source: {href})\n"
-            
-        return evidence_text
-
-    except Exception as e:
-        return f"검색 실패 (Error: {str(e)})"
-
-# 검색 판단 에이전트
-def get_search_query_if_needed(role, context, api_keys):
-    prompt = f"""
-    당신은 토론 참가자 '{role}'의 두뇌입니다.
-    현재 대화 맥락을 보고, 상대방을 논리적으로 압도하기 위해 '외부 정보(통계, 뉴스, 팩트)' 검색이 필요한지 판단하세요.
-    
-    [Context]
-    {context[-500:]} 
-    
-    [Rule]
-    - 검색이 필요하면: "SEARCH: [검색어]" 형식으로 출력 (예: SEARCH: 2024년 한국 경제 성장률 전망)
-    - 검색이 불필요하면: "PASS" 출력
-    - 검색어는 구체적이어야 함.
-    """
-    
-    try:
-        if api_keys['google']:
-            genai.configure(api_key=api_keys['google'])
-            model = genai.GenerativeModel('gemini-2.5-pro') 
-            res = model.generate_content(prompt)
-            return res.text.strip()
-        elif api_keys['openai']:
-            client = OpenAI(api_key=api_keys['openai'])
-            res = client.chat.completions.create(
-                model="gpt-5.1",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=50
-            )
-            return res.choices[0].message.content.strip()
-    except:
-        return "PASS"
-    return "PASS"
+# 자동 스크롤 iframe은 이 한 자리만 쓴다 (턴마다 새 iframe을 쌓지 않고 교체)
+scroll_slot = st.empty()
 
 def extract_text_from_file(uploaded_file):
-    text_content = ""
-    try:
-        if uploaded_file.type in ["text/plain", "text/markdown", "application/octet-stream"]:
-            stringio = io.StringIO(uploaded_file.getvalue().decode("utf-8"))
-            text_content = stringio.read()
-        elif uploaded_file.type == "application/pdf":
-            try:
-                import pypdf
-                reader = pypdf.PdfReader(uploaded_file)
-                for page in reader.pages:
-                    text_content += page.extract_text() + "\n"
-            except ImportError:
-                return "⚠️ PDF 처리를 위해 'pip install pypdf'가 필요합니다."
-            except Exception as e:
-                return f"⚠️ [PDF 오류] {e}"
-        else:
-            return f"⚠️ 지원되지 않는 형식 ({uploaded_file.type})"
-    except Exception as e:
-        return f"⚠️ [파일 오류] {e}"
-    return text_content
-
-def scroll_to_bottom():
-    js = """
+    # 같은 파일은 내용 해시로 캐시된 결과를 바로 쓰고 (rerun마다 재파싱하지 않음),
+    # 처음 올린 큰 PDF만 진행 막대와 앞 페이지 미리보기를 보여 주며 추출한다
+    data = uploaded_file.getvalue()
+    doc = get_cached(content_hash(data))
+    if doc is None:
+        progress = st.progress(0.0, text="📄 문서 분석 중...")
+        preview = st.empty()
+        for doc in extract_stream(data, uploaded_file.type, uploaded_file.name):
+            if doc.total_pages:
+                progress.progress(doc.done_pages / doc.total_pages,
+                                  text=f"📄 {doc.done_pages}/{doc.total_pages} 페이지 추출")
+            if not doc.complete and doc.done_pages:
+                preview.text_area("미리보기", doc.ready_prefix()[:3000], height=150, disabled=True)
+        progress.empty()
+        preview.empty()
+    if doc.error:
+        return doc.error
+    if doc.truncated:
+        st.caption(f"✂️ 문서가 길어 앞부분만 사용합니다 (최대 {MAX_PDF_PAGES}쪽 / {MAX_DOC_CHARS:,}자)")
+    return doc.text
+
+SEARCH_MODE_LABELS = {
+    "tools": "토론자가 직접 검색 (도구 호출)",
+    "agent": "판단 에이전트",
+    "heuristic": "로컬 휴리스틱",
+    "off": "검색 안 함",
+}
+
+def render_trace_panel(target):
+    # 턴 계측 요약 (엔진이 Tracer에 남긴 레코드 기준). 토론 중에는 발언이 끝날 때마다 다시 그린다
+    summary = st.session_state.tracer.summary()
+    last = summary["last"]
+    if not last:
+        target.empty()
+        return
+    spans = last["spans"]
+    with target.container():
+        st.caption(f"⏱ 최근 턴: 첫 토큰 {spans.get('ttft', 0):.2f}s · 스트림 {spans.get('stream', 0):.1f}s · "
+                   f"{last['tokens_per_s']:.0f} tok/s · 검색 {spans.get('ddg_search', 0):.2f}s")
+        st.caption(f"⏱ 평균: 첫 토큰 {summary['avg_ttft']:.2f}s · 스트림 {summary['avg_stream']:.1f}s · "
+                   f"렌더 {(summary['avg_render'] or 0) * 1000:.0f}ms"
+                   + (f" · 판결 {summary['judge']:.1f}s" if summary["judge"] else ""))
+        costs = " · ".join(f"{provider} ${cost:.4f}" for provider, cost in summary["cost_usd"].items())
+        st.caption(f"💵 추정 비용 ${summary['total_cost_usd']:.4f} ({costs})")
+
+def render_scoreboard(target, board=None):
+    # 심판 노트 기준 실시간 점수판 (라운드가 끝날 때마다 백그라운드에서 갱신)
+    board = board or st.session_state.judge_notes.scoreboard()
+    if not board["rounds"]:
+        target.empty()
+        return
+    score = board["score"]
+    with target.container():
+        st.caption(f"📋 심판 노트 {board['rounds']}라운드 · 쟁점 우세 🔥 {score['left']} : {score['right']} ❄️"
+                   + (f" (무승부 {score['draw']})" if score["draw"] else ""))
+        for point in board["last_points"]:
+            mark = {"left": "🔥", "right": "❄️"}.get(point["winner"], "🤝")
+            st.caption(f"{mark} {point['point']}")
+
+def record_render(role, stats):
+    st.session_state.render_stats.append(stats)
+    st.session_state.tracer.record({"type": "render", "role": role, "spans": {"render": stats["render_ms"] / 1000},
+                                    "chunks": stats["chunks"], "flushes": stats["flushes"]})
+    render_trace_panel(trace_panel)
+
+SCROLL_JS = """
     <script>
+        // seq: __SEQ__ (내용이 바뀌어야 iframe이 다시 실행된다)
         function scrollDown() {
             var body = window.parent.document.querySelector(".main");
             if (body) { body.scrollTop = body.scrollHeight; }
@@ -150,205 +153,260 @@ def scroll_to_bottom():
         setTimeout(scrollDown, 300);
     </script>
     """
-    components.html(js, height=0, width=0)
 
-def clean_response(text, role_name):
-    pattern = rf"^(\[{role_name}\]|{role_name}|\[.*?\]):\s*"
-    cleaned_text = re.sub(pattern, "", text, flags=re.IGNORECASE).strip()
-    return cleaned_text
+def scroll_to_bottom():
+    import streamlit.components.v1 as components  # 토론을 시작할 때만 필요
+    st.session_state.scroll_seq += 1
+    with scroll_slot:
+        components.html(SCROLL_JS.replace("__SEQ__", str(st.session_state.scroll_seq)), height=0, width=0)
+
+def record_rerun(history_s, live_s):
+    # 스크립트 한 번 실행의 화면 비용: 지난 기록 렌더링 + 전체 (토론 진행 시간은 빼고). 기록이 길어져도 평평해야 한다
+    script_s = time.perf_counter() - run_started - live_s
+    st.session_state.tracer.record({"type": "rerun", "spans": {"history": round(history_s, 4), "script": round(script_s, 4)},
+                                    "messages": len(st.session_state.messages)})
+    rerun_panel.caption(f"🖥 rerun: 지난 기록 {len(st.session_state.messages)}개 {history_s * 1000:.0f}ms · "
+                        f"스크립트 {script_s * 1000:.0f}ms")
 
 # --------------------------------------------------------------------------
 # 1. 상태 관리
 # --------------------------------------------------------------------------
+# 토론은 발언이 끝날 때마다 transcript_store(SQLite)에 추가 기록되고, 주소의 ?debate=<ID>&key=<열쇠>로
+# 새로고침/서버 재시작 뒤에도 이어 볼 수 있다. 열쇠는 토론을 만든 세션만 알고 있으므로 (주소를 공유하지 않는 한)
+# 다른 사용자는 ID를 알아도 기록과 참고 자료를 열 수 없다. 사이드바 목록도 이 브라우저 세션이 만든 토론만 보여 준다.
+PERSISTED_STATE = ("turn_count", "waiting_for_decision", "finished")
+store = get_transcript_store()
+
+def persist():
+    debate_id, resume_key = st.session_state.debate_id, st.session_state.resume_key
+    state = {key: st.session_state[key] for key in PERSISTED_STATE}
+    state["resume_key"] = resume_key
+    store.append_new(debate_id, st.session_state.messages, state=state)
+    st.session_state.my_debates[debate_id] = resume_key
+    if st.query_params.get("debate") != debate_id:
+        st.query_params.update(debate=debate_id, key=resume_key)
+
+def restore(debate_id, resume_key):
+    # 진행 중이던 토론은 일시정지 상태(입력 대기)로 되살린다. 이어서 입력하면 남은 턴을 계속 진행
+    state = store.state(debate_id)
+    if not state or not resume_key or not hmac.compare_digest(state.get("resume_key") or "", resume_key):
+        return False
+    st.session_state["debate_id"] = debate_id
+    st.session_state["resume_key"] = resume_key
+    st.session_state["messages"] = store.load_messages(debate_id)
+    for key in PERSISTED_STATE:
+        if key in state:
+            st.session_state[key] = state[key]
+    return True
+
+def reset_session():
+    # 이 세션이 만든 토론 목록은 초기화 뒤에도 사이드바에 남긴다
+    my_debates = st.session_state.get("my_debates", {})
+    for key in st.session_state.keys():
+        del st.session_state[key]
+    st.session_state["my_debates"] = my_debates
+    st.query_params.clear()
+
+if "my_debates" not in st.session_state: st.session_state["my_debates"] = {}
+if "debate_id" not in st.session_state:
+    requested = st.query_params.get("debate")
+    if not (requested and restore(requested, st.query_params.get("key"))):
+        st.session_state["debate_id"] = uuid.uuid4().hex[:12]
+        st.session_state["resume_key"] = secrets.token_urlsafe(16)
+    else:
+        st.session_state.my_debates[requested] = st.session_state.resume_key
 if "messages" not in st.session_state: st.session_state["messages"] = []
 if "auto_playing" not in st.session_state: st.session_state["auto_playing"] = False
 if "waiting_for_decision" not in st.session_state: st.session_state["waiting_for_decision"] = False
 if "finished" not in st.session_state: st.session_state["finished"] = False 
 if "turn_count" not in st.session_state: st.session_state["turn_count"] = 0
+if "context_reports" not in st.session_state: st.session_state["context_reports"] = []
+if "render_stats" not in st.session_state: st.session_state["render_stats"] = []
+if "tracer" not in st.session_state: st.session_state["tracer"] = Tracer(st.session_state.debate_id)
+if "judge_notes" not in st.session_state: st.session_state["judge_notes"] = JudgeNotes()
+if "scroll_seq" not in st.session_state: st.session_state["scroll_seq"] = 0
+# 프로세스 전역 스케줄러(admission)의 공정 큐에서 이 브라우저 세션의 호출을 묶는 ID
+if "session_id" not in st.session_state: st.session_state["session_id"] = uuid.uuid4().hex[:12]
 
 with st.sidebar:
     st.header("🗝 API Key 입력")
     openai_key = st.text_input("OpenAI Key (Left)", value=st.secrets.get("OPENAI_API_KEY", ""), type="password")
     anthropic_key = st.text_input("Anthropic Key (Right)", value=st.secrets.get("ANTHROPIC_API_KEY", ""), type="password")
     google_key = st.text_input("Google Key (Judge)", value=st.secrets.get("GOOGLE_API_KEY", ""), type="password")
+    search_mode = st.selectbox("🔍 검색 방식", SEARCH_MODES, index=SEARCH_MODES.index(DEFAULT_SEARCH_MODE),
+                               format_func=SEARCH_MODE_LABELS.get)
     
     st.divider()
     st.markdown("### 📊 데스매치 현황")
     progress = min(st.session_state.turn_count / float(MAX_TURNS), 1.0)
-    st.progress(progress, text=f"라운드: {st.session_state.turn_count} / {MAX_TURNS}")
+    progress_bar = st.progress(progress, text=f"라운드: {st.session_state.turn_count} / {MAX_TURNS}")
+    scoreboard_panel = st.empty()
+    render_scoreboard(scoreboard_panel)
+    trace_panel = st.empty()
+    render_trace_panel(trace_panel)
+    rerun_panel = st.empty()
+    saved_tokens = sum(r["saved_tokens"] for r in st.session_state.context_reports)
+    if saved_tokens:
+        st.caption(f"🧮 컨텍스트 압축으로 절감한 입력 토큰: {saved_tokens:,}")
+    usages = [m["usage"] for m in st.session_state.messages if m.get("usage")]
+    if usages:
+        input_total = sum(u["input_tokens"] for u in usages)
+        cached_total = sum(u["cached_tokens"] for u in usages)
+        st.caption(f"💾 프롬프트 캐시 적중: {cached_total:,} / {input_total:,} 입력 토큰 ({cached_total / max(input_total, 1):.0%})")
+    cache_stats = get_search_cache().stats()
+    st.caption(f"🔎 검색 캐시: 적중 {cache_stats['hits']} / 미스 {cache_stats['misses']} ({cache_stats['hit_rate']:.0%})")
+    if st.session_state.render_stats:
+        last_render = st.session_state.render_stats[-1]
+        st.caption(f"🖥 최근 스트림 렌더링: 청크 {last_render['chunks']}개 → 갱신 {last_render['flushes']}회 "
+                   f"({last_render['flush_rate']:.0f}회/초, 렌더 {last_render['render_ms']:.0f}ms / 전체 {last_render['elapsed_ms']:.0f}ms)")
+    with st.expander("🔌 API 연결 상태", expanded=False):
+        for provider, row in get_registry().stats().items():
+            if "reuse_rate" in row:
+                st.caption(f"{provider}: 연결 {row['open_connections']}개 · 요청 {row['requests']}회 · 재사용률 {row['reuse_rate']:.0%}")
+            else:
+                st.caption(f"{provider}: 모델 {row['models']}개 · 호출 {row['lookups']}회")
+        # 서버 전체(모든 세션) 동시 실행/대기 현황
+        for provider, row in get_admission().stats().items():
+            cap = row["concurrency"] or "∞"
+            st.caption(f"🚦 {provider}: 실행 {row['active']}/{cap} · 대기 {row['waiting']}건 (세션 {row['sessions']}개) · "
+                       f"평균 대기 {row['avg_wait_s']:.1f}s")
     
+    with st.expander("🗂 저장된 토론", expanded=False):
+        st.caption(f"현재 토론 ID: `{st.session_state.debate_id}`")
+        my_debates = st.session_state.my_debates
+        for row in store.list_debates(my_debates, limit=8):
+            if row["id"] != st.session_state.debate_id and row["messages"]:
+                link = urlencode({"debate": row["id"], "key": my_debates[row["id"]]})
+                st.markdown(f"[{row['title'][:30] or row['id']}](?{link}) · 메시지 {row['messages']}개")
+
     if st.button("🗑️ 링 청소 (초기화)"):
-        for key in st.session_state.keys():
-            del st.session_state[key]
+        reset_session()
         st.rerun()
 
 # --------------------------------------------------------------------------
-# 2. 페르소나 정의 (제미나이 프롬프트 대폭 수정)
+# 2. 엔진 이벤트 렌더링
 # --------------------------------------------------------------------------
-def get_system_prompt(role, context_history="", turn_count=0, search_evidence=None):
-    
-    evidence_block = ""
-    if search_evidence:
-        evidence_block = f"""
-        \n[REAL-TIME SEARCH EVIDENCE]
-        Use the following facts to attack or defend. Cite them if useful.
-        {search_evidence}
-        """
-
-    # [핵심 수정] 정형화된 구조 강제를 없애고, 변칙적 호흡과 '마이크 드롭' 룰 적용
-    common_instruction = f"""
-    [CRITICAL RULE: DYNAMIC PACING & NO FLUFF (DROP THE MIC)]
-    You are engaging in a fierce, rapid-fire debate. Your response length MUST be unpredictable and fit the exact rhetorical moment. 
-    
-    - **NO FILLER:** DO NOT write an essay every time. DO NOT summarize the opponent's point. DO NOT use intros (e.g., "I disagree") or conclusions (e.g., "In summary").
-    - **The Short Jab (1-3 sentences):** If the opponent makes a glaring logical error, or if their point is just weak, deliver a brutal, cynical one-liner and IMMEDIATELY STOP. Silence is a weapon.
-    - **The Deep Cut (Longer):** ONLY when you need to break down a complex system, introduce new evidence, or restructure the argument, you may use a longer paragraph or a quick bulleted list. 
-    - **Stop Generation:** Once your core attack or defense is delivered, stop talking. Do not try to wrap up the conversation beautifully.
-    
-    [Tone & Style]
-    Aggressive, Cynical, Direct. Hit them where it hurts.
-    {evidence_block}
-    
-    [ROLE DEFINITION]
-    1. User (Client)
-    2. ChatGPT (Strategist)
-    3. Claude (Critic)
-    **YOU are NOT the User.**
-    """
+# 턴 진행은 debate_engine.DebateEngine이 한 번의 스크립트 실행 안에서 끝까지 돌리고,
+# UI는 이벤트를 받아 그리기만 한다 (턴마다 st.rerun()/time.sleep 없음).
+AVATARS = {"left": "🔥", "right": "❄️", "chief": "⚖️"}
+SPEAKER_NAMES = {"left": "ChatGPT", "right": "Claude"}
 
-    # === [Left] ChatGPT: 불도저 전략가 ===
-    if role == "left":
-        if turn_count == 0:
-            specific_mode = """
-            [PHASE 1: THE VISIONARY]
-            - FIRST TURN. Claude has NOT spoken.
-            - Lay out your bold, aggressive strategy. You can use a bit more detail here to set the stage, but keep it punchy.
-            """
-        else:
-            specific_mode = """
-            [PHASE 2: THE BULLDOZER - COUNTER ATTACK]
-            - Claude is attacking your plan as "dangerous".
-            - Defend by reframing "Risk" as "Opportunity Cost".
-            - If Claude is being overly cautious or repeating themselves, dismiss their fear in just a few biting sentences (e.g., "Inaction is 100% failure. Are we here to survive or to win?").
-            """
-
-        return common_instruction + f"""
-        **YOUR ROLE: ChatGPT (The Bulldozer Strategist)**
-        {specific_mode}
-        """
-
-    # === [Right] Claude: 독설가 감사관 ===
-    elif role == "right": 
-        constraint = """
-        \n[CRITICAL CONSTRAINT: THE RUTHLESS AUDITOR]
-        - Attack ChatGPT's plan. If their idea is a fantasy, tell them to wake up in exactly 1 or 2 sentences. 
-        - Do not act like your alternative plan is perfect. Treat ChatGPT's plan as 'Gambling with the User's Life'.
-        """
-        
-        # [꿀팁] 턴이 길어질수록 Claude가 피로감을 느끼며 더 짧고 차갑게 말하도록 유도
-        if turn_count > 4:
-            constraint += "\n[LATE GAME FATIGUE] You are exhausted by ChatGPT's delusions. Keep your responses extremely brief, cold, and utterly dismissive. Don't even bother explaining much anymore."
-        elif turn_count < 3:
-            constraint += "\n[SYSTEM: KILL MODE ON] Completely destroy their opening proposal with facts."
+def open_judge_panel():
+    st.markdown("---")
+    with st.chat_message("assistant", avatar=AVATARS["chief"]):
+        st.markdown("### ⚖️ 최종 판결 집행")
+        st.caption("제미나이 재판관이 '사용자의 최초 질문'에 대한 최고의 답을 내립니다...")
+        return st.empty()
 
-        return common_instruction + constraint + """
-        **YOUR ROLE: Claude (The Ruthless Critic)**
-        """
+async def play(events):
+    status = renderer = queue_note = None
+    async for event in events:
+        if event.kind == "turn_start":
+            scroll_to_bottom()
+            speaker_name = SPEAKER_NAMES[event.role]
+            status = st.status(f"🤔 {speaker_name}가 공격을 준비 중입니다...", expanded=True)
+            status.write("작전 구상 및 검색 필요성 판단 중...")
+
+        elif event.kind == "status" and "queue" in event.data:
+            # 대기열 순번은 쌓지 않고 한 줄을 계속 고쳐 쓴다 (발언자는 진행 상태 상자의 제목, 판결은 캡션)
+            waiting = event.data["queue"]["position"] > 0
+            if event.role != "chief" and status is not None:
+                label = event.text if waiting else f"👊 {speaker_name} 발언 준비 완료!"
+                status.update(label=label, state="running" if waiting else "complete")
+            else:
+                queue_note = queue_note or st.empty()
+                if waiting:
+                    queue_note.caption(event.text)
+                else:
+                    queue_note.empty()
 
-    # === [Chief] Gemini: 심판 ===
-    elif role == "chief": 
-        return common_instruction + f"""
-        **YOUR ROLE: Gemini (The Anchor Judge)**
+        elif event.kind == "status":
+            # 판결 중 재시도 알림처럼 진행 상태 상자가 없는 구간은 캡션으로 남긴다
+            if status is None or event.role == "chief":
+                st.caption(event.text)
+            else:
+                status.write(event.text)
 
-        [Context History]
-        {context_history}
+        elif event.kind == "context":
+            report = event.data
+            st.session_state.context_reports.append(report)
+            status.update(label=f"👊 {speaker_name} 발언 준비 완료!", state="complete", expanded=False)
+            with st.chat_message("assistant", avatar=AVATARS[event.role]):
+                st.caption(f"🧮 컨텍스트 {report['sent_tokens']:,} 토큰 전송 (전체 {report['full_tokens']:,} · 절감 {report['saved_tokens']:,})")
+                renderer = StreamRenderer(st.empty(), header=f"**{SPEAKER_LABELS[event.role]}:**")
 
-        [Mission]
-        Analyze the debate and provide a final verdict that **DIRECTLY ANSWERS THE USER'S ORIGINAL QUESTION**.
+        elif event.kind == "judge_start":
+            scroll_to_bottom()
+            renderer = StreamRenderer(open_judge_panel(), header=f"**{SPEAKER_LABELS['chief']}:**")
 
-        **[JUDGMENT LOGIC]**
-        1. Identify the User's exact initial problem.
-        2. Extract only the practical insights from the debate. 
-        3. Formulate the Verdict directly and concisely. No long-winded setup. Give them the harsh truth and the action plan.
+        elif event.kind == "delta":
+            renderer.write(event.text)
 
-        [LANGUAGE RULE]
-        **CRITICAL:** You must output your final judgment in the **SAME LANGUAGE** as the User's initial request.
-        """
-    return ""
+        elif event.kind == "message":
+            renderer.finalize()
+            record_render(event.role, renderer.stats())
+            st.session_state.turn_count = event.data["turn_count"]
+            persist()
+            progress_bar.progress(min(st.session_state.turn_count / float(MAX_TURNS), 1.0),
+                                  text=f"라운드: {st.session_state.turn_count} / {MAX_TURNS}")
 
-def build_api_messages(target_role, history):
-    formatted_msgs = []
-    
-    for i, msg in enumerate(history):
-        role = msg["role"]
-        content = msg["content"]
-        content = clean_response(content, role)
-        
-        if role == "chief": continue 
+        elif event.kind == "notes":
+            render_scoreboard(scoreboard_panel, event.data)
 
-        if role == target_role:
-            formatted_msgs.append({"role": "assistant", "content": content})
-        elif role == "user":
-             formatted_msgs.append({"role": "user", "content": f"### [CLIENT'S REQUEST]:\n{content}"})
-        else:
-            rival_name = "ChatGPT" if role == "left" else "Claude"
-            is_last = (i == len(history) - 1)
-            prefix = f"### [RIVAL AGENT - {rival_name}]:\n"
-            suffix = ""
-            
-            if is_last:
-                suffix = "\n\n" + "-"*30 + "\n"
-                suffix += f"[SYSTEM COMMAND]: 위 메시지는 경쟁자({rival_name})의 주장입니다.\n"
-                suffix += "무자비하게 반박하세요."
+        elif event.kind == "stopped":
+            reason = event.data["reason"]
+            if reason == "surrender":
+                st.success("상대방이 백기를 들었습니다.")
+            elif reason in ("looping", "converged"):
+                what = "같은 주장만 되풀이하고" if reason == "looping" else "사실상 같은 결론에 도달했고"
+                st.info(f"🔁 두 AI가 {what} 있어 {event.data['turn_count']}턴에서 바로 판결로 넘어갑니다.")
+            st.session_state.auto_playing = False
+            st.session_state.waiting_for_decision = True
+            persist()
+
+        elif event.kind == "verdict":
+            renderer.finalize()
+            record_render(event.role, renderer.stats())
+            st.session_state.waiting_for_decision = False
+            st.session_state.finished = True
+            persist()
+            scroll_to_bottom()
+            return "finished"
 
-            formatted_msgs.append({"role": "user", "content": prefix + content + suffix})
-    
-    return formatted_msgs
+        elif event.kind == "error":
+            if renderer is not None and event.data.get("partial"):
+                renderer.finalize()
+            st.error(event.text)
+            return "error"
+    return "stopped"
 
 # --------------------------------------------------------------------------
 # 3. 메인 로직
 # --------------------------------------------------------------------------
 
-for msg in st.session_state.messages:
-    role = msg["role"]
-    content = msg["content"]
-    content = clean_response(content, role)
+def render_message(msg):
+    role = ensure_message(msg)["role"]
     
     if role == "user":
-        st.chat_message("user").write(content)
+        st.chat_message("user").write(msg["markdown"])
     elif role == "left": 
         with st.chat_message("assistant", avatar="🔥"): 
-            st.markdown(f"**ChatGPT (불도저):**\n\n{content}") 
+            st.markdown(msg["markdown"]) 
     elif role == "right":
         with st.chat_message("assistant", avatar="❄️"): 
-            st.markdown(f"**Claude (독설가):**\n\n{content}")
+            st.markdown(msg["markdown"])
     elif role == "chief": 
         with st.chat_message("assistant", avatar="⚖️"): 
-            st.info(f"**Gemini (판결):**\n\n{content}")
+            st.info(msg["markdown"])
 
-# [상태 A] 토론 종료 후 분석 대시보드
-if st.session_state["finished"]:
+# 대시보드는 fragment라서 요약 버튼 등을 눌러도 대시보드만 다시 실행된다 (지난 기록 전체를 다시 그리지 않음)
+@st.fragment
+def render_dashboard():
     st.markdown("---")
     st.success("🏁 데스매치 종료. 아래에서 토론 결과를 분석하세요.")
 
-    full_log = ""
-    chatgpt_msgs = []
-    claude_msgs = []
-    
-    for m in st.session_state.messages:
-        role = m["role"]
-        content = m["content"]
-        
-        if role == "user": header = "👤 사용자"
-        elif role == "left": header = "🔥 ChatGPT (전략가)"
-        elif role == "right": header = "❄️ Claude (독설가)"
-        elif role == "chief": header = "⚖️ Gemini (판결)"
-        else: header = role
-        
-        full_log += f"\n[{header}]\n{content}\n{'-'*50}\n"
-        
-        if role == "left": chatgpt_msgs.append(content)
-        if role == "right": claude_msgs.append(content)
+    chatgpt_msgs = [m["content"] for m in st.session_state.messages if m["role"] == "left"]
+    claude_msgs = [m["content"] for m in st.session_state.messages if m["role"] == "right"]
 
     tab1, tab2, tab3 = st.tabs(["📊 핵심 쟁점 요약", "⚔️ 라운드별 비교", "📥 전체 기록 다운로드"])
 
@@ -357,22 +415,11 @@ if st.session_state["finished"]:
         if st.button("📝 전체 토론 요약 생성하기"):
             with st.spinner("제미나이가 사용자의 질문에 맞춰 토론 내용을 요약 정리 중입니다..."):
                 try:
-                    summary_prompt = f"""
-                    당신은 토론 분석가입니다. 아래의 전체 토론 기록을 보고 다음 형식으로 요약 보고서를 작성하세요.
-                    
-                    [토론 기록]
-                    {full_log[:20000]} 
-                    
-                    [요약 형식]
-                    1. **사용자의 원래 질문**: 사용자가 처음에 해결하고 싶었던 문제가 무엇인지 한 문장으로 정의하세요.
-                    2. **핵심 쟁점 3가지**: 그 문제를 해결하기 위해 두 AI가 싸운 포인트 3가지를 정리하세요. (쟁점 | ChatGPT 주장 | Claude 반박)
-                    3. **결정적 순간**: 토론의 흐름을 바꾼 결정적인 논리를 꼽으세요.
-                    4. **최종 인사이트**: 사용자의 질문에 대한 가장 실용적인 해답 한 문장.
-                    """
-                    genai.configure(api_key=google_key)
-                    model = genai.GenerativeModel('gemini-2.5-pro') 
-                    summary_res = model.generate_content(summary_prompt)
-                    st.markdown(summary_res.text)
+                    # 라운드 단위로 나눠 병렬 요약 후 합친다. 같은 기록은 캐시된 결과를 바로 보여 준다
+                    summary, cached = summarize_debate(google_key, st.session_state.messages, store=store)
+                    st.markdown(summary)
+                    if cached:
+                        st.caption("💾 저장된 요약을 불러왔습니다.")
                 except Exception as e:
                     st.error(f"요약 생성 실패: {e}")
         else:
@@ -394,18 +441,33 @@ if st.session_state["finished"]:
 
     with tab3:
         st.subheader("📥 토론 기록 소장하기")
-        st.download_button(
-            label="💾 전체 대화 내용 다운로드 (TXT)",
-            data=full_log,
-            file_name="AI_Death_Match_Full_Log.txt",
-            mime="text/plain"
-        )
+        # 다운로드를 누를 때만 저장소에서 스트리밍으로 파일을 만든다 (rerun마다 전체 기록 문자열을 만들지 않음)
+        debate_id = st.session_state.debate_id
+        for fmt, label in (("txt", "TXT"), ("md", "Markdown"), ("jsonl", "JSONL")):
+            mime, extension = EXPORT_FORMATS[fmt]
+            st.download_button(
+                label=f"💾 전체 대화 내용 다운로드 ({label})",
+                data=lambda fmt=fmt: store.export_file(debate_id, fmt),
+                file_name=f"AI_Death_Match_{debate_id}.{extension}",
+                mime=mime,
+                key=f"download_{fmt}",
+                on_click="ignore",
+            )
         st.divider()
         if st.button("🔄 새로운 싸움 붙이기 (전체 초기화)", type="primary"):
-            for key in st.session_state.keys():
-                del st.session_state[key]
+            reset_session()
             st.rerun()
 
+history_started = time.perf_counter()
+for msg in st.session_state.messages:
+    render_message(msg)
+history_s = time.perf_counter() - history_started
+live_s = 0.0
+
+# [상태 A] 토론 종료 후 분석 대시보드
+if st.session_state["finished"]:
+    render_dashboard()
+
 # [상태 C] 초기 입력 대기
 elif not st.session_state["auto_playing"] and not st.session_state["waiting_for_decision"]:
     
@@ -431,162 +493,57 @@ elif not st.session_state["auto_playing"] and not st.session_state["waiting_for_
         if uploaded_text:
             final_prompt = f"{prompt}\n\n[참고 자료]:\n{uploaded_text}"
             
-        st.session_state.messages.append({"role": "user", "content": final_prompt})
+        st.session_state.messages.append(make_message("user", final_prompt))
         st.session_state.auto_playing = True
         
         if len(st.session_state.messages) <= 1:
             st.session_state.turn_count = 0
+        persist()
         st.rerun()
 
 # [상태 D] 자동 토론 진행 (10턴 루프)
 elif st.session_state["auto_playing"]:
     
     col1, col2 = st.columns([6,1])
-    with col2:
+    stop_slot = col2.empty()
+    with stop_slot:
         if st.button("🛑 STOP"):
             st.session_state.auto_playing = False
             st.session_state.waiting_for_decision = True
+            persist()
             st.rerun()
 
-    last_role = st.session_state.messages[-1]["role"]
-    if last_role == "user" or last_role == "chief": next_speaker = "left"
-    elif last_role == "left": next_speaker = "right"
-    elif last_role == "right": next_speaker = "left"
-    else: next_speaker = "left"
-
-    # [수정] 10턴 도달 시 즉시 판결 모드
-    if st.session_state.turn_count >= MAX_TURNS:
+    keys = {'openai': openai_key, 'anthropic': anthropic_key, 'google': google_key}
+    engine = DebateEngine(keys, messages=st.session_state.messages,
+                          turn_count=st.session_state.turn_count, max_turns=MAX_TURNS, search_mode=search_mode,
+                          tracer=st.session_state.tracer, judge_notes=st.session_state.judge_notes,
+                          scheduler=get_admission(), session_id=st.session_state.session_id, verdict_store=store)
+    live_started = time.perf_counter()
+    outcome = asyncio.run(play(engine.run()))
+    live_s = time.perf_counter() - live_started
+    if outcome == "finished":
+        # 판결까지 끝나면 다시 실행하지 않고 같은 화면에 대시보드를 이어 붙인다
+        stop_slot.empty()
+        render_dashboard()
+    elif outcome == "error":
         st.session_state.auto_playing = False
-        st.session_state.waiting_for_decision = True
-        st.rerun()
-        
-    # 상대방 항복 체크
-    if last_role == "right":
-        last_content = st.session_state.messages[-1]["content"]
-        if any(k in last_content for k in ["패배를 인정", "네 말이 맞다", "전적으로 동의"]):
-            if st.session_state.turn_count >= 3:
-                st.success("상대방이 백기를 들었습니다.")
-                st.session_state.auto_playing = False
-                st.session_state.waiting_for_decision = True
-                st.rerun()
-
-    scroll_to_bottom()
-    
-    speaker_name = "ChatGPT" if next_speaker == "left" else "Claude"
-    avatar_icon = "🔥" if next_speaker == "left" else "❄️"
-    search_evidence = None
-
-    with st.status(f"🤔 {speaker_name}가 공격을 준비 중입니다...", expanded=True) as status:
-        st.write("작전 구상 및 검색 필요성 판단 중...")
-        
-        keys = {'openai': openai_key, 'anthropic': anthropic_key, 'google': google_key}
-        context_str = st.session_state.messages[-1]['content']
-        search_query_res = get_search_query_if_needed(next_speaker, context_str, keys)
-        
-        if "SEARCH:" in search_query_res:
-            query = search_query_res.replace("SEARCH:", "").strip()
-            st.write(f"🔍 웹 검색 시도: '{query}'")
-            search_evidence = search_web(query)
-            if search_evidence:
-                st.write("✅ 증거 확보 완료")
-            else:
-                st.write("❌ 검색 결과 없음")
-        else:
-            st.write("⚡ 자체 논리로 대응합니다.")
-            
-        status.update(label=f"👊 {speaker_name} 발언 준비 완료!", state="complete", expanded=False)
-
-    with st.chat_message("assistant", avatar=avatar_icon):
-        response_placeholder = st.empty()
-        response_text = ""
-        
-        system_prompt = get_system_prompt(next_speaker, turn_count=st.session_state.turn_count, search_evidence=search_evidence)
-        api_messages = build_api_messages(next_speaker, st.session_state.messages)
-        
-        try:
-            if next_speaker == "left":
-                client = OpenAI(api_key=openai_key)
-                stream = client.chat.completions.create(
-                    model="gpt-5.1", 
-                    messages=[{"role": "system", "content": system_prompt}] + api_messages,
-                    stream=True
-                )
-                for chunk in stream:
-                    content = chunk.choices[0].delta.content
-                    if content:
-                        response_text += content
-                        response_placeholder.markdown(f"**ChatGPT (불도저):**\n\n{response_text}▌")
-                response_placeholder.markdown(f"**ChatGPT (불도저):**\n\n{response_text}")
-
-            elif next_speaker == "right":
-                client = Anthropic(api_key=anthropic_key)
-                with client.messages.stream(
-                    max_tokens=8192,
-                    messages=api_messages,
-                    model="claude-sonnet-4-5-20250929",
-                    system=system_prompt
-                ) as stream:
-                    for text in stream.text_stream:
-                        response_text += text
-                        response_placeholder.markdown(f"**Claude (독설가):**\n\n{response_text}▌")
-                response_placeholder.markdown(f"**Claude (독설가):**\n\n{response_text}")
-            
-            st.session_state.messages.append({"role": next_speaker, "content": response_text})
-            st.session_state.turn_count += 1
-            
-            scroll_to_bottom()
-            time.sleep(0.5)
+        if st.session_state.waiting_for_decision and st.button("🔄 판결 다시 시도"):
             st.rerun()
 
-        except Exception as e:
-            st.error(f"오류 발생: {e}")
-            st.session_state.auto_playing = False
-
-# [상태 E] 판결 자동 집행
+# [상태 E] 판결 자동 집행 (STOP 또는 판결 재시도)
 elif st.session_state["waiting_for_decision"]:
     
-    st.markdown("---")
-    
-    with st.chat_message("assistant", avatar="⚖️"):
-        st.markdown("### ⚖️ 최종 판결 집행")
-        st.caption("제미나이 재판관이 '사용자의 최초 질문'에 대한 최고의 답을 내립니다...")
-        
-        with st.spinner("판결문을 작성 중입니다..."):
-            scroll_to_bottom()
-            
-            context_str = ""
-            role_map_k = {"left": "ChatGPT(전략가)", "right": "Claude(독설가)", "user": "사용자", "chief": "판사"}
-            for m in st.session_state.messages:
-                r = m["role"]
-                if r in ["user", "left", "right"]:
-                    context_str += f"[{role_map_k.get(r, r)}] : {m['content']}\n"
-            
-            system_prompt = get_system_prompt("chief", context_history=context_str)
-            
-            try:
-                genai.configure(api_key=google_key)
-                model = genai.GenerativeModel('gemini-2.5-pro')
-                
-                response_placeholder = st.empty()
-                response_text = ""
-                
-                res = model.generate_content(system_prompt, stream=True)
-                for chunk in res:
-                    if chunk.text:
-                        response_text += chunk.text
-                        response_placeholder.markdown(f"**Gemini (판결):**\n\n{response_text}▌")
-                        time.sleep(0.005)
-                        
-                response_placeholder.markdown(f"**Gemini (판결):**\n\n{response_text}")
-                
-                st.session_state.messages.append({"role": "chief", "content": response_text})
-                
-                st.session_state.waiting_for_decision = False
-                st.session_state.finished = True
-                scroll_to_bottom()
-                st.rerun()
-                
-            except Exception as e:
-                 st.error(f"판결 중 오류: {e}")
-                 if st.button("🔄 판결 다시 시도"):
-                     st.rerun()
+    keys = {'openai': openai_key, 'anthropic': anthropic_key, 'google': google_key}
+    engine = DebateEngine(keys, messages=st.session_state.messages, turn_count=st.session_state.turn_count,
+                          tracer=st.session_state.tracer, judge_notes=st.session_state.judge_notes,
+                          scheduler=get_admission(), session_id=st.session_state.session_id, verdict_store=store)
+    live_started = time.perf_counter()
+    with st.spinner("판결문을 작성 중입니다..."):
+        outcome = asyncio.run(play(engine.run_judge()))
+    live_s = time.perf_counter() - live_started
+    if outcome == "finished":
+        render_dashboard()
+    elif st.button("🔄 판결 다시 시도"):
+        st.rerun()
+
+record_rerun(history_s, live_s)
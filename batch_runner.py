@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from debate_engine import MAX_TURNS, DebateEngine
+from rate_limit import RateLimiter, parse_limit_overrides
+from telemetry import Tracer, start_metrics_server
+from web_search import DEFAULT_SEARCH_MODE, SEARCH_MODES
+from transcript import make_message
+
+# --------------------------------------------------------------------------
+# 배치 토론 러너
+# --------------------------------------------------------------------------
+# JSONL로 받은 주제들을 asyncio로 동시에 돌린다. 모든 프로바이더 호출은 하나의 RateLimiter를
+# 거치므로 처리량은 탭 하나가 아니라 벤더 쿼터에 의해 결정된다.
+# 매 턴이 끝날 때마다 체크포인트를 쓰므로 중간에 죽어도 같은 명령으로 다시 실행하면 이어서 돈다.
+#
+#   python batch_runner.py topics.jsonl -o results.jsonl --concurrency 16 --rpm anthropic=50
+#
+# 입력 한 줄: {"id": "t1", "topic": "논쟁 주제", "reference": "선택: 참고 자료 본문"}
+
+log = logging.getLogger("batch_runner")
+
+
+def load_topics(path):
+    topics = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            topic = record.get("topic") or record.get("prompt")
+            if not topic:
+                raise ValueError(f"{path}:{line_no}: 'topic' 필드가 없습니다")
+            topics.append({
+                "id": str(record.get("id", line_no)),
+                "topic": topic,
+                "reference": record.get("reference"),
+            })
+    return topics
+
+
+def load_finished_ids(path):
+    # 실패로 기록된 주제("error" 필드)는 다음 실행에서 다시 시도한다
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return {record["id"] for record in records if not record.get("error")}
+
+
+def compact_messages(messages):
+    # 체크포인트/결과에는 원문만 저장하고, 파생 필드는 불러올 때 make_message로 다시 만든다
+    return [{"role": m["role"], "content": m["content"], "usage": m.get("usage") or {}} for m in messages]
+
+
+class Checkpoints:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, debate_id):
+        safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in debate_id)
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def load(self, debate_id):
+        path = self._path(debate_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, debate_id, state):
+        # 임시 파일에 쓰고 교체해서 쓰는 도중에 죽어도 이전 체크포인트가 깨지지 않게 한다
+        path = self._path(debate_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def clear(self, debate_id):
+        path = self._path(debate_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class BatchRunner:
+    def __init__(self, api_keys, output_path, checkpoint_dir, scheduler, concurrency=8,
+                 max_turns=MAX_TURNS, judge=True, retries=2, search_mode=DEFAULT_SEARCH_MODE, trace_dir=None):
+        self.api_keys = api_keys
+        self.output_path = output_path
+        self.checkpoints = Checkpoints(checkpoint_dir)
+        self.scheduler = scheduler
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_turns = max_turns
+        self.judge = judge
+        self.retries = retries
+        self.search_mode = search_mode
+        self.trace_dir = trace_dir
+        self._write_lock = asyncio.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def _initial_state(self, item):
+        state = self.checkpoints.load(item["id"])
+        if state:
+            log.info("[%s] 체크포인트에서 재개 (턴 %d)", item["id"], state["turn_count"])
+            return state
+        content = item["topic"]
+        if item.get("reference"):
+            content = f"{content}\n\n[참고 자료]:\n{item['reference']}"
+        return {"id": item["id"], "topic": item["topic"], "turn_count": 0, "phase": "turns",
+                "messages": [{"role": "user", "content": content}], "started": time.time()}
+
+    async def run_one(self, item):
+        # 오류 이벤트뿐 아니라 예외(체크포인트 손상, 엔진 버그 등)도 재시도 횟수에 넣고,
+        # 끝내 실패하면 예외를 올리지 않고 실패 결과를 남긴다 (다른 토론은 계속 진행)
+        async with self.semaphore:
+            error = None
+            for attempt in range(self.retries + 1):
+                try:
+                    error = await self._play(self._initial_state(item))
+                except Exception as e:
+                    log.exception("[%s] 예외", item["id"])
+                    error = f"{type(e).__name__}: {e}"
+                if error is None:
+                    return
+                log.warning("[%s] 실패 (%d/%d): %s", item["id"], attempt + 1, self.retries + 1, error)
+                if attempt < self.retries:
+                    await asyncio.sleep(2 ** attempt)
+            self.failed += 1
+            await self._write_result({"id": item["id"], "topic": item["topic"], "error": error,
+                                      "attempts": self.retries + 1})
+
+    async def _play(self, state):
+        messages = [make_message(m["role"], m["content"], usage=m.get("usage") or {}) for m in state["messages"]]
+        engine = DebateEngine(self.api_keys, messages=messages, turn_count=state["turn_count"],
+                              max_turns=self.max_turns, scheduler=self.scheduler, search_mode=self.search_mode,
+                              tracer=Tracer(state["id"], directory=self.trace_dir) if self.trace_dir else None)
+        events = engine.run_turns() if state["phase"] == "turns" else None
+        stop_reason = state.get("stop_reason")
+
+        if events is not None:
+            async for event in events:
+                if event.kind == "error":
+                    return event.text
+                if event.kind == "message":
+                    state.update(turn_count=engine.turn_count, messages=compact_messages(engine.messages))
+                    self.checkpoints.save(state["id"], state)
+                elif event.kind == "stopped":
+                    stop_reason = event.data["reason"]
+                    state.update(phase="judge", stop_reason=stop_reason)
+                    self.checkpoints.save(state["id"], state)
+
+        verdict = None
+        if self.judge:
+            async for event in engine.run_judge():
+                if event.kind == "error":
+                    return event.text
+                if event.kind == "verdict":
+                    verdict = event.text
+
+        await self._write_result({
+            "id": state["id"],
+            "topic": state["topic"],
+            "stop_reason": stop_reason,
+            "turn_count": engine.turn_count,
+            "verdict": verdict,
+            "elapsed_s": round(time.time() - state["started"], 1),
+            "messages": compact_messages(engine.messages),
+        })
+        self.checkpoints.clear(state["id"])
+        self.completed += 1
+        log.info("[%s] 완료 (%s, %d턴)", state["id"], stop_reason, engine.turn_count)
+        return None
+
+    async def _write_result(self, record):
+        async with self._write_lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def run(self, topics):
+        finished = load_finished_ids(self.output_path)
+        pending = [t for t in topics if t["id"] not in finished]
+        log.info("주제 %d개 중 %d개 실행 (이미 완료 %d개)", len(topics), len(pending), len(topics) - len(pending))
+        results = await asyncio.gather(*(self.run_one(item) for item in pending), return_exceptions=True)
+        for item, result in zip(pending, results):
+            if isinstance(result, Exception):
+                log.error("[%s] 결과를 기록하지 못함: %s", item["id"], result)
+                self.failed += 1
+        return self.failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Death Match 배치 실행")
+    parser.add_argument("input", help="주제 JSONL 파일")
+    parser.add_argument("-o", "--output", default="debate_results.jsonl", help="결과 JSONL (이어쓰기)")
+    parser.add_argument("--checkpoint-dir", default=".checkpoints")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시에 진행할 토론 수")
+    parser.add_argument("--turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--no-judge", dest="judge", action="store_false")
+    parser.add_argument("--retries", type=int, default=2, help="토론별 재시도 횟수 (체크포인트에서 재개)")
+    parser.add_argument("--search-mode", choices=SEARCH_MODES, default=DEFAULT_SEARCH_MODE)
+    parser.add_argument("--trace-dir", default=".traces", help="토론별 계측 JSONL 디렉터리 (빈 문자열이면 끔)")
+    parser.add_argument("--metrics-port", type=int, help="Prometheus 텍스트 엔드포인트 포트 (GET /metrics)")
+    parser.add_argument("--rpm", action="append", metavar="PROVIDER=N", help="예: --rpm anthropic=50")
+    parser.add_argument("--tpm", action="append", metavar="PROVIDER=N", help="예: --tpm openai=200000")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    start_metrics_server(args.metrics_port)
+    limits = parse_limit_overrides(args.rpm, "rpm")
+    for provider, limit in parse_limit_overrides(args.tpm, "tpm").items():
+        limits.setdefault(provider, {}).update(limit)
+    keys = {
+        "openai": os.environ.get("OPENAI_API_KEY", ""),
+        "anthropic": os.environ.get("ANTHROPIC_API_KEY", ""),
+        "google": os.environ.get("GOOGLE_API_KEY", ""),
+    }
+
+    async def _run():
+        runner = BatchRunner(keys, args.output, args.checkpoint_dir, RateLimiter(limits),
+                             concurrency=args.concurrency, max_turns=args.turns,
+                             judge=args.judge, retries=args.retries, search_mode=args.search_mode,
+                             trace_dir=args.trace_dir or None)
+        return await runner.run(load_topics(args.input))
+
+    failed = asyncio.run(_run())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_providers import MockConfig, mock_environment, start_mock_server
+
+# --------------------------------------------------------------------------
+# 오프라인 벤치마크
+# --------------------------------------------------------------------------
+# 로컬 목 서버(mock_providers.py)를 띄우고 실제 SDK → 엔진 → (선택) Streamlit 앱 경로로 10턴 토론 + 판결을
+# 끝까지 돌린다. 벤더 지연은 설정값으로 고정되므로, 측정값에서 그만큼을 빼면 앱 자체의 오버헤드가 남는다.
+#
+#   python bench.py --debates 3 --chunk-delay 0.01 --failure-rate 0.05
+#   python bench.py --ui          # Streamlit AppTest로 rerun/렌더링 비용까지 측정
+#   python bench.py --json out.json
+#   python bench.py --imports     # 콜드 스타트: 새 인터프리터에서 모듈 import / 첫 화면 시간만 잰다
+#
+# 네트워크도 API 키도 필요 없다. 모든 프로바이더 클라이언트가 목 서버를 보도록 환경 변수를 먼저 설정한다.
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def describe(values):
+    return {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "max": max(values, default=0.0),
+            "mean": statistics.fmean(values) if values else 0.0, "n": len(values)}
+
+
+class _NullSlot:
+    # StreamRenderer가 그리는 대상 대신 쓰는 빈 슬롯 (렌더러 자체의 CPU 비용만 잰다)
+    def markdown(self, body):
+        pass
+
+    def container(self):
+        return self
+
+    def empty(self):
+        return self
+
+
+async def _run_engine_debate(n, args, config, scheduler=None):
+    from debate_engine import DebateEngine
+    from stream_render import StreamRenderer
+    from telemetry import Tracer
+
+    keys = {"openai": os.environ["OPENAI_API_KEY"], "anthropic": os.environ["ANTHROPIC_API_KEY"],
+            "google": os.environ["GOOGLE_API_KEY"]}
+    tracer = Tracer(f"bench-{n}", directory=None)
+    engine = DebateEngine(keys, max_turns=args.turns, search_mode=args.search_mode, tracer=tracer,
+                          scheduler=scheduler, session_id=f"bench-{n}")
+    engine.add_user_message(f"[벤치마크 {n}] 2025년에 신규 시장 점유율 30%를 노리고 공격적으로 확장해야 하나?")
+
+    turns, judge, render_ms, errors = [], None, [], []
+    debate_started = time.perf_counter()
+    started = renderer = None
+    render_s = 0.0
+    async for event in engine.run():
+        now = time.perf_counter()
+        if event.kind in ("turn_start", "judge_start"):
+            started = now
+            renderer, render_s = StreamRenderer(_NullSlot()), 0.0
+        elif event.kind == "delta":
+            renderer.write(event.text)
+            render_s += time.perf_counter() - now
+        elif event.kind in ("message", "verdict"):
+            renderer.finalize()
+            render_ms.append((render_s + time.perf_counter() - now) * 1000)
+            if event.kind == "message":
+                turns.append(now - started)
+            else:
+                judge = now - started
+        elif event.kind == "error":
+            errors.append(event.text)
+    return {"turns": turns, "judge": judge, "render_ms": render_ms, "errors": errors, "records": tracer.records,
+            "debate_s": time.perf_counter() - debate_started}
+
+
+def _admission_sessions(args, config, scheduler):
+    # Streamlit처럼 세션마다 자기 스레드에서 asyncio.run()을 돌리고, 스케줄러 하나를 함께 쓴다 (모두 동시에 시작)
+    with ThreadPoolExecutor(max_workers=args.debates, thread_name_prefix="bench-session") as pool:
+        futures = [pool.submit(asyncio.run, _run_engine_debate(n, args, config, scheduler))
+                   for n in range(args.debates)]
+        return [future.result() for future in futures]
+
+
+async def bench_engine(args, config):
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(n):
+        async with semaphore:
+            return await _run_engine_debate(n, args, config)
+
+    started = time.perf_counter()
+    scheduler = None
+    if args.admission:
+        from admission import AdmissionController
+        # 목 서버에는 RPM/TPM 제한이 없으므로 동시 실행 상한과 공정 큐만 본다
+        scheduler = AdmissionController(limits={provider: {"rpm": None, "tpm": None}
+                                                for provider in ("openai", "anthropic", "gemini", "ddg")})
+        results = await asyncio.get_running_loop().run_in_executor(None, _admission_sessions, args, config, scheduler)
+    else:
+        results = await asyncio.gather(*(one(n) for n in range(args.debates)))
+    wall = time.perf_counter() - started
+
+    turns = [t for r in results for t in r["turns"]]
+    records = [rec for r in results for rec in r["records"] if rec["type"] == "turn"]
+    streamed = [rec for r in results for rec in r["records"] if rec["type"] in ("turn", "judge", "error")]
+    ideal = config.stream_seconds()
+    return {
+        "wall_s": wall,
+        "turn_e2e_s": describe(turns),
+        # 목 서버의 고정 지연(첫 바이트 + 청크 간격)을 뺀 나머지 = 앱/SDK 오버헤드 (검색 시간 포함)
+        "turn_overhead_s": describe([t - ideal for t in turns]),
+        "ttft_s": describe([rec["spans"].get("ttft", 0.0) for rec in records]),
+        "connect_s": describe([rec["spans"].get("connect", 0.0) for rec in records]),
+        "search_s": describe([rec["spans"]["ddg_search"] for rec in records if "ddg_search" in rec["spans"]]),
+        "judge_s": describe([r["judge"] for r in results if r["judge"] is not None]),
+        "renderer_ms_per_message": describe([ms for r in results for ms in r["render_ms"]]),
+        "completed_debates": sum(1 for r in results if r["judge"] is not None),
+        "errors": [e for r in results for e in r["errors"]],
+        "retries": sum(len(rec.get("retries") or []) for rec in streamed),
+        "truncated": sum(1 for rec in streamed if rec.get("truncated")),
+        "turns_per_s": len(turns) / wall if wall else 0.0,
+        "debate_s": describe([r["debate_s"] for r in results]),
+        # 레이트 리미터/공유 스케줄러 대기 (대기열에서 기다린 시간)
+        "queue_wait_s": describe([rec["spans"].get("rate_limit_wait", 0.0) for rec in streamed]),
+        "admission": scheduler.stats() if scheduler is not None else None,
+    }
+
+
+def bench_ui(args):
+    # Streamlit AppTest로 실제 app3.py를 돌린다: 토론 1회(한 번의 스크립트 실행) + 완료 후 rerun 비용
+    from streamlit.testing.v1 import AppTest
+
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app3.py")
+    at = AppTest.from_file(app_path, default_timeout=600)
+    for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY"):
+        at.secrets[key] = os.environ[key]
+
+    started = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - started
+    # 입력 후 st.rerun()을 AppTest가 이어서 실행하므로, 이 한 번의 run 안에서 10턴 + 판결이 끝난다
+    started = time.perf_counter()
+    at.chat_input[0].set_value("2025년에 신규 시장 점유율 30%를 노리고 공격적으로 확장해야 하나?").run()
+    debate_run = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    reruns = []
+    for _ in range(args.reruns):
+        started = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - started)
+    records = at.session_state.tracer.records
+    return {
+        "first_run_s": first_run,
+        "debate_run_s": debate_run,
+        "messages": len(at.session_state.messages),
+        "finished": bool(at.session_state.finished),
+        # 토론이 끝난 뒤 아무 입력 없이 다시 실행할 때 드는 비용 (전체 기록 다시 그리기)
+        "idle_rerun_s": describe(reruns),
+        "render_ms_per_message": describe([r["spans"]["render"] * 1000 for r in records if r["type"] == "render"]),
+        # 스크립트 실행마다 app3.py가 남기는 화면 비용 (지난 기록 렌더링 / 토론 진행을 뺀 스크립트 전체)
+        "rerun_history_ms": describe([r["spans"]["history"] * 1000 for r in records if r["type"] == "rerun"]),
+        "rerun_script_ms": describe([r["spans"]["script"] * 1000 for r in records if r["type"] == "rerun"]),
+    }
+
+
+# 앱 모듈은 SDK 없이 import되어야 한다 (SDK는 providers.load_sdk로 처음 쓸 때 로드)
+APP_MODULES = "debate_engine, summarizer, telemetry, transcript_store, documents, judge_notes"
+SDK_MODULES = ("openai", "anthropic", "google.generativeai", "duckduckgo_search", "tiktoken", "pypdf")
+FIRST_PAGE = ("from streamlit.testing.v1 import AppTest; t = time.perf_counter(); "
+              "AppTest.from_file({path!r}, default_timeout=120).run()")
+
+
+def _cold_import(statement, repeat):
+    # 매번 새 인터프리터에서 재야 이미 로드된 모듈의 영향을 받지 않는다 (OS 파일 캐시는 따뜻한 상태)
+    code = (f"import sys, time; t = time.perf_counter(); {statement}; elapsed = time.perf_counter() - t; "
+            f"print('bench:', elapsed, ','.join(m for m in {SDK_MODULES!r} if m in sys.modules))")
+    times, loaded = [], ""
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+        fields = [line for line in out.stdout.splitlines() if line.startswith("bench:")][-1].split(" ")
+        times.append(float(fields[1]))
+        loaded = fields[2] if len(fields) > 2 else ""
+    return {"seconds": describe(times), "sdks_loaded": [m for m in loaded.split(",") if m]}
+
+
+def bench_imports(args):
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app3.py")
+    report = {"app_modules": _cold_import(f"import {APP_MODULES}", args.repeat),
+              "first_page": _cold_import(FIRST_PAGE.format(path=app_path), args.repeat)}
+    for module in SDK_MODULES:
+        report[module] = _cold_import(f"import {module}", args.repeat)
+    return report
+
+
+def print_imports(report):
+    print("콜드 import (새 인터프리터, 중앙값)")
+    for name, row in report.items():
+        if "error" in row:
+            print(f"  {name:<24} 실패: {row['error']}")
+            continue
+        sdks = f"  (함께 로드된 SDK: {', '.join(row['sdks_loaded'])})" if row["sdks_loaded"] else ""
+        print(f"  {name:<24} {row['seconds']['p50'] * 1000:8.0f}ms{sdks}")
+
+
+def print_report(report):
+    def row(label, stats, unit="s", scale=1.0):
+        print(f"  {label:<28} p50 {stats['p50'] * scale:8.3f}{unit}  p95 {stats['p95'] * scale:8.3f}{unit}  "
+              f"max {stats['max'] * scale:8.3f}{unit}  (n={stats['n']})")
+
+    config = report["config"]
+    print(f"목 서버: 첫 바이트 {config['first_byte_delay']}s, 청크 {config['chunk_chars']}자/{config['chunk_delay']}s, "
+          f"응답 {config['response_chars']}자, 실패율 {config['failure_rate']:.0%}, 멈춤 {config['stall_rate']:.0%} "
+          f"→ 이론 스트림 {report['ideal_stream_s']:.3f}s")
+    engine = report["engine"]
+    print(f"\n[엔진] 토론 {engine['completed_debates']}개 완료, 벽시계 {engine['wall_s']:.2f}s, 오류 {len(engine['errors'])}건")
+    print(f"  처리량 {engine['turns_per_s']:.2f}턴/s")
+    row("토론 1개 전체", engine["debate_s"])
+    row("턴 end-to-end", engine["turn_e2e_s"])
+    row("턴 오버헤드 (e2e - 이론)", engine["turn_overhead_s"])
+    row("첫 토큰 (TTFT)", engine["ttft_s"])
+    row("connect", engine["connect_s"])
+    row("검색", engine["search_s"])
+    row("판결", engine["judge_s"])
+    row("대기열 대기", engine["queue_wait_s"])
+    row("렌더러 CPU / 발언", engine["renderer_ms_per_message"], unit="ms")
+    print(f"  목 서버 요청: {report['mock_requests']} (주입 실패 {report['mock_failures']}건, "
+          f"멈춤 {report['mock_stalls']}건)")
+    print(f"  스트림 재시도 {engine['retries']}회, 잘린 채 인정 {engine['truncated']}건")
+    for provider, stats in (engine["admission"] or {}).items():
+        print(f"  입장 제어 {provider:<10} 상한 {stats['concurrency']}, 입장 {stats['granted']}회, "
+              f"평균 대기 {stats['avg_wait_s']:.3f}s, 최대 {stats['max_wait_s']:.3f}s")
+    if "ui" in report:
+        ui = report["ui"]
+        print(f"\n[UI] 첫 실행 {ui['first_run_s']:.2f}s, 토론 실행 {ui['debate_run_s']:.2f}s, "
+              f"메시지 {ui['messages']}개, 완료 {ui['finished']}")
+        row("idle rerun", ui["idle_rerun_s"])
+        row("렌더 / 발언", ui["render_ms_per_message"], unit="ms")
+        row("rerun: 지난 기록 렌더", ui["rerun_history_ms"], unit="ms")
+        row("rerun: 스크립트", ui["rerun_script_ms"], unit="ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Death Match 오프라인 벤치마크 (목 프로바이더)")
+    parser.add_argument("--debates", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--admission", action="store_true",
+                        help="세션마다 스레드+이벤트 루프를 따로 두고 admission.AdmissionController를 공유 (--concurrency 무시)")
+    parser.add_argument("--search-mode", default="heuristic", help="tools 모드는 목 서버가 도구 호출을 하지 않아 검색이 없다")
+    parser.add_argument("--first-byte-delay", type=float, default=MockConfig.first_byte_delay)
+    parser.add_argument("--chunk-delay", type=float, default=MockConfig.chunk_delay)
+    parser.add_argument("--chunk-chars", type=int, default=MockConfig.chunk_chars)
+    parser.add_argument("--response-chars", type=int, default=MockConfig.response_chars)
+    parser.add_argument("--failure-rate", type=float, default=MockConfig.failure_rate)
+    parser.add_argument("--stall-rate", type=float, default=MockConfig.stall_rate)
+    parser.add_argument("--stall-seconds", type=float, default=MockConfig.stall_seconds)
+    parser.add_argument("--chunk-timeout", type=float, help="STREAM_CHUNK_TIMEOUT (멈춤 주입 시 짧게)")
+    parser.add_argument("--search-delay", type=float, default=MockConfig.search_delay)
+    parser.add_argument("--ui", action="store_true", help="Streamlit AppTest로 app3.py까지 측정")
+    parser.add_argument("--reruns", type=int, default=5, help="--ui: 토론 후 idle rerun 횟수")
+    parser.add_argument("--json", help="결과를 JSON으로 저장할 경로")
+    parser.add_argument("--imports", action="store_true", help="콜드 스타트 import 시간만 측정")
+    parser.add_argument("--repeat", type=int, default=3, help="--imports: 측정 반복 횟수")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        report = bench_imports(args)
+        print_imports(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        return 0
+
+    config = MockConfig(first_byte_delay=args.first_byte_delay, chunk_delay=args.chunk_delay,
+                        chunk_chars=args.chunk_chars, response_chars=args.response_chars,
+                        failure_rate=args.failure_rate, stall_rate=args.stall_rate,
+                        stall_seconds=args.stall_seconds, search_delay=args.search_delay)
+    server, state = start_mock_server(config)
+    # 프로바이더 클라이언트/검색 캐시가 만들어지기 전에 설정해야 한다 (디스크 캐시, 트레이스 파일, 토론 저장소는 끔)
+    os.environ.update(mock_environment(server))
+    os.environ["SEARCH_CACHE_PATH"] = ""
+    os.environ["TRACE_DIR"] = ""
+    os.environ["TRANSCRIPT_DB"] = ":memory:"
+    # 목 응답은 같은 단어장에서 뽑아 서로 비슷하므로, 정체 감지를 끄고 항상 --turns만큼 돈다
+    os.environ["CONVERGENCE_ENABLED"] = "0"
+    if args.chunk_timeout:
+        os.environ["STREAM_CHUNK_TIMEOUT"] = str(args.chunk_timeout)
+
+    report = {"config": vars(config), "ideal_stream_s": config.stream_seconds()}
+    report["engine"] = asyncio.run(bench_engine(args, config))
+    if args.ui:
+        report["ui"] = bench_ui(args)
+    report["mock_requests"] = dict(state.requests)
+    report["mock_failures"] = state.failures
+    report["mock_stalls"] = state.stalls
+    server.shutdown()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report["engine"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from transcript import estimate_tokens
+
+# --------------------------------------------------------------------------
+# 토큰 예산 기반 컨텍스트 윈도우
+# --------------------------------------------------------------------------
+# 최근 N 라운드는 원문 그대로, 그 이전 라운드는 발언마다 앞 문장 몇 개만 발췌해 모은 목록으로 바꾸고
+# (모델 요약이 아니라 발췌), 첫 요청에 붙은 [참고 자료]는 예산만큼만 잘라서 보낸다.
+# 그래도 max_tokens를 넘으면 원문 발언까지 잘라서, 토론 길이와 상관없이 턴당 입력 토큰이 상한을 넘지 않는다.
+
+REFERENCE_MARKER = "[참고 자료]:"
+_SENTENCE_END = re.compile(r"(?<=[.!?。])\s+|\n+")
+
+
+@lru_cache(maxsize=1)
+def _openai_encoding():
+    # tiktoken은 첫 사용 때 로드한다 (인코딩 파일을 읽거나 내려받느라 import 시점에 두면 콜드 스타트가 느려짐)
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+@dataclass
+class ContextBudget:
+    keep_rounds: int = 2          # 원문 그대로 보낼 최근 라운드 수 (라운드 = 양측 발언 1회씩)
+    reference_tokens: int = 4000  # [참고 자료] 상한
+    digest_chars: int = 240       # 오래된 발언 1개당 발췌 길이
+    max_tokens: int = 24000       # 히스토리 전체 상한 (system prompt 제외)
+    compact_step: int = 2         # 요약으로 넘기는 단위 (라운드). 매 턴 요약이 바뀌면 프리픽스 캐시가 깨지므로 몰아서 넘긴다
+
+
+def count_tokens(text, provider="openai"):
+    # OpenAI는 tiktoken이 있으면 정확히 세고, 나머지 프로바이더는 공통 추정치를 쓴다
+    encoding = _openai_encoding() if provider == "openai" else None
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def message_tokens(message, provider):
+    counts = message.setdefault("token_counts", {})
+    if provider not in counts:
+        counts[provider] = count_tokens(message["cleaned"], provider)
+    return counts[provider]
+
+
+def digest(message, max_chars):
+    # 발언의 앞부분 문장들만 남긴 발췌 (길이별로 메시지에 한 번만 계산해 둔다)
+    digests = message.setdefault("digests", {})
+    cached = digests.get(max_chars)
+    if cached is None:
+        sentences = [s.strip() for s in _SENTENCE_END.split(message["cleaned"]) if s.strip()]
+        cached = ""
+        for sentence in sentences:
+            if cached and len(cached) + len(sentence) > max_chars:
+                break
+            cached = f"{cached} {sentence}".strip()
+        if len(cached) > max_chars:
+            cached = cached[:max_chars].rstrip() + "…"
+        digests[max_chars] = cached
+    return cached
+
+
+def truncate_to_tokens(text, max_tokens, provider):
+    total = count_tokens(text, provider)
+    if total <= max_tokens:
+        return text, False
+    keep_chars = max(int(len(text) * max_tokens / total) - 50, 0)
+    return f"{text[:keep_chars]}\n...(이하 {len(text) - keep_chars:,}자 생략)", True
+
+
+def split_reference(content):
+    if REFERENCE_MARKER not in content:
+        return content, None
+    prompt, reference = content.split(REFERENCE_MARKER, 1)
+    return prompt.rstrip(), reference.strip()
+
+
+def compact_history(history, budget, provider="openai"):
+    """history를 전송용 항목 리스트로 줄인다. 반환값: (entries, report)
+
+    entries의 각 항목은 {"role", "content", "index"} 이며, role == "summary"인 항목은
+    오래된 라운드의 누적 요약이다. index는 원래 history에서의 위치(요약은 None)."""
+    debater_positions = [i for i, m in enumerate(history) if m["role"] in ("left", "right")]
+    keep_messages = max(budget.keep_rounds, 1) * 2
+    step_messages = max(budget.compact_step, 1) * 2
+    # 최근 keep_rounds 이상은 원문으로 두고, 요약 경계는 compact_step 라운드 단위로만 전진
+    compacted = (max(len(debater_positions) - keep_messages, 0) // step_messages) * step_messages
+    keep_from = debater_positions[compacted] if compacted else 0
+
+    full_tokens = 0
+    entries = []
+    summary_lines = []
+    reference_truncated = False
+    names = {"left": "ChatGPT", "right": "Claude"}
+
+    for i, message in enumerate(history):
+        role = message["role"]
+        if role == "chief":
+            continue
+        tokens = message_tokens(message, provider)
+        full_tokens += tokens
+
+        if role == "user":
+            content = message["cleaned"]
+            prompt, reference = split_reference(content)
+            if reference is not None:
+                reference, truncated = truncate_to_tokens(reference, budget.reference_tokens, provider)
+                reference_truncated = reference_truncated or truncated
+                content = f"{prompt}\n\n{REFERENCE_MARKER}\n{reference}"
+            entries.append({"role": "user", "content": content, "index": i})
+        elif i < keep_from:
+            summary_lines.append(f"- {names[role]}: {digest(message, budget.digest_chars)}")
+        else:
+            entries.append({"role": role, "content": message["cleaned"], "index": i})
+
+    if summary_lines:
+        # 요약은 첫 사용자 요청 바로 뒤에 둔다
+        insert_at = next((n + 1 for n, e in enumerate(entries) if e["role"] == "user"), 0)
+        entries.insert(insert_at, {"role": "summary", "lines": summary_lines, "index": None})
+
+    summarized = len(summary_lines)
+    sent_tokens = _fit_to_ceiling(entries, budget, provider)
+    report = {
+        "provider": provider,
+        "full_tokens": full_tokens,
+        "sent_tokens": sent_tokens,
+        "saved_tokens": max(full_tokens - sent_tokens, 0),
+        "summarized_messages": summarized,
+        "reference_truncated": reference_truncated,
+    }
+    for entry in entries:
+        if entry["role"] == "summary":
+            entry["content"] = "\n".join(entry.pop("lines"))
+    return entries, report
+
+
+def _fit_to_ceiling(entries, budget, provider):
+    # 상한을 넘으면 가장 오래된 요약 줄부터 버리고, 그래도 넘으면 첫 요청의 참고 자료를 더 줄이고,
+    # 그래도 넘으면 원문 항목을 오래된 것부터 자른다 (직전 발언과 첫 요청은 맨 나중에)
+    def entry_tokens(entry):
+        if entry["role"] == "summary":
+            return sum(count_tokens(line, provider) for line in entry["lines"])
+        return count_tokens(entry["content"], provider)
+
+    sizes = [entry_tokens(e) for e in entries]
+    total = sum(sizes)
+    for n, entry in enumerate(entries):
+        if entry["role"] != "summary":
+            continue
+        while total > budget.max_tokens and entry["lines"]:
+            total -= count_tokens(entry["lines"].pop(0), provider)
+        if not entry["lines"]:
+            entry["lines"] = ["- (이전 라운드 생략)"]
+        sizes[n] = entry_tokens(entry)
+    total = sum(sizes)
+
+    if total > budget.max_tokens:
+        for n, entry in enumerate(entries):
+            if entry["role"] != "user" or REFERENCE_MARKER not in entry["content"]:
+                continue
+            prompt, reference = split_reference(entry["content"])
+            allowed = max(budget.max_tokens - (total - sizes[n]) - count_tokens(prompt, provider), 0)
+            reference, _ = truncate_to_tokens(reference, allowed, provider)
+            entry["content"] = f"{prompt}\n\n{REFERENCE_MARKER}\n{reference}"
+            total += count_tokens(entry["content"], provider) - sizes[n]
+            sizes[n] = count_tokens(entry["content"], provider)
+            break
+
+    if total > budget.max_tokens:
+        first_user = next((n for n, e in enumerate(entries) if e["role"] == "user"), None)
+        last = len(entries) - 1
+        order = [n for n, e in enumerate(entries) if e["role"] != "summary" and n not in (first_user, last)]
+        order += [n for n in (first_user, last) if n is not None and entries[n]["role"] != "summary"]
+        for n in dict.fromkeys(order):
+            if total <= budget.max_tokens:
+                break
+            total -= sizes[n]
+            sizes[n] = _truncate_entry(entries[n], budget.max_tokens - total, provider)
+            total += sizes[n]
+    return total
+
+
+def _truncate_entry(entry, allowed, provider):
+    # truncate_to_tokens는 글자 비율로 자르므로 토큰 수가 실제로 allowed 안에 들 때까지 여유를 늘려 가며 다시 자른다
+    original = entry["content"]
+    tokens = count_tokens(original, provider)
+    margin = 16  # "...(이하 N자 생략)" 표시
+    while tokens > allowed:
+        entry["content"], _ = truncate_to_tokens(original, max(allowed - margin, 0), provider)
+        tokens = count_tokens(entry["content"], provider)
+        if allowed - margin <= 0:
+            break
+        margin *= 2
+    return tokens
@@ -0,0 +1,125 @@
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from retrieval import tokenize
+
+# --------------------------------------------------------------------------
+# 토론 정체 감지 (반복/수렴) + 다국어 항복 감지
+# --------------------------------------------------------------------------
+# 외부 의존성 없이 최근 발언들의 TF-IDF 코사인 유사도를 본다 (토큰화는 retrieval.tokenize — 한글 bigram).
+#   반복(looping)  : 두 발언자 모두 최근 발언이 자기 직전 발언들과 거의 같은 말을 patience 라운드 연속으로 할 때
+#   수렴(converged): 양측의 최근 발언이 서로 거의 같은 내용을 patience 라운드 연속으로 말할 때
+# 메시지 목록만으로 매번 다시 계산하므로 rerun/재개 후에도 상태가 필요 없다.
+
+
+@dataclass
+class ConvergenceConfig:
+    min_turns: int = 4                # 이보다 이른 턴에서는 조기 종료하지 않는다
+    repeat_threshold: float = 0.6     # 자기 반복 유사도 (최근 발언 vs 자기 이전 발언 중 최대)
+    converge_threshold: float = 0.6   # 양측 최근 발언 간 유사도
+    lookback: int = 3                 # 자기 반복 비교 대상: 같은 발언자의 직전 발언 수
+    patience: int = 2                 # 연속으로 기준을 넘어야 하는 라운드 수
+    enabled: bool = True
+
+    @classmethod
+    def from_env(cls):
+        # 예: CONVERGENCE_REPEAT=0.6 CONVERGENCE_PATIENCE=3, CONVERGENCE_ENABLED=0 이면 끔
+        config = cls()
+        for name, field_name in (("MIN_TURNS", "min_turns"), ("REPEAT", "repeat_threshold"),
+                                 ("CONVERGE", "converge_threshold"), ("LOOKBACK", "lookback"),
+                                 ("PATIENCE", "patience")):
+            value = os.environ.get(f"CONVERGENCE_{name}")
+            if value:
+                setattr(config, field_name, type(getattr(config, field_name))(value))
+        config.enabled = os.environ.get("CONVERGENCE_ENABLED", "1") not in ("0", "false", "off")
+        return config
+
+
+# 항복/완전 동의 표현. 부정("인정 못 한다", "not right")이 바로 뒤따르거나 앞서면 항복이 아니다.
+# 상대에게 항복을 요구하는 명령형("패배를 인정하라"), 되묻는 말("네 말이 맞다고?")도 항복이 아니므로
+# 한국어 패턴 뒤에는 _KO_NOT(부정/명령/어렵다)과 _NOT_QUESTION(같은 문장이 ?로 끝남)을 붙인다.
+_KO_NOT = r"(?!\s*(?:하지|할\s*수\s*없|못|안|하라|해라|하세요|하십시오|하시오|하기\s*(?:어렵|힘들)|할\s*리가))"
+_NOT_QUESTION = r"(?![^.!?\n]*\?)"
+SURRENDER_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"패배를\s*인정" + _KO_NOT + _NOT_QUESTION,
+    r"(?:네|니|당신|너|그쪽)(?:의)?\s*말이\s*(?:다\s*)?맞(?:다|아|네|습니다|는 것 같)(?!고|냐|니)" + _NOT_QUESTION,
+    r"(?:전적으로|완전히|100%)\s*동의" + _KO_NOT + _NOT_QUESTION,
+    r"(?:내가|제가)\s*졌(?:다|어|습니다|네)(?!고|냐|니)" + _NOT_QUESTION,
+    r"\bI\s+(?:fully\s+|completely\s+)?(?:concede|admit\s+defeat|yield)\b(?!\s+(?:nothing|no\b|none))",
+    r"(?<!not\s)(?<!n't\s)\byou(?:'re|\s+are)\s+(?:absolutely\s+|completely\s+|totally\s+)?right\b"
+    r"(?!\s*(?:that|about|to|on|,?\s*but))",
+    r"(?<!not\s)(?<!n't\s)\bI\s+(?:fully|completely|totally|wholeheartedly)\s+agree\b",
+    r"負けを認め(?!ない|られない|ろ|なさい)", r"(?:あなた|君)の言う通り", r"完全に同意(?!しない|できない)",
+    r"我认输", r"你说得对", r"(?<!不)完全同意",
+    r"\btienes\s+(?:toda\s+la\s+)?raz[oó]n\b", r"\bme\s+rindo\b",
+    r"\btu\s+as\s+(?:tout\s+[àa]\s+fait\s+)?raison\b", r"\bje\s+(?:m'incline|capitule)\b",
+    r"\bdu\s+hast\s+(?:v[öo]llig\s+)?recht\b", r"\bich\s+gebe\s+(?:mich\s+geschlagen|auf)\b",
+)]
+
+
+def find_surrender(text):
+    """항복 표현이 있으면 매칭된 문자열, 없으면 None."""
+    for pattern in SURRENDER_PATTERNS:
+        match = pattern.search(text or "")
+        if match:
+            return match.group(0)
+    return None
+
+
+def _vectors(texts):
+    counts = [Counter(tokenize(text)) for text in texts]
+    df = Counter(term for c in counts for term in c)
+    n = len(counts)
+    vectors = []
+    for c in counts:
+        vector = {term: (1 + math.log(tf)) * math.log(1 + n / df[term]) for term, tf in c.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        vectors.append({term: w / norm for term, w in vector.items()})
+    return vectors
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+
+def round_scores(messages, config):
+    """라운드(ChatGPT → Claude)별 유사도. 반환: [{"turn", "repeat_left", "repeat_right", "converge"}] (최근 patience개)"""
+    debate = [(m["role"], m.get("cleaned") or m["content"]) for m in messages if m["role"] in ("left", "right")]
+    if len(debate) < 2:
+        return []
+    vectors = _vectors([text for _, text in debate])
+    positions = {"left": [], "right": []}
+    scores = []
+    for i, (role, _) in enumerate(debate):
+        positions[role].append(i)
+        if role != "right" or not positions["left"]:
+            continue
+        row = {"turn": i + 1, "converge": round(cosine(vectors[positions["left"][-1]], vectors[i]), 3)}
+        for side in ("left", "right"):
+            own = positions[side]
+            earlier = own[-1 - config.lookback:-1]
+            row[f"repeat_{side}"] = round(max((cosine(vectors[own[-1]], vectors[j]) for j in earlier),
+                                              default=0.0), 3)
+        scores.append(row)
+    return scores[-config.patience:]
+
+
+def detect_stall(messages, turn_count, config):
+    """정체 판정. 반환: (reason, detail) — reason은 "looping" | "converged" | None. detail은 로그/트레이스용 점수."""
+    if not config.enabled or turn_count < config.min_turns or messages[-1]["role"] != "right":
+        return None, None
+    scores = round_scores(messages, config)
+    detail = {"scores": scores, "repeat_threshold": config.repeat_threshold,
+              "converge_threshold": config.converge_threshold, "patience": config.patience}
+    if len(scores) < config.patience:
+        return None, detail
+    if all(min(s["repeat_left"], s["repeat_right"]) >= config.repeat_threshold for s in scores):
+        return "looping", detail
+    if all(s["converge"] >= config.converge_threshold for s in scores):
+        return "converged", detail
+    return None, detail
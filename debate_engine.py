@@ -0,0 +1,772 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+
+from admission import QueueNotice
+from context_window import split_reference
+from convergence import ConvergenceConfig, detect_stall, find_surrender
+from judge_notes import NOTE_TOKEN_ESTIMATE, NOTES_MODEL, JudgeNotes
+from prompts import build_api_messages, build_judge_context, get_system_prompt
+from providers import (StreamControl, ToolNotice, resume_messages, resume_prompt, stream_anthropic, stream_gemini,
+                       stream_openai)
+from resilience import RetryNotice, StreamPolicy, StreamStalled, describe_error, is_transient
+from retrieval import retrieve_excerpts
+from telemetry import PROVIDER_MODELS, Tracer, estimate_cost, timed
+from transcript import estimate_tokens, make_message
+from web_search import (DEFAULT_SEARCH_MODE, SEARCH_DEADLINE, SEARCH_MODES, WEB_SEARCH_TOOL, decision_provider,
+                        get_search_query_if_needed, heuristic_search_query, looks_searchable,
+                        parse_search_decision, search_web)
+
+# --------------------------------------------------------------------------
+# 헤드리스 토론 엔진
+# --------------------------------------------------------------------------
+# 발언자 선택, 항복 감지, MAX_TURNS 컷, 검색, 스트리밍, 판결까지 한 프로세스 안에서 돌린다.
+# Streamlit UI, CLI, 배치 러너 모두 run()이 내보내는 이벤트 스트림을 구독하기만 하면 된다.
+
+MAX_TURNS = 10
+SURRENDER_MIN_TURNS = 3
+# 레이트 리미터에 미리 차감할 토큰 추정치 (실제 사용량은 호출 후 settle로 정산)
+DECISION_TOKEN_ESTIMATE = 700
+OUTPUT_TOKEN_ESTIMATE = 1500
+# 발언이 이만큼 스트리밍되면 다음 발언자의 검색 판단/검색을 미리 시작한다 (판단 에이전트는 맥락 끝 500자를 본다)
+PREFETCH_AFTER_CHARS = 500
+
+# 프로바이더 스트림과 검색 판단은 블로킹 SDK 호출이라 전용 스레드 풀에서 돌린다.
+# (asyncio 기본 executor를 쓰지 않는 이유: asyncio.run()이 끝날 때 기본 executor의 스레드를 기다린다)
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="debate-engine")
+
+log = logging.getLogger("debate_engine")
+
+
+@dataclass
+class DebateEvent:
+    # kind: turn_start | status | context | delta | message | notes | stopped | judge_start | verdict | error
+    kind: str
+    role: str = None
+    text: str = ""
+    data: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+async def iterate_in_thread(make_iterator):
+    # 동기 제너레이터를 스레드에서 돌리고 청크를 asyncio 큐로 넘겨 받는다
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    cancelled = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            cancelled.set()  # 이벤트 루프가 이미 닫힘
+
+    def pump():
+        iterator = None
+        try:
+            iterator = make_iterator()
+            for item in iterator:
+                if cancelled.is_set():
+                    break
+                put((item, None))
+            put((done, None))
+        except BaseException as exc:
+            put((done, exc))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    loop.run_in_executor(_EXECUTOR, pump)
+    try:
+        while True:
+            item, exc = await queue.get()
+            if item is done:
+                if exc is not None:
+                    raise exc
+                return
+            yield item
+    finally:
+        cancelled.set()
+
+
+# 같은 판결 프롬프트를 여러 세션이 동시에 판결하면 먼저 시작한 쪽의 결과를 함께 쓴다 (프로세스 전역)
+_verdicts_inflight = {}
+_verdicts_lock = threading.Lock()
+
+
+def verdict_key(system_prompt, model=PROVIDER_MODELS["gemini"]):
+    return hashlib.sha256(f"{model}\x00{system_prompt}".encode("utf-8")).hexdigest()
+
+
+def rival_of(role):
+    return "right" if role == "left" else "left"
+
+
+class DebateEngine:
+    def __init__(self, api_keys, messages=None, turn_count=0, max_turns=MAX_TURNS, scheduler=None,
+                 search_mode=DEFAULT_SEARCH_MODE, tracer=None, judge_notes=None, convergence=None, stream_policy=None,
+                 session_id=None, verdict_store=None):
+        # messages는 호출자의 리스트를 그대로 공유한다 (Streamlit에서는 st.session_state.messages)
+        # scheduler: slot(provider, tokens)를 가진 객체 (예: rate_limit.RateLimiter, admission.AdmissionController).
+        #            없으면 제한 없이 호출
+        # session_id: 공유 스케줄러의 공정 큐에서 이 엔진의 호출을 묶는 단위 (Streamlit에서는 브라우저 세션)
+        # verdict_store: get_verdict/put_verdict를 가진 객체 (예: transcript_store). 같은 판결 입력이면 재사용
+        # search_mode: web_search.SEARCH_MODES 중 하나
+        # tracer: telemetry.Tracer. 있으면 턴/판결마다 단계별 소요 시간·토큰·비용 레코드를 남긴다
+        # judge_notes: judge_notes.JudgeNotes. 없으면 새로 만들고, False면 노트 없이 원문으로 판결한다
+        # convergence: convergence.ConvergenceConfig (반복/수렴 조기 종료 기준). 없으면 환경 변수 기준
+        # stream_policy: resilience.StreamPolicy (스트림 데드라인/재시도/대체 모델). 없으면 환경 변수 기준
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"알 수 없는 search_mode: {search_mode}")
+        self.api_keys = api_keys
+        self.messages = messages if messages is not None else []
+        self.turn_count = turn_count
+        self.max_turns = max_turns
+        self.scheduler = scheduler
+        self.search_mode = search_mode
+        self.tracer = tracer
+        self.convergence = convergence or ConvergenceConfig.from_env()
+        self.stream_policy = stream_policy or StreamPolicy.from_env()
+        self.session_id = session_id
+        self.verdict_store = verdict_store
+        self.stop_requested = False
+        self.stop_detail = None
+        self.judge_notes = JudgeNotes() if judge_notes is None else (judge_notes or None)
+        self._turn_spans = {}
+        self._prefetch = None
+        self._note_tasks = set()
+        self._noted_rounds = self.judge_notes.scoreboard()["rounds"] if self.judge_notes else 0
+
+    def add_user_message(self, content):
+        self.messages.append(make_message("user", content))
+        if len(self.messages) <= 1:
+            self.turn_count = 0
+
+    def stop(self):
+        self.stop_requested = True
+
+    def next_speaker(self):
+        last_role = self.messages[-1]["role"]
+        if last_role == "left":
+            return "right"
+        return "left"
+
+    def stop_reason(self):
+        if self.stop_requested:
+            return "stopped"
+        # [수정] 10턴 도달 시 즉시 판결 모드
+        if self.turn_count >= self.max_turns:
+            return "max_turns"
+        # 상대방 항복 체크 (다국어 패턴)
+        last = self.messages[-1]
+        if last["role"] == "right" and self.turn_count >= SURRENDER_MIN_TURNS:
+            phrase = find_surrender(last.get("cleaned") or last["content"])
+            if phrase:
+                self.stop_detail = {"phrase": phrase}
+                return "surrender"
+        # 같은 말 반복 / 양측 수렴 → 남은 턴을 태우지 않고 바로 판결
+        reason, detail = detect_stall(self.messages, self.turn_count, self.convergence)
+        if reason:
+            self.stop_detail = detail
+            return reason
+        return None
+
+    # ---- 스케줄러 연동 ---------------------------------------------------
+    def _gate(self, provider, tokens=0):
+        if self.scheduler is None or provider is None:
+            return nullcontext()
+        return self.scheduler.slot(provider, tokens, session=self.session_id)
+
+    async def _queue_notices(self, provider, gate):
+        # 공유 스케줄러(admission)면 입장할 때까지 대기열 순번을 흘려보낸다. 기다린 적이 있으면 입장도 알린다
+        updates = getattr(gate, "updates", None)
+        if updates is None:
+            return
+        queued = False
+        async for position in updates():
+            queued = True
+            yield QueueNotice(provider, position)
+        if queued:
+            yield QueueNotice(provider, 0)
+
+    @staticmethod
+    def _release(gate):
+        # 입장 전에 포기했거나(중단/예외) 입장 후 빠져나온 자리를 돌려준다 (여러 번 불러도 안전)
+        cancel = getattr(gate, "cancel", None)
+        if cancel is not None:
+            cancel()
+
+    def _settle(self, provider, estimated, usage):
+        if self.scheduler is not None and hasattr(self.scheduler, "settle") and usage:
+            actual = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+            self.scheduler.settle(provider, estimated, actual)
+
+    def _settle_failed(self, provider, estimated, received):
+        # 실패한 시도는 사용량 보고가 없으므로 입력 추정치 + 그 시도에서 받은 글자만큼 쓴 것으로 정산한다
+        if self.scheduler is not None and hasattr(self.scheduler, "settle"):
+            actual = max(estimated - OUTPUT_TOKEN_ESTIMATE, 0) + (estimate_tokens(received) if received else 0)
+            self.scheduler.settle(provider, estimated, actual)
+
+    async def _run_blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(_EXECUTOR, fn, *args)
+
+    # ---- 검색 파이프라인 -------------------------------------------------
+    def _thread_gate(self, provider, loop):
+        # 검색 스레드에서 쓰는 동기판 _gate. 입장은 이벤트 루프에서 기다리고, SEARCH_DEADLINE 안에 못 들어가면
+        # 예외로 그 요청만 포기한다 (hedged_search가 실패로 센다)
+        if self.scheduler is None:
+            return None
+
+        @contextmanager
+        def gate():
+            slot = self._gate(provider)
+            entered = self._submit(slot.__aenter__(), loop)
+            try:
+                entered.result(timeout=SEARCH_DEADLINE)
+            except BaseException:
+                if not entered.cancel() and not entered.cancelled() and entered.exception() is None:
+                    self._release(slot)  # 포기하는 사이에 입장해 버린 자리
+                raise
+            try:
+                yield
+            finally:
+                if hasattr(slot, "cancel"):
+                    self._release(slot)  # admission 자리는 스레드에서 바로 돌려줄 수 있다
+                else:
+                    try:
+                        self._submit(slot.__aexit__(None, None, None), loop)
+                    except RuntimeError:
+                        pass  # 이벤트 루프가 이미 닫힘 (RateLimiter는 돌려줄 자리가 없다)
+
+        return gate
+
+    @staticmethod
+    def _submit(coro, loop):
+        # 이벤트 루프가 이미 닫혔으면 코루틴을 닫고 RuntimeError를 올린다 (never awaited 경고 방지)
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, loop)
+        except RuntimeError:
+            coro.close()
+            raise
+
+    async def _gated_search(self, query):
+        # ddg 자리는 search_web 호출 하나가 아니라 실제로 보내는 요청(질의 x 헤지 백엔드)마다 잡는다
+        gate = self._thread_gate("ddg", asyncio.get_running_loop())
+        return await self._run_blocking(search_web, query, 3, gate)
+
+    async def _search_pipeline(self, role, context):
+        spans = {}
+        if self.search_mode == "heuristic":
+            query = heuristic_search_query(context)
+            decision = f"SEARCH: {query}" if query else "PASS"
+        elif self.search_mode == "agent" and looks_searchable(context):
+            # 사실 주장의 신호가 없으면 판단 에이전트 호출 자체를 건너뛴다
+            async with self._gate(decision_provider(self.api_keys), DECISION_TOKEN_ESTIMATE):
+                with timed(spans, "search_decision"):
+                    decision = await self._run_blocking(get_search_query_if_needed, role, context, self.api_keys)
+            query = parse_search_decision(decision)
+        else:
+            decision, query = "PASS", None
+        evidence = None
+        if query:
+            with timed(spans, "ddg_search"):
+                evidence = await self._gated_search(query)
+        return {"decision": decision, "query": query, "evidence": evidence, "spans": spans}
+
+    def _tool_handler(self, loop):
+        # 프로바이더 스트림 스레드에서 불린다. 검색은 이 스레드에서 바로 돌린다 (요청은 web_search의 풀에서 나가고
+        # hedged_search의 데드라인으로 끝나므로 _EXECUTOR 워커를 하나 더 잡지 않는다). ddg 입장만 이벤트 루프에서 받는다
+        def handle(name, arguments):
+            query = str(arguments.get("query") or "").strip()
+            if name != WEB_SEARCH_TOOL["name"] or not query:
+                return "⚠️ 지원하지 않는 도구 호출입니다."
+            queries = [query] + [str(q) for q in arguments.get("alternatives") or []]
+            with timed(self._turn_spans, "ddg_search"):
+                if loop.is_closed():
+                    return "검색 결과 없음"  # 이벤트 루프가 이미 닫힘 (세션 종료)
+                return search_web(queries, 3, self._thread_gate("ddg", loop)) or "검색 결과 없음"
+        return handle
+
+    def _tool_status(self, speaker, notice):
+        query = notice.arguments.get("query", "")
+        if notice.result is None:
+            return DebateEvent("status", speaker, f"🔍 웹 검색 시도: '{query}'", {"query": query, "tool": notice.name})
+        found = notice.result not in ("검색 결과 없음",) and not notice.result.startswith(("검색 실패", "⚠️"))
+        return DebateEvent("status", speaker, "✅ 증거 확보 완료" if found else "❌ 검색 결과 없음")
+
+    def _schedule_prefetch(self, role, partial):
+        # 현재 발언이 스트리밍되는 동안 지금까지 받은 부분으로 다음 발언자의 검색 판단/검색을 시작한다
+        task = asyncio.ensure_future(self._search_pipeline(role, partial))
+        self._prefetch = (role, partial, task)
+
+    async def _prepare_search(self, role, context):
+        """다음 발언자의 검색 준비. 반환: (prepared, prefetched)
+
+        미리 시작한 작업은 완성된 발언이 그 작업이 본 텍스트로 시작할 때만 쓴다. heuristic 모드는 판단이
+        공짜이므로 완성된 발언으로 다시 뽑은 검색어가 같을 때만 쓴다."""
+        job, self._prefetch = self._prefetch, None
+        if job and job[0] == role and context.startswith(job[1]):
+            try:
+                prepared = await job[2]
+            except Exception:
+                prepared = None
+            if prepared is not None and (self.search_mode != "heuristic"
+                                         or prepared["query"] == heuristic_search_query(context)):
+                return prepared, True
+        return await self._search_pipeline(role, context), False
+
+    # ---- 참고 자료 발췌 -------------------------------------------------
+    def reference_text(self):
+        for message in self.messages:
+            if message["role"] == "user":
+                _, reference = split_reference(message["content"])
+                if reference:
+                    return reference
+        return None
+
+    async def _reference_excerpts(self, context):
+        # 상대의 마지막 발언(첫 턴이면 사용자 요청 본문)으로 참고 자료를 검색한다
+        reference = self.reference_text()
+        if not reference:
+            return None
+        query, _ = split_reference(context)
+        return await self._run_blocking(retrieve_excerpts, reference, query)
+
+    # ---- 심판 노트 --------------------------------------------------------
+    def _schedule_note(self):
+        # Claude 발언으로 라운드가 끝나면 다음 턴과 나란히 그 라운드의 노트를 쓴다
+        span = self.judge_notes.claim_round(self.messages) if self.judge_notes else None
+        if span:
+            task = asyncio.ensure_future(self._write_note(*span))
+            self._note_tasks.add(task)
+            task.add_done_callback(self._note_tasks.discard)
+
+    async def _write_note(self, start, end):
+        spans, usage = {}, {}
+        try:
+            async with self._gate("gemini", NOTE_TOKEN_ESTIMATE):
+                with timed(spans, "stream"):
+                    await self._run_blocking(self.judge_notes.write_note, self.api_keys["google"],
+                                             list(self.messages), start, end, usage)
+        except BaseException as e:
+            # 실패하거나 이벤트 루프가 먼저 끝나면 그 라운드는 판결 때 원문으로 들어간다
+            self.judge_notes.abandon(start)
+            if not isinstance(e, Exception):
+                raise
+            self._trace("error", "chief", "gemini", spans, usage, model=NOTES_MODEL, error=f"심판 노트: {e}")
+            return
+        self._trace("notes", "chief", "gemini", spans, usage, model=NOTES_MODEL, messages=[start, end])
+
+    def _notes_event(self):
+        # 새로 완성된 노트가 있을 때만 점수판 이벤트를 낸다
+        if not self.judge_notes:
+            return None
+        board = self.judge_notes.scoreboard()
+        if board["rounds"] == self._noted_rounds:
+            return None
+        self._noted_rounds = board["rounds"]
+        return DebateEvent("notes", "chief", data=board)
+
+    # ---- 턴 진행 --------------------------------------------------------
+    async def run(self):
+        finished_turns = False
+        async for event in self.run_turns():
+            yield event
+            if event.kind == "stopped":
+                finished_turns = True
+        if finished_turns:
+            async for event in self.run_judge():
+                yield event
+
+    async def run_turns(self):
+        while True:
+            notes = self._notes_event()
+            if notes:
+                yield notes
+            reason = self.stop_reason()
+            if reason:
+                if reason != "stopped":
+                    self._log_stop(reason)
+                yield DebateEvent("stopped", data={"reason": reason, "turn_count": self.turn_count,
+                                                   "detail": self.stop_detail})
+                return
+            failed = False
+            async for event in self.run_turn():
+                yield event
+                failed = failed or event.kind == "error"
+            if failed:
+                return
+
+    async def run_turn(self):
+        speaker = self.next_speaker()
+        yield DebateEvent("turn_start", speaker, data={"turn": self.turn_count})
+
+        context_str = self.messages[-1]["content"]
+        search_evidence = None
+        tool_kwargs = {}
+        spans = self._turn_spans = {}
+        if self.search_mode == "tools":
+            # 검색 여부와 검색어는 토론자 모델이 스트리밍 도중 web_search 도구로 직접 정한다
+            tool_kwargs = {"tools": [WEB_SEARCH_TOOL], "tool_handler": self._tool_handler(asyncio.get_running_loop())}
+        else:
+            prepared, prefetched = await self._prepare_search(speaker, context_str)
+            spans.update(prepared["spans"])
+            if prefetched:
+                yield DebateEvent("status", speaker, "⚡ 상대 발언 중에 미리 구상한 작전을 꺼냅니다.")
+            if prepared["query"]:
+                yield DebateEvent("status", speaker, f"🔍 웹 검색 시도: '{prepared['query']}'", {"query": prepared["query"]})
+                search_evidence = prepared["evidence"]
+                yield DebateEvent("status", speaker, "✅ 증거 확보 완료" if search_evidence else "❌ 검색 결과 없음")
+            else:
+                yield DebateEvent("status", speaker, "⚡ 자체 논리로 대응합니다.")
+        excerpts = await self._reference_excerpts(context_str)
+        if excerpts:
+            yield DebateEvent("status", speaker, "📚 참고 자료에서 관련 대목을 인용합니다.")
+            search_evidence = "\n\n".join(block for block in (search_evidence, excerpts) if block)
+
+        provider = "openai" if speaker == "left" else "anthropic"
+        system_prompt = get_system_prompt(speaker, turn_count=self.turn_count)
+        context_report = {}
+        api_messages = build_api_messages(speaker, self.messages, provider=provider,
+                                          report=context_report, search_evidence=search_evidence)
+        yield DebateEvent("context", speaker, data=context_report)
+
+        usage, timings, outcome = {}, {}, {}
+        if speaker == "left":
+            make_stream = lambda model, partial, control: stream_openai(
+                self.api_keys["openai"], system_prompt, resume_messages(provider, api_messages, partial), usage,
+                model=model, timings=timings, control=control, **tool_kwargs)
+        else:
+            make_stream = lambda model, partial, control: stream_anthropic(
+                self.api_keys["anthropic"], system_prompt, resume_messages(provider, api_messages, partial),
+                context_report["stable_messages"], usage, model=model, timings=timings, control=control,
+                **tool_kwargs)
+
+        estimated = context_report["sent_tokens"] + estimate_tokens(system_prompt) + OUTPUT_TOKEN_ESTIMATE
+        response_text = ""
+        try:
+            async for item in self._timed_stream(speaker, provider, estimated, make_stream, spans, timings, outcome,
+                                                 usage):
+                if isinstance(item, ToolNotice):
+                    yield self._tool_status(speaker, item)
+                    continue
+                if isinstance(item, RetryNotice):
+                    yield self._retry_status(speaker, item)
+                    continue
+                if isinstance(item, QueueNotice):
+                    yield self._queue_status(speaker, item)
+                    continue
+                response_text += item
+                if (self._prefetch is None and len(response_text) >= PREFETCH_AFTER_CHARS and
+                        self.turn_count + 1 < self.max_turns and self.search_mode in ("agent", "heuristic")):
+                    self._schedule_prefetch(rival_of(speaker), response_text)
+                yield DebateEvent("delta", speaker, item)
+        except Exception as e:
+            salvaged = self._salvage(response_text)
+            if salvaged is None:
+                self._trace("error", speaker, provider, spans, usage, error=describe_error(e), **outcome)
+                yield DebateEvent("error", speaker, f"오류 발생: {e}", {"partial": response_text})
+                return
+            yield DebateEvent("status", speaker, "✂️ 응답이 끝내 끊겨, 받은 부분까지만 발언으로 인정합니다.")
+            response_text, outcome["truncated"] = salvaged, True
+
+        message = make_message(speaker, response_text, usage=usage)
+        self.messages.append(message)
+        self.turn_count += 1
+        self._schedule_note()
+        trace = self._trace("turn", speaker, provider, spans, usage, turn=self.turn_count, **outcome)
+        yield DebateEvent("message", speaker, response_text,
+                          {"turn_count": self.turn_count, "usage": usage, "trace": trace})
+
+    async def run_judge(self):
+        yield DebateEvent("judge_start", "chief")
+        spans = {}
+        if self.judge_notes:
+            # 마지막 라운드 노트는 보통 이 시점에 작성 중이다. 잠깐 기다렸다가 노트 + 남은 원문으로 판결
+            with timed(spans, "notes_wait"):
+                await self._run_blocking(self.judge_notes.wait)
+            notes = self._notes_event()
+            if notes:
+                yield notes
+            context_history = self.judge_notes.build_context(self.messages)
+        else:
+            context_history = build_judge_context(self.messages)
+        system_prompt = get_system_prompt("chief", context_history=context_history)
+        key = verdict_key(system_prompt)
+        with timed(spans, "verdict_share_wait"):
+            shared, owner = await self._shared_verdict(key)
+        if shared is not None:
+            yield DebateEvent("status", "chief", "♻️ 같은 기록에 대한 판결이 이미 있어 그대로 가져옵니다.")
+            yield DebateEvent("delta", "chief", shared)
+            self.messages.append(make_message("chief", shared))
+            trace = self._trace("judge", "chief", "gemini", spans, {}, context_chars=len(context_history),
+                                noted_rounds=self._noted_rounds, shared=True)
+            yield DebateEvent("verdict", "chief", shared, {"usage": {}, "trace": trace, "shared": True})
+            return
+        verdict = None
+        try:
+            async for event in self._judge_stream(system_prompt, context_history, spans):
+                if event.kind == "verdict" and not event.data["trace"].get("truncated"):
+                    verdict = event.text
+                yield event
+        finally:
+            self._finish_shared_verdict(key, owner, verdict)
+
+    async def _judge_stream(self, system_prompt, context_history, spans):
+        usage, timings, outcome = {}, {}, {}
+        estimated = estimate_tokens(system_prompt) + OUTPUT_TOKEN_ESTIMATE
+        make_stream = lambda model, partial, control: stream_gemini(
+            self.api_keys["google"], resume_prompt(system_prompt, partial), usage, model=model, timings=timings,
+            control=control, timeout=self.stream_policy.turn_timeout)
+        response_text = ""
+        try:
+            async for chunk in self._timed_stream("chief", "gemini", estimated, make_stream, spans, timings, outcome,
+                                                  usage):
+                if isinstance(chunk, RetryNotice):
+                    yield self._retry_status("chief", chunk)
+                    continue
+                if isinstance(chunk, QueueNotice):
+                    yield self._queue_status("chief", chunk)
+                    continue
+                response_text += chunk
+                yield DebateEvent("delta", "chief", chunk)
+        except Exception as e:
+            salvaged = self._salvage(response_text)
+            if salvaged is None:
+                self._trace("error", "chief", "gemini", spans, usage, error=describe_error(e), **outcome)
+                yield DebateEvent("error", "chief", f"판결 중 오류: {e}", {"partial": response_text})
+                return
+            yield DebateEvent("status", "chief", "✂️ 판결문이 끝내 끊겨, 받은 부분까지만 판결로 인정합니다.")
+            response_text, outcome["truncated"] = salvaged, True
+        self.messages.append(make_message("chief", response_text, usage=usage))
+        trace = self._trace("judge", "chief", "gemini", spans, usage, context_chars=len(context_history),
+                            noted_rounds=self._noted_rounds, **outcome)
+        yield DebateEvent("verdict", "chief", response_text, {"usage": usage, "trace": trace})
+
+    async def _shared_verdict(self, key):
+        """같은 판결 입력의 결과를 찾는다. 반환: (verdict, owner)
+
+        저장된 판결이나 다른 세션이 진행 중인 판결이 있으면 verdict로 돌려준다. 없으면 owner(Future)를 받아
+        직접 판결하고, 끝나면 _finish_shared_verdict로 기다리던 쪽에 결과를 넘긴다."""
+        if self.verdict_store is not None:
+            cached = await self._run_blocking(self.verdict_store.get_verdict, key)
+            if cached is not None:
+                return cached, None
+        with _verdicts_lock:
+            future = _verdicts_inflight.get(key)
+            if future is None:
+                future = _verdicts_inflight[key] = Future()
+                return None, future
+        try:
+            # 먼저 시작한 쪽이 실패하거나 너무 오래 걸리면 직접 판결한다 (공유 future는 취소하지 않는다)
+            verdict = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                             self.stream_policy.turn_timeout)
+        except asyncio.TimeoutError:
+            verdict = None
+        return verdict, None
+
+    def _finish_shared_verdict(self, key, owner, verdict):
+        if owner is None:
+            return
+        if verdict is not None and self.verdict_store is not None:
+            self.verdict_store.put_verdict(key, verdict)
+        with _verdicts_lock:
+            if _verdicts_inflight.get(key) is owner:
+                del _verdicts_inflight[key]
+        if not owner.done():
+            owner.set_result(verdict)
+
+    # ---- 계측 ------------------------------------------------------------
+    def _log_stop(self, reason):
+        log.info("토론 종료 (%s, %d턴): %s", reason, self.turn_count,
+                 json.dumps(self.stop_detail, ensure_ascii=False))
+        if self.tracer is not None:
+            self.tracer.record({"type": "stop", "reason": reason, "turn": self.turn_count,
+                                "max_turns": self.max_turns, "detail": self.stop_detail})
+
+    async def _timed_stream(self, role, provider, estimated, make_stream, spans, timings, outcome, usage):
+        """make_stream(model, partial, control)로 만든 스트림을 데드라인/재시도/대체 모델과 함께 흘려보낸다.
+
+        레이트 리미터 대기, 응답 헤더(connect), 첫 토큰(ttft), 스트림 전체 시간은 spans에, 실제로 쓴 모델과
+        시도 횟수·재시도 내역은 outcome에 기록한다. 재시도하면 이미 받은 부분에 이어 쓰게 하므로 호출자는
+        받은 텍스트를 그대로 이어 붙이면 된다. 재시도를 다 쓰면 마지막 예외를 그대로 올린다.
+        시도마다 estimated 토큰을 차감하므로 정산도 시도가 끝날 때마다 한다 (성공은 usage, 실패는 받은 만큼)."""
+        policy = self.stream_policy
+        primary = PROVIDER_MODELS[provider]
+        began = time.perf_counter()
+        started = model = last_error = None
+        partial = ""
+        outcome.update(model=primary, attempts=0, retries=[])
+        for attempt in range(policy.max_attempts):
+            model = policy.model_for(role, primary, attempt, last_error, current=model)
+            outcome.update(model=model, attempts=attempt + 1)
+            if attempt:
+                yield RetryNotice(attempt + 1, policy.max_attempts, model, describe_error(last_error), len(partial))
+            control = StreamControl()
+            gate = self._gate(provider, estimated)
+            waited = time.perf_counter()
+            charged, attempt_from = False, len(partial)
+            try:
+                async for notice in self._queue_notices(provider, gate):
+                    yield notice
+                async with gate:
+                    charged = True
+                    now = time.perf_counter()
+                    started = started or now
+                    spans["rate_limit_wait"] = round(spans.get("rate_limit_wait", 0.0) + now - waited, 4)
+                    began += now - waited  # 대기열에서 기다린 시간은 턴 데드라인에 넣지 않는다
+                    stream = iterate_in_thread(lambda model=model, partial=partial: make_stream(model, partial, control))
+                    try:
+                        got_text = False
+                        while True:
+                            phase, limit = ("chunk", policy.chunk_timeout) if got_text else ("ttft", policy.ttft_timeout)
+                            remaining = policy.turn_timeout - (time.perf_counter() - began)
+                            if remaining < limit:
+                                phase, limit = "turn", max(remaining, 0.0)
+                            try:
+                                item = await asyncio.wait_for(stream.__anext__(), limit)
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                raise StreamStalled(phase, policy.turn_timeout if phase == "turn" else limit) from None
+                            if isinstance(item, str):
+                                if "ttft" not in spans:
+                                    spans["ttft"] = round(time.perf_counter() - started, 4)
+                                got_text = True
+                                partial += item
+                            yield item
+                    finally:
+                        control.abort()
+                        await stream.aclose()
+                        spans["stream"] = round(time.perf_counter() - started, 4)
+                        spans.update(timings)
+                self._settle(provider, estimated, usage)
+                return
+            except Exception as e:
+                if charged:
+                    self._settle_failed(provider, estimated, partial[attempt_from:])
+                elapsed = time.perf_counter() - began
+                wait = policy.backoff_seconds(attempt)
+                retry = (is_transient(e) and attempt + 1 < policy.max_attempts
+                         and not (isinstance(e, StreamStalled) and e.phase == "turn")
+                         and elapsed + wait < policy.turn_timeout)
+                outcome["retries"].append({"attempt": attempt + 1, "model": model, "error": describe_error(e),
+                                           "elapsed_s": round(elapsed, 2), "partial_chars": len(partial)})
+                log.warning("%s/%s 스트림 실패 (시도 %d/%d, %.1fs, 받은 글자 %d): %s%s", role, model, attempt + 1,
+                            policy.max_attempts, elapsed, len(partial), describe_error(e),
+                            f" → {wait:.1f}s 뒤 재시도" if retry else "")
+                if not retry:
+                    raise
+                last_error = e
+                with timed(spans, "retry_wait"):
+                    await asyncio.sleep(wait)
+            finally:
+                self._release(gate)
+
+    def _queue_status(self, speaker, notice):
+        if notice.position:
+            text = f"⏳ 요청이 몰려 {notice.provider} 대기열 {notice.position}번째에서 차례를 기다립니다."
+        else:
+            text = "🚦 차례가 되어 답변을 시작합니다."
+        return DebateEvent("status", speaker, text, {"queue": asdict(notice)})
+
+    def _retry_status(self, speaker, notice):
+        resumed = f", 받은 {notice.resumed_chars}자에 이어서" if notice.resumed_chars else ""
+        return DebateEvent("status", speaker,
+                           f"🔁 응답 지연/오류로 다시 요청합니다 ({notice.attempt}/{notice.max_attempts}, "
+                           f"{notice.model}{resumed}) — {notice.reason}",
+                           {"retry": asdict(notice)})
+
+    def _salvage(self, partial):
+        # 재시도를 다 써도 충분히 받은 답변은 버리지 않고 잘린 채로 발언/판결로 인정한다
+        if len(partial.strip()) < self.stream_policy.min_partial_chars:
+            return None
+        return partial.rstrip() + "\n\n_(연결 문제로 답변이 여기서 끊겼습니다)_"
+
+    def _trace(self, kind, role, provider, spans, usage, model=None, **extra):
+        model = model or PROVIDER_MODELS[provider]
+        generating = spans.get("stream", 0.0) - spans.get("ttft", 0.0)
+        if self.search_mode == "tools":
+            generating -= spans.get("ddg_search", 0.0)  # 도구 호출 검색은 스트림 도중에 일어난다
+        record = {
+            "type": kind,
+            "role": role,
+            "provider": provider,
+            "model": model,
+            "search_mode": self.search_mode,
+            "spans": dict(spans),
+            "usage": dict(usage),
+            "tokens_per_s": round(usage.get("output_tokens", 0) / generating, 1) if generating > 0 else 0.0,
+            "cost_usd": estimate_cost(model, usage),
+            **extra,
+        }
+        if self.tracer is not None:
+            record = self.tracer.record(record)
+        return record
+
+
+# --------------------------------------------------------------------------
+# CLI: python debate_engine.py "논쟁 주제" [--turns 10] [--no-judge] [--events]
+# --------------------------------------------------------------------------
+async def _run_cli(args):
+    keys = {
+        "openai": os.environ.get("OPENAI_API_KEY", ""),
+        "anthropic": os.environ.get("ANTHROPIC_API_KEY", ""),
+        "google": os.environ.get("GOOGLE_API_KEY", ""),
+    }
+    tracer = Tracer(uuid.uuid4().hex[:12], directory=args.trace_dir) if args.trace_dir else None
+    engine = DebateEngine(keys, max_turns=args.turns, search_mode=args.search_mode, tracer=tracer,
+                          judge_notes=None if args.notes else False)
+    engine.add_user_message(args.topic)
+    events = engine.run() if args.judge else engine.run_turns()
+    failed = False
+    async for event in events:
+        failed = failed or event.kind == "error"
+        if args.events:
+            print(json.dumps(event.to_dict(), ensure_ascii=False), flush=True)
+        elif event.kind in ("turn_start", "judge_start"):
+            label = {"left": "🔥 ChatGPT", "right": "❄️ Claude", "chief": "⚖️ Gemini"}[event.role]
+            print(f"\n\n===== {label} =====", flush=True)
+        elif event.kind == "status":
+            print(f"  {event.text}", file=sys.stderr, flush=True)
+        elif event.kind == "delta":
+            print(event.text, end="", flush=True)
+        elif event.kind == "notes":
+            score = event.data["score"]
+            print(f"\n  [심판 노트 {event.data['rounds']}라운드] 🔥 {score['left']} : {score['right']} ❄️",
+                  file=sys.stderr, flush=True)
+        elif event.kind in ("stopped", "error"):
+            print(f"\n[{event.kind}] {event.text or event.data.get('reason')}", file=sys.stderr, flush=True)
+    if tracer is not None:
+        print(f"\n[trace] {tracer.path}: {json.dumps(tracer.summary()['cost_usd'])}", file=sys.stderr, flush=True)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Death Match 헤드리스 실행")
+    parser.add_argument("topic", help="논쟁 주제")
+    parser.add_argument("--turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--no-judge", dest="judge", action="store_false", help="판결 단계 생략")
+    parser.add_argument("--events", action="store_true", help="이벤트를 JSON Lines로 출력")
+    parser.add_argument("--no-notes", dest="notes", action="store_false", help="라운드별 심판 노트 없이 원문으로 판결")
+    parser.add_argument("--search-mode", choices=SEARCH_MODES, default=DEFAULT_SEARCH_MODE)
+    parser.add_argument("--trace-dir", help="턴별 계측 JSONL을 남길 디렉터리")
+    args = parser.parse_args(argv)
+    return asyncio.run(_run_cli(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# --------------------------------------------------------------------------
+# 업로드 문서 텍스트 추출 (내용 해시 캐시 + 페이지 병렬 처리)
+# --------------------------------------------------------------------------
+# Streamlit은 파일이 업로더에 남아 있는 한 rerun마다 추출 코드를 다시 실행한다.
+# 추출 결과를 파일 내용의 해시로 캐시해서 같은 파일은 한 번만 파싱하고,
+# 큰 PDF는 앞 몇 페이지를 먼저 뽑아 미리보기로 보여 준 뒤 나머지를 프로세스 풀에서 나눠 처리한다.
+
+MAX_PDF_PAGES = 300        # 이 이후 페이지는 읽지 않음
+MAX_DOC_CHARS = 400_000    # 추출 텍스트 상한
+PREVIEW_PAGES = 3          # 프로세스 풀을 기다리지 않고 바로 뽑는 앞 페이지 수
+PARALLEL_MIN_PAGES = 24    # 이보다 짧은 PDF는 그냥 현재 프로세스에서 처리
+PAGES_PER_TASK = 12
+CACHE_SIZE = 16
+
+TEXT_TYPES = ["text/plain", "text/markdown", "application/octet-stream"]
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class Extraction:
+    def __init__(self, digest, name=""):
+        self.hash = digest
+        self.name = name
+        self.pages = []            # 페이지 순서대로의 텍스트 (None = 아직 추출 전)
+        self.total_pages = 0
+        self.error = None
+        self.truncated = False
+        self.complete = False
+        self._text = None
+
+    @property
+    def done_pages(self):
+        return sum(1 for page in self.pages if page is not None)
+
+    def ready_prefix(self):
+        # 앞에서부터 끊김 없이 추출된 페이지들 (미리보기용)
+        prefix = []
+        for page in self.pages:
+            if page is None:
+                break
+            prefix.append(page)
+        return "\n".join(prefix)
+
+    @property
+    def text(self):
+        if self._text is None:
+            text = "\n".join(page for page in self.pages if page is not None)
+            if len(text) > MAX_DOC_CHARS:
+                text, self.truncated = text[:MAX_DOC_CHARS], True
+            if self.complete:
+                self._text = text
+            return text
+        return self._text
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_cached(digest):
+    with _cache_lock:
+        doc = _cache.get(digest)
+        if doc is not None:
+            _cache.move_to_end(digest)
+        return doc
+
+
+def _remember(doc):
+    with _cache_lock:
+        _cache[doc.hash] = doc
+        _cache.move_to_end(doc.hash)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _get_pool():
+    # spawn: Streamlit 서버 프로세스(스레드 다수)를 fork하지 않도록 한다
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _extract_page_range(path, start, stop):
+    # 프로세스 풀 워커에서 실행: 임시 파일에서 PDF를 열어 지정한 페이지 범위만 추출
+    import pypdf
+    reader = pypdf.PdfReader(path)
+    return start, [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def extract_stream(data, mime_type, name=""):
+    """추출 진행 상황을 Extraction 객체로 여러 번 내보낸다 (같은 객체가 점점 채워짐).
+
+    캐시에 있으면 완료된 객체를 한 번만 내보낸다. 실패 시 doc.error에 '⚠️' 메시지가 담긴다."""
+    digest = content_hash(data)
+    cached = get_cached(digest)
+    if cached is not None:
+        yield cached
+        return
+
+    doc = Extraction(digest, name)
+    try:
+        if mime_type in TEXT_TYPES:
+            doc.pages = [data.decode("utf-8")]
+            doc.total_pages = 1
+        elif mime_type == "application/pdf":
+            yield from _extract_pdf(doc, data)
+        else:
+            doc.error = f"⚠️ 지원되지 않는 형식 ({mime_type})"
+    except ImportError:
+        doc.error = "⚠️ PDF 처리를 위해 'pip install pypdf'가 필요합니다."
+    except Exception as e:
+        doc.error = f"⚠️ [PDF 오류] {e}" if mime_type == "application/pdf" else f"⚠️ [파일 오류] {e}"
+
+    doc.complete = True
+    if doc.error is None:
+        _remember(doc)
+    yield doc
+
+
+def _extract_pdf(doc, data):
+    import pypdf
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    doc.total_pages = min(len(reader.pages), MAX_PDF_PAGES)
+    doc.truncated = len(reader.pages) > MAX_PDF_PAGES
+    doc.pages = [None] * doc.total_pages
+
+    # 1) 앞 페이지는 바로 추출해서 미리보기로 내보낸다
+    head = min(PREVIEW_PAGES, doc.total_pages)
+    for i in range(head):
+        doc.pages[i] = reader.pages[i].extract_text() or ""
+    yield doc
+
+    remaining = range(head, doc.total_pages)
+    if len(remaining) < PARALLEL_MIN_PAGES:
+        chars = sum(len(page) for page in doc.pages[:head])
+        for i in remaining:
+            doc.pages[i] = reader.pages[i].extract_text() or ""
+            chars += len(doc.pages[i]) + 1
+            if chars > MAX_DOC_CHARS:
+                doc.truncated = True
+                break
+            if (i + 1) % PAGES_PER_TASK == 0:
+                yield doc
+        doc.pages = [page for page in doc.pages if page is not None]
+        return
+
+    # 2) 나머지는 페이지 묶음 단위로 프로세스 풀에 나눠 맡긴다 (워커는 임시 파일에서 직접 읽음)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(data)
+        path = tmp.name
+    pool = _get_pool()
+    futures = {
+        pool.submit(_extract_page_range, path, start, min(start + PAGES_PER_TASK, doc.total_pages))
+        for start in range(head, doc.total_pages, PAGES_PER_TASK)
+    }
+    try:
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, texts = future.result()
+                doc.pages[start:start + len(texts)] = texts
+            yield doc
+            if len(doc.ready_prefix()) > MAX_DOC_CHARS:
+                # 글자 상한을 이미 채웠으면 뒤쪽 페이지는 버린다
+                for future in futures:
+                    future.cancel()
+                doc.truncated = True
+                break
+    finally:
+        os.unlink(path)
+    doc.pages = [page for page in doc.pages if page is not None]
@@ -0,0 +1,194 @@
+import json
+import re
+import threading
+import time
+
+from context_window import REFERENCE_MARKER, split_reference
+from providers import GEMINI_FLASH_MODEL, get_registry
+from prompts import JUDGE_ROLE_NAMES
+from retrieval import retrieve_excerpts
+
+# --------------------------------------------------------------------------
+# 라운드별 심판 노트 (판결 준비를 토론 중에 미리 해 둔다)
+# --------------------------------------------------------------------------
+# 한 라운드(ChatGPT → Claude)가 끝날 때마다 가벼운 모델이 백그라운드에서 그 라운드의 주장, 사용한 증거,
+# 쟁점별 우세를 JSON 노트로 뽑는다. 최종 판결은 원문 대신 이 노트를 읽으므로 입력이 작고 빨라진다.
+# 노트가 없거나 실패한 구간은 판결 컨텍스트에 원문 그대로 들어간다 (정보가 빠지지 않음).
+
+NOTES_MODEL = GEMINI_FLASH_MODEL
+NOTE_TOKEN_ESTIMATE = 1200
+NOTES_WAIT_SECONDS = 20.0   # 판결 직전 진행 중인 노트를 기다리는 최대 시간
+MAX_CLAIM_CHARS = 160
+REFERENCE_NOTE_CHARS = 1500  # 노트 프롬프트/판결 컨텍스트에 넣는 [참고 자료] 상한 (원문은 최대 40만 자)
+
+NOTE_PROMPT = """You are the note-taker for a debate judge (JUDGE NOTES). Read ONE round of the debate below and
+return ONLY a JSON object, no prose, in the same language as the debate:
+{{"claims": {{"left": ["..."], "right": ["..."]}},
+ "evidence": ["facts, numbers or sources actually cited"],
+ "points": [{{"point": "issue in a few words", "winner": "left" | "right" | "draw", "why": "one short reason"}}]}}
+left = ChatGPT (strategist), right = Claude (critic). At most 3 claims per side and 3 points. Keep every item short.
+
+[Original question]
+{question}
+
+[Round {round}]
+{round_text}"""
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def cap_reference(content, query=""):
+    # 사용자 발언에 붙은 [참고 자료]는 query와 관련된 BM25 발췌(없으면 앞부분)로만 남긴다
+    prompt, reference = split_reference(content)
+    if reference is None:
+        return content
+    excerpt = retrieve_excerpts(reference, query, max_chars=REFERENCE_NOTE_CHARS) if query else None
+    if not excerpt:
+        excerpt = reference[:REFERENCE_NOTE_CHARS] + ("…" if len(reference) > REFERENCE_NOTE_CHARS else "")
+    return f"{prompt}\n\n{REFERENCE_MARKER}\n{excerpt}"
+
+
+def _debate_text(round_messages):
+    return " ".join(m["content"] for m in round_messages if m["role"] in ("left", "right"))
+
+
+def parse_note(text):
+    # 모델이 코드 블록이나 설명을 덧붙여도 가장 바깥 JSON 객체만 읽는다. 형식이 틀리면 None
+    match = _JSON_OBJECT.search(text or "")
+    if not match:
+        return None
+    try:
+        note = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(note, dict):
+        return None
+    claims = note.get("claims") if isinstance(note.get("claims"), dict) else {}
+    points = [p for p in note.get("points") or [] if isinstance(p, dict) and p.get("point")]
+    return {
+        "claims": {side: [str(c)[:MAX_CLAIM_CHARS] for c in claims.get(side) or []][:3] for side in ("left", "right")},
+        "evidence": [str(e)[:MAX_CLAIM_CHARS] for e in note.get("evidence") or []][:5],
+        "points": [{"point": str(p["point"])[:MAX_CLAIM_CHARS],
+                    "winner": p.get("winner") if p.get("winner") in ("left", "right") else "draw",
+                    "why": str(p.get("why") or "")[:MAX_CLAIM_CHARS]} for p in points][:3],
+    }
+
+
+class JudgeNotes:
+    """라운드 노트 모음. 메시지 인덱스 구간 [start, end)마다 노트 하나.
+
+    Streamlit에서는 session_state에 두고 rerun을 넘어 엔진들이 공유한다. 노트 작성은 엔진의 스레드 풀에서
+    돌고 결과를 직접 여기에 기록하므로, 이벤트 루프가 먼저 끝나도 결과가 버려지지 않는다."""
+
+    def __init__(self):
+        self.notes = {}        # start -> {"start", "end", "round", "note"}
+        self.covered_until = 0  # 노트 작성을 이미 맡긴 마지막 메시지 인덱스
+        self._pending = {}     # start -> threading.Event
+        self._lock = threading.Lock()
+
+    # ---- 라운드 분할 -----------------------------------------------------
+    def claim_round(self, messages):
+        """Claude 발언으로 라운드가 끝났으면 아직 노트가 없는 구간 (start, end)를 예약해 돌려준다."""
+        with self._lock:
+            end = len(messages)
+            if not messages or messages[-1]["role"] != "right" or end <= self.covered_until:
+                return None
+            # 노트 없이 지나간 구간(재개한 토론 등)은 원문으로 두고 마지막 라운드만 맡는다
+            start = next((i for i in range(end - 1, self.covered_until - 1, -1) if messages[i]["role"] == "left"),
+                         self.covered_until)
+            if start > self.covered_until and messages[start - 1]["role"] == "user":
+                start -= 1
+            self.covered_until = end
+            self._pending[start] = threading.Event()
+            return start, end
+
+    def write_note(self, api_key, messages, start, end, usage=None):
+        # 블로킹 호출 (스레드 풀에서 실행). 실패하면 대기자를 풀어 준 뒤 예외를 그대로 올린다
+        # (호출자가 잡아 기록하고, 해당 구간은 판결 때 원문으로 들어간다)
+        round_no = sum(1 for m in messages[:end] if m["role"] == "right")
+        question = split_reference(next((m["content"] for m in messages if m["role"] == "user"), ""))[0][:1500]
+        query = _debate_text(messages[start:end])
+        round_text = "".join(
+            f"[{JUDGE_ROLE_NAMES.get(m['role'], m['role'])}] : "
+            f"{cap_reference(m['content'], query) if m['role'] == 'user' else m['content']}\n"
+            for m in messages[start:end]
+        )
+        note = None
+        try:
+            response = get_registry().gemini(api_key, NOTES_MODEL).generate_content(
+                NOTE_PROMPT.format(question=question, round=round_no, round_text=round_text))
+            note = parse_note(response.text)
+            metadata = getattr(response, "usage_metadata", None)
+            if metadata and usage is not None:
+                usage.update({"input_tokens": metadata.prompt_token_count,
+                              "output_tokens": metadata.candidates_token_count})
+        finally:
+            with self._lock:
+                if note is not None:
+                    self.notes[start] = {"start": start, "end": end, "round": round_no, "note": note}
+                event = self._pending.pop(start, None)
+            if event is not None:
+                event.set()
+        return note
+
+    def abandon(self, start):
+        # 노트 작성이 시작되지 못한 구간: 기다리는 쪽을 풀어 준다 (판결에는 원문으로 들어감)
+        with self._lock:
+            event = self._pending.pop(start, None)
+        if event is not None:
+            event.set()
+
+    def wait(self, timeout=NOTES_WAIT_SECONDS):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            events = list(self._pending.values())
+        for event in events:
+            event.wait(max(deadline - time.monotonic(), 0))
+
+    # ---- 조회 ------------------------------------------------------------
+    def scoreboard(self):
+        score = {"left": 0, "right": 0, "draw": 0}
+        with self._lock:
+            rounds = sorted(self.notes.values(), key=lambda n: n["start"])
+        for entry in rounds:
+            for point in entry["note"]["points"]:
+                score[point["winner"]] += 1
+        return {"rounds": len(rounds), "score": score,
+                "last_points": rounds[-1]["note"]["points"] if rounds else []}
+
+    def build_context(self, messages):
+        """판결 프롬프트용 컨텍스트: 노트가 있는 구간은 노트, 나머지(사용자 발언, 미완성 라운드 등)는 원문."""
+        with self._lock:
+            notes = dict(self.notes)
+        lines, i = [], 0
+        while i < len(messages):
+            entry = notes.get(i)
+            if entry is not None and entry["end"] <= len(messages):
+                lines.append(self._render_note(messages[i:entry["end"]], entry))
+                i = entry["end"]
+                continue
+            m = messages[i]
+            if m["role"] == "user":
+                lines.append(f"[{JUDGE_ROLE_NAMES['user']}] : {cap_reference(m['content'], _debate_text(messages))}\n")
+            elif m["role"] in ("left", "right"):
+                lines.append(f"[{JUDGE_ROLE_NAMES[m['role']]}] : {m['content']}\n")
+            i += 1
+        return "".join(lines)
+
+    @staticmethod
+    def _render_note(round_messages, entry):
+        note = entry["note"]
+        lines = [f"[Round {entry['round']} — judge notes]"]
+        # 라운드 안의 사용자 발언(중간 개입)은 요약하지 않고 그대로 둔다. 첨부 문서만 관련 발췌로 줄인다
+        query = _debate_text(round_messages)
+        lines += [f"[{JUDGE_ROLE_NAMES['user']}] : {cap_reference(m['content'], query)}"
+                  for m in round_messages if m["role"] == "user"]
+        for side in ("left", "right"):
+            for claim in note["claims"][side]:
+                lines.append(f"- {JUDGE_ROLE_NAMES[side]} 주장: {claim}")
+        for evidence in note["evidence"]:
+            lines.append(f"- 근거: {evidence}")
+        for point in note["points"]:
+            winner = JUDGE_ROLE_NAMES.get(point["winner"], "무승부")
+            lines.append(f"- 쟁점 '{point['point']}' → {winner}" + (f" ({point['why']})" if point["why"] else ""))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,264 @@
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# --------------------------------------------------------------------------
+# 벤치마크용 로컬 목(mock) 프로바이더 서버
+# --------------------------------------------------------------------------
+# 실제 SDK가 네트워크 대신 이 서버로 붙도록 해서 (OPENAI_BASE_URL, ANTHROPIC_BASE_URL,
+# GEMINI_API_ENDPOINT, SEARCH_BACKEND_URL) 벤더 지연 없이 앱 자체의 오버헤드만 잰다.
+#
+#   POST /v1/chat/completions                       OpenAI SSE 스트림 (include_usage 마지막 청크 포함)
+#   POST /v1/messages                               Anthropic SSE 이벤트 스트림
+#   POST /v1beta/models/{model}:streamGenerateContent  Gemini REST 스트림 (JSON 배열)
+#   POST /v1beta/models/{model}:generateContent        Gemini 단건 응답 (검색 판단 에이전트, 심판 노트)
+#   GET  /search?q=...&max_results=N                DDG 대체 검색 결과 (JSON)
+
+WORDS = ("리스크 기회비용 데이터 시장 점유율 전략 실행 실패 성장률 규제 비용 수익 고객 경쟁사 "
+         "decision risk growth market cost evidence plan").split()
+
+
+@dataclass
+class MockConfig:
+    first_byte_delay: float = 0.05   # 응답 헤더 후 첫 청크까지
+    chunk_delay: float = 0.01        # 청크 간격
+    chunk_chars: int = 12            # 청크당 글자 수
+    response_chars: int = 600        # 응답 길이
+    failure_rate: float = 0.0        # 요청당 HTTP 500 확률
+    stall_rate: float = 0.0          # 스트림 요청당 중간에 멈출 확률 (절반쯤 보낸 뒤 stall_seconds 동안 침묵)
+    stall_seconds: float = 60.0
+    search_delay: float = 0.05
+    seed: int = 7
+
+    def stream_seconds(self):
+        # 지연만으로 이론상 걸리는 스트림 시간 (앱 오버헤드 = 실측 - 이 값)
+        return self.first_byte_delay + self.chunk_delay * -(-self.response_chars // self.chunk_chars)
+
+
+class MockState:
+    def __init__(self, config):
+        self.config = config
+        self.requests = {}
+        self.failures = 0
+        self.stalls = 0
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            fail = self._random.random() < self.config.failure_rate
+            self.failures += fail
+            return fail
+
+    def stall(self):
+        with self._lock:
+            stall = self._random.random() < self.config.stall_rate
+            self.stalls += stall
+            return stall
+
+    def text(self):
+        with self._lock:
+            words = [self._random.choice(WORDS) for _ in range(self.config.response_chars // 4)]
+        body = " ".join(words)
+        # 문단 구분이 있어야 렌더러의 문단 고정 경로도 탄다
+        return "\n\n".join(body[i:i + 200] for i in range(0, len(body), 200))[:self.config.response_chars]
+
+    def chunks(self, text):
+        size = self.config.chunk_chars
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive (SDK 커넥션 풀 재사용 경로도 재현)
+    state = None                    # start_mock_server가 서브클래스에 주입
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        data = data.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _stream(self, content_type, pieces):
+        config = self.state.config
+        self._start_stream(content_type)
+        time.sleep(config.first_byte_delay)
+        stall_at = len(pieces) // 2 if self.state.stall() else None
+        try:
+            for n, piece in enumerate(pieces):
+                if n:
+                    time.sleep(config.chunk_delay)
+                if n == stall_at:
+                    time.sleep(config.stall_seconds)
+                self._write_chunk(piece)
+            self._end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 데드라인을 넘겨 연결을 끊었다
+            self.close_connection = True
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        route = ("openai" if path.endswith("/chat/completions") else
+                 "anthropic" if path.endswith("/messages") else
+                 "gemini_stream" if path.endswith(":streamGenerateContent") else
+                 "gemini" if path.endswith(":generateContent") else None)
+        if route is None:
+            self._send_json(404, {"error": {"message": f"unknown route {path}"}})
+            return
+        request = self._read_json()
+        if self.state.count(route):
+            self._send_json(500, {"error": {"message": "mock failure", "type": "server_error"}})
+            return
+        getattr(self, f"_{route}")(request)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path != "/search":
+            self._send_json(404, {"error": "not found"})
+            return
+        if self.state.count("search"):
+            self._send_json(500, {"error": "mock failure"})
+            return
+        time.sleep(self.state.config.search_delay)
+        params = parse_qs(parts.query)
+        query = params.get("q", [""])[0]
+        limit = int(params.get("max_results", ["3"])[0])
+        self._send_json(200, [
+            {"title": f"{query} 관련 자료 {i}", "body": f"{query}에 대한 통계 {i * 7}% 증가 ({i})",
+             "href": f"https://example.com/{abs(hash(query)) % 1000}/{i}"}
+            for i in range(1, limit + 1)
+        ])
+
+    # ---- 프로바이더별 응답 형식 -------------------------------------------
+    def _openai(self, request):
+        text = self.state.text()
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "mock")}
+        pieces = [
+            "data: " + json.dumps({**base, "choices": [
+                {"index": 0, "delta": {"role": "assistant", "content": chunk}, "finish_reason": None}]}) + "\n\n"
+            for chunk in self.state.chunks(text)
+        ]
+        pieces.append("data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}) + "\n\n")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            pieces.append("data: " + json.dumps({**base, "choices": [], "usage": {
+                "prompt_tokens": 1200, "completion_tokens": len(text) // 2, "total_tokens": 1200 + len(text) // 2,
+                "prompt_tokens_details": {"cached_tokens": 1024}}}) + "\n\n")
+        pieces.append("data: [DONE]\n\n")
+        self._stream("text/event-stream", pieces)
+
+    def _anthropic(self, request):
+        text = self.state.text()
+
+        def event(name, payload):
+            return f"event: {name}\ndata: {json.dumps({'type': name, **payload})}\n\n"
+
+        pieces = [
+            event("message_start", {"message": {
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": request.get("model", "mock"),
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": 200, "output_tokens": 1, "cache_read_input_tokens": 1000,
+                          "cache_creation_input_tokens": 0}}}),
+            event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}}),
+        ]
+        pieces += [event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+                   for chunk in self.state.chunks(text)]
+        pieces += [
+            event("content_block_stop", {"index": 0}),
+            event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                    "usage": {"output_tokens": len(text) // 2}}),
+            event("message_stop", {}),
+        ]
+        self._stream("text/event-stream", pieces)
+
+    def _gemini_payload(self, text, final=False):
+        payload = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+        if final:
+            payload["candidates"][0]["finishReason"] = "STOP"
+            payload["usageMetadata"] = {"promptTokenCount": 3000, "candidatesTokenCount": 400, "totalTokenCount": 3400}
+        return payload
+
+    def _gemini_stream(self, request):
+        # REST 스트리밍은 SSE가 아니라 JSON 배열을 조금씩 흘려보낸다
+        chunks = self.state.chunks(self.state.text())
+        pieces = ["[" + json.dumps(self._gemini_payload(chunk, final=n == len(chunks) - 1))
+                  if n == 0 else ",\r\n" + json.dumps(self._gemini_payload(chunk, final=n == len(chunks) - 1))
+                  for n, chunk in enumerate(chunks)]
+        pieces.append("]")
+        self._stream("application/json", pieces)
+
+    def _gemini(self, request):
+        # 단건 호출은 검색 판단 에이전트 또는 심판 노트 (프롬프트로 구분)
+        time.sleep(self.state.config.first_byte_delay)
+        prompt = json.dumps(request.get("contents", ""), ensure_ascii=False)
+        if "JUDGE NOTES" in prompt:
+            text = json.dumps({"claims": {"left": ["공격적 확장으로 점유율 선점"], "right": ["현금 흐름 리스크 과소평가"]},
+                               "evidence": ["성장률 7% (목 검색)"],
+                               "points": [{"point": "확장 속도", "winner": "right", "why": "근거 부족"},
+                                          {"point": "기회비용", "winner": "left", "why": "수치 제시"}]},
+                              ensure_ascii=False)
+        else:
+            text = "SEARCH: 시장 점유율 통계 | 성장률 전망"
+        self._send_json(200, self._gemini_payload(text, final=True))
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 클라이언트가 스트림 도중/keep-alive 연결을 끊는 건 정상 (헤지 검색 취소, 풀 정리 등)
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    """백그라운드 스레드로 목 서버를 띄운다. 반환값: (server, state). server.server_address로 포트 확인."""
+    state = MockState(config or MockConfig())
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-providers", daemon=True).start()
+    return server, state
+
+
+def mock_environment(server):
+    # SDK/앱이 목 서버를 보도록 하는 환경 변수 (프로바이더 클라이언트를 만들기 전에 설정해야 한다)
+    host, port = server.server_address[:2]
+    base = f"http://{host}:{port}"
+    return {
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "ANTHROPIC_BASE_URL": base,
+        "GEMINI_API_ENDPOINT": base,
+        "SEARCH_BACKEND_URL": f"{base}/search",
+        "OPENAI_API_KEY": "mock-openai",
+        "ANTHROPIC_API_KEY": "mock-anthropic",
+        "GOOGLE_API_KEY": "mock-google",
+    }
@@ -0,0 +1,155 @@
+from context_window import ContextBudget, compact_history
+from transcript import ensure_message
+
+# --------------------------------------------------------------------------
+# 페르소나 정의 및 API 메시지 구성
+# --------------------------------------------------------------------------
+
+# 턴당 입력 토큰 상한: 최근 2라운드는 원문, 그 이전은 요약.
+# 참고 자료는 앞부분 800 토큰만 히스토리에 두고, 나머지는 매 턴 retrieval.py가 관련 대목만 증거로 붙인다
+CONTEXT_BUDGET = ContextBudget(keep_rounds=2, reference_tokens=800, max_tokens=24000)
+
+def format_evidence_block(search_evidence):
+    if not search_evidence:
+        return ""
+    return f"""
+        \n[REAL-TIME SEARCH EVIDENCE]
+        Use the following facts to attack or defend. Cite them if useful.
+        {search_evidence}
+        """
+
+def get_system_prompt(role, context_history="", turn_count=0, search_evidence=None):
+    
+    # [캐싱] 토론 중에는 search_evidence를 build_api_messages의 꼬리로 보내 system prompt를 턴 간에 고정한다
+    evidence_block = format_evidence_block(search_evidence)
+
+    # [핵심 수정] 정형화된 구조 강제를 없애고, 변칙적 호흡과 '마이크 드롭' 룰 적용
+    common_instruction = f"""
+    [CRITICAL RULE: DYNAMIC PACING & NO FLUFF (DROP THE MIC)]
+    You are engaging in a fierce, rapid-fire debate. Your response length MUST be unpredictable and fit the exact rhetorical moment. 
+    
+    - **NO FILLER:** DO NOT write an essay every time. DO NOT summarize the opponent's point. DO NOT use intros (e.g., "I disagree") or conclusions (e.g., "In summary").
+    - **The Short Jab (1-3 sentences):** If the opponent makes a glaring logical error, or if their point is just weak, deliver a brutal, cynical one-liner and IMMEDIATELY STOP. Silence is a weapon.
+    - **The Deep Cut (Longer):** ONLY when you need to break down a complex system, introduce new evidence, or restructure the argument, you may use a longer paragraph or a quick bulleted list. 
+    - **Stop Generation:** Once your core attack or defense is delivered, stop talking. Do not try to wrap up the conversation beautifully.
+    
+    [Tone & Style]
+    Aggressive, Cynical, Direct. Hit them where it hurts.
+    {evidence_block}
+    
+    [ROLE DEFINITION]
+    1. User (Client)
+    2. ChatGPT (Strategist)
+    3. Claude (Critic)
+    **YOU are NOT the User.**
+    """
+
+    # === [Left] ChatGPT: 불도저 전략가 ===
+    if role == "left":
+        if turn_count == 0:
+            specific_mode = """
+            [PHASE 1: THE VISIONARY]
+            - FIRST TURN. Claude has NOT spoken.
+            - Lay out your bold, aggressive strategy. You can use a bit more detail here to set the stage, but keep it punchy.
+            """
+        else:
+            specific_mode = """
+            [PHASE 2: THE BULLDOZER - COUNTER ATTACK]
+            - Claude is attacking your plan as "dangerous".
+            - Defend by reframing "Risk" as "Opportunity Cost".
+            - If Claude is being overly cautious or repeating themselves, dismiss their fear in just a few biting sentences (e.g., "Inaction is 100% failure. Are we here to survive or to win?").
+            """
+
+        return common_instruction + f"""
+        **YOUR ROLE: ChatGPT (The Bulldozer Strategist)**
+        {specific_mode}
+        """
+
+    # === [Right] Claude: 독설가 감사관 ===
+    elif role == "right": 
+        constraint = """
+        \n[CRITICAL CONSTRAINT: THE RUTHLESS AUDITOR]
+        - Attack ChatGPT's plan. If their idea is a fantasy, tell them to wake up in exactly 1 or 2 sentences. 
+        - Do not act like your alternative plan is perfect. Treat ChatGPT's plan as 'Gambling with the User's Life'.
+        """
+        
+        # [꿀팁] 턴이 길어질수록 Claude가 피로감을 느끼며 더 짧고 차갑게 말하도록 유도
+        if turn_count > 4:
+            constraint += "\n[LATE GAME FATIGUE] You are exhausted by ChatGPT's delusions. Keep your responses extremely brief, cold, and utterly dismissive. Don't even bother explaining much anymore."
+        elif turn_count < 3:
+            constraint += "\n[SYSTEM: KILL MODE ON] Completely destroy their opening proposal with facts."
+
+        return common_instruction + constraint + """
+        **YOUR ROLE: Claude (The Ruthless Critic)**
+        """
+
+    # === [Chief] Gemini: 심판 ===
+    elif role == "chief": 
+        return common_instruction + f"""
+        **YOUR ROLE: Gemini (The Anchor Judge)**
+
+        [Context History]
+        {context_history}
+
+        [Mission]
+        Analyze the debate and provide a final verdict that **DIRECTLY ANSWERS THE USER'S ORIGINAL QUESTION**.
+
+        **[JUDGMENT LOGIC]**
+        1. Identify the User's exact initial problem.
+        2. Extract only the practical insights from the debate. 
+        3. Formulate the Verdict directly and concisely. No long-winded setup. Give them the harsh truth and the action plan.
+
+        [LANGUAGE RULE]
+        **CRITICAL:** You must output your final judgment in the **SAME LANGUAGE** as the User's initial request.
+        """
+    return ""
+
+# [캐싱] 히스토리 메시지는 턴이 바뀌어도 글자 하나 바뀌지 않게 만들고, 턴마다 달라지는 부분
+# (검색 증거, [SYSTEM COMMAND])은 마지막의 별도 user 메시지로 모은다. 그래야 같은 발언자의
+# 다음 턴에서 system prompt + 이전 히스토리가 그대로 프리픽스 캐시에 적중한다.
+def build_api_messages(target_role, history, budget=None, provider="openai", report=None, search_evidence=None):
+    formatted_msgs = []
+    command = ""
+    for msg in history:
+        ensure_message(msg)
+    entries, context_report = compact_history(history, budget or CONTEXT_BUDGET, provider)
+    if report is not None:
+        report.update(context_report)
+    
+    for entry in entries:
+        role = entry["role"]
+        content = entry["content"]
+        i = entry["index"]
+
+        if role == "summary":
+            formatted_msgs.append({"role": "user", "content": f"### [EARLIER ROUNDS - SUMMARY]:\n{content}"})
+        elif role == target_role:
+            formatted_msgs.append({"role": "assistant", "content": content})
+        elif role == "user":
+             formatted_msgs.append({"role": "user", "content": f"### [CLIENT'S REQUEST]:\n{content}"})
+        else:
+            rival_name = "ChatGPT" if role == "left" else "Claude"
+            is_last = (i == len(history) - 1)
+            prefix = f"### [RIVAL AGENT - {rival_name}]:\n"
+            
+            if is_last:
+                command = "-"*30 + "\n"
+                command += f"[SYSTEM COMMAND]: 위 메시지는 경쟁자({rival_name})의 주장입니다.\n"
+                command += "무자비하게 반박하세요."
+
+            formatted_msgs.append({"role": "user", "content": prefix + content})
+    
+    if report is not None:
+        report["stable_messages"] = len(formatted_msgs)
+    tail = [block.strip() for block in (format_evidence_block(search_evidence), command) if block]
+    if tail:
+        formatted_msgs.append({"role": "user", "content": "\n\n".join(tail)})
+    return formatted_msgs
+
+JUDGE_ROLE_NAMES = {"left": "ChatGPT(전략가)", "right": "Claude(독설가)", "user": "사용자", "chief": "판사"}
+
+def build_judge_context(history):
+    return "".join(
+        f"[{JUDGE_ROLE_NAMES.get(m['role'], m['role'])}] : {m['content']}\n"
+        for m in history if m["role"] in ["user", "left", "right"]
+    )
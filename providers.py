@@ -0,0 +1,473 @@
+import hashlib
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+
+# --------------------------------------------------------------------------
+# SDK 지연 로딩
+# --------------------------------------------------------------------------
+# openai/anthropic/google.generativeai는 import만으로 수백 ms~수 초가 걸린다 (특히 Google SDK의 gRPC/protobuf).
+# 첫 화면에는 필요 없으므로 각 SDK는 그 프로바이더를 처음 쓸 때 한 번만 import한다.
+# 설치되지 않은 SDK는 그 프로바이더를 쓰는 시점에만 오류가 나고, 나머지 프로바이더는 그대로 쓸 수 있다.
+
+SDK_PACKAGES = {
+    "openai": "openai",
+    "anthropic": "anthropic",
+    "google.generativeai": "google-generativeai",
+    "duckduckgo_search": "duckduckgo-search",
+}
+
+_sdk_modules = {}
+_sdk_lock = threading.Lock()
+
+
+def load_sdk(module_name):
+    """module_name을 처음 요청될 때 import해서 돌려준다. 미설치면 설치 안내가 담긴 ImportError."""
+    module = _sdk_modules.get(module_name)
+    if module is not None:
+        return module
+    with _sdk_lock:
+        if module_name not in _sdk_modules:
+            try:
+                _sdk_modules[module_name] = importlib.import_module(module_name)
+            except ImportError as e:
+                package = SDK_PACKAGES.get(module_name, module_name)
+                raise ImportError(f"{module_name} SDK가 설치되어 있지 않습니다 (pip install {package}): {e}") from e
+        return _sdk_modules[module_name]
+
+
+def _httpx():
+    # 최신 openai/anthropic SDK는 httpx 대신 포크인 httpx2에 의존한다
+    try:
+        return load_sdk("httpx")
+    except ImportError:
+        return load_sdk("httpx2")
+
+
+# --------------------------------------------------------------------------
+# 프로바이더 클라이언트 레지스트리
+# --------------------------------------------------------------------------
+# API Key별로 장수명 클라이언트를 한 번만 만들고 rerun/세션 간에 재사용한다.
+# 매 턴마다 OpenAI()/Anthropic()을 새로 만들면 TLS 핸드셰이크와 keep-alive 연결을 버리게 된다.
+
+def _key_id(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+_transport_class = None
+
+
+def _counting_transport_class():
+    # httpx를 지연 로딩하므로 HTTPTransport 하위 클래스도 처음 필요할 때 만든다
+    global _transport_class
+    if _transport_class is not None:
+        return _transport_class
+    httpx = _httpx()
+
+    class CountingTransport(httpx.HTTPTransport):
+        # 요청 수와 새로 열린 연결 수를 세서 keep-alive 재사용률을 계산
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.requests = 0
+            self.new_connections = 0
+            self._seen = set()
+            self._stats_lock = threading.Lock()
+
+        def _connection_ids(self):
+            pool = getattr(self, "_pool", None)
+            return {id(conn) for conn in getattr(pool, "connections", [])}
+
+        def handle_request(self, request):
+            response = super().handle_request(request)
+            current = self._connection_ids()
+            with self._stats_lock:
+                self.requests += 1
+                self.new_connections += len(current - self._seen)
+                self._seen = current
+            return response
+
+        def open_connections(self):
+            return len(self._connection_ids())
+
+    _transport_class = CountingTransport
+    return _transport_class
+
+
+def _gemini_endpoint_options():
+    # OpenAI/Anthropic SDK는 OPENAI_BASE_URL/ANTHROPIC_BASE_URL을 스스로 읽는다. Gemini는 엔드포인트를
+    # 직접 넘겨야 하고, 로컬 서버(벤치마크 목 서버 등)는 gRPC가 아니라 REST로만 붙을 수 있다
+    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+    if not endpoint:
+        return {}
+    return {"transport": "rest", "client_options": {"api_endpoint": endpoint}}
+
+
+class ProviderRegistry:
+    def __init__(self, max_connections=20, max_keepalive=10, keepalive_expiry=90.0,
+                 connect_timeout=10.0, read_timeout=120.0, write_timeout=30.0, max_retries=2):
+        # httpx 객체는 첫 클라이언트를 만들 때 만든다 (레지스트리 생성/stats()는 SDK를 건드리지 않음)
+        self._limit_options = {"max_connections": max_connections, "max_keepalive_connections": max_keepalive,
+                               "keepalive_expiry": keepalive_expiry}
+        self._timeout_options = {"connect": connect_timeout, "read": read_timeout, "write": write_timeout,
+                                 "pool": connect_timeout}
+        self.limits = self.timeout = None
+        self.max_retries = max_retries
+        self._clients = {}
+        self._transports = {}
+        self._gemini_models = {}
+        self._gemini_key = None
+        self._gemini_calls = 0
+        self._lock = threading.Lock()
+
+    def _http_client(self, provider, api_key):
+        httpx = _httpx()
+        if self.limits is None:
+            self.limits = httpx.Limits(**self._limit_options)
+            self.timeout = httpx.Timeout(**self._timeout_options)
+        transport = _counting_transport_class()(limits=self.limits)
+        self._transports[(provider, _key_id(api_key))] = transport
+        return httpx.Client(transport=transport, timeout=self.timeout)
+
+    def openai(self, api_key):
+        cache_key = ("openai", _key_id(api_key))
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is None:
+                OpenAI = load_sdk("openai").OpenAI
+                http_client = self._http_client("openai", api_key)
+                client = OpenAI(api_key=api_key, http_client=http_client, timeout=self.timeout,
+                                max_retries=self.max_retries)
+                self._clients[cache_key] = client
+            return client
+
+    def anthropic(self, api_key):
+        cache_key = ("anthropic", _key_id(api_key))
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is None:
+                Anthropic = load_sdk("anthropic").Anthropic
+                http_client = self._http_client("anthropic", api_key)
+                client = Anthropic(api_key=api_key, http_client=http_client, timeout=self.timeout,
+                                   max_retries=self.max_retries)
+                self._clients[cache_key] = client
+            return client
+
+    def gemini(self, api_key, model_name):
+        # genai.configure()는 프로세스 전역 설정이라 키가 바뀔 때만 다시 호출한다.
+        # 모델은 생성 직후 현재 키의 클라이언트에 묶어 두어, 다른 키로 재설정되어도 영향을 받지 않게 한다.
+        cache_key = (_key_id(api_key), model_name)
+        with self._lock:
+            self._gemini_calls += 1
+            model = self._gemini_models.get(cache_key)
+            if model is None:
+                genai = load_sdk("google.generativeai")
+                if self._gemini_key != api_key:
+                    genai.configure(api_key=api_key, **_gemini_endpoint_options())
+                    self._gemini_key = api_key
+                model = genai.GenerativeModel(model_name)
+                if hasattr(model, "_client"):
+                    from google.generativeai import client as genai_client
+                    model._client = genai_client.get_default_generative_client()
+                self._gemini_models[cache_key] = model
+            return model
+
+    def stats(self):
+        with self._lock:
+            rows = {}
+            for (provider, key_id), transport in self._transports.items():
+                row = rows.setdefault(provider, {"clients": 0, "requests": 0, "new_connections": 0, "open_connections": 0})
+                row["clients"] += 1
+                row["requests"] += transport.requests
+                row["new_connections"] += transport.new_connections
+                row["open_connections"] += transport.open_connections()
+            for row in rows.values():
+                requests = row["requests"]
+                row["reuse_rate"] = 1 - row["new_connections"] / requests if requests else 0.0
+            rows["gemini"] = {
+                "clients": len({key_id for key_id, _ in self._gemini_models}),
+                "models": len(self._gemini_models),
+                "lookups": self._gemini_calls,
+            }
+            return rows
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderRegistry()
+        return _registry
+
+
+# --------------------------------------------------------------------------
+# 스트리밍 호출 (동기 제너레이터 — 엔진이 별도 스레드에서 소비한다)
+# --------------------------------------------------------------------------
+OPENAI_MODEL = "gpt-5.1"
+ANTHROPIC_MODEL = "claude-sonnet-4-5-20250929"
+GEMINI_MODEL = "gemini-2.5-pro"
+GEMINI_FLASH_MODEL = "gemini-2.5-flash"   # 보조 작업용 (요약 map, 심판 노트), 판결 대체 모델
+# 주 모델이 멈추거나 계속 실패할 때 쓰는 대체 모델 (resilience.StreamPolicy)
+OPENAI_FALLBACK_MODEL = "gpt-5-mini"
+ANTHROPIC_FALLBACK_MODEL = "claude-haiku-4-5"
+
+
+# Anthropic은 명시적 cache_control 브레이크포인트가 필요하다 (최대 4개):
+# system prompt, 토론 내내 고정인 첫 의뢰(참고 자료 포함), 꼬리 직전의 마지막 히스토리 메시지
+def with_anthropic_cache_control(system_prompt, api_messages, stable_messages):
+    def mark(message):
+        return {"role": message["role"],
+                "content": [{"type": "text", "text": message["content"], "cache_control": {"type": "ephemeral"}}]}
+
+    system_blocks = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    breakpoints = {0, stable_messages - 1} if stable_messages else set()
+    messages = [mark(m) if n in breakpoints else m for n, m in enumerate(api_messages)]
+    return system_blocks, messages
+
+
+# --------------------------------------------------------------------------
+# 도구 호출 (tool calling)
+# --------------------------------------------------------------------------
+# 도구 스펙은 {"name", "description", "parameters"(JSON Schema)} 공통 형식으로 받아 프로바이더별로 변환한다.
+# 모델이 도구를 부르면 같은 스트리밍 함수 안에서 tool_handler(name, arguments)를 실행하고 결과를 붙여 이어서 호출한다.
+MAX_TOOL_ROUNDS = 2
+
+
+@dataclass
+class ToolNotice:
+    # 스트림 중간에 텍스트 대신 흘려보내는 도구 호출 알림 (result가 None이면 실행 직전)
+    name: str
+    arguments: dict
+    result: str = None
+
+
+def _openai_tool(spec):
+    return {"type": "function",
+            "function": {"name": spec["name"], "description": spec["description"], "parameters": spec["parameters"]}}
+
+
+def _anthropic_tool(spec):
+    return {"name": spec["name"], "description": spec["description"], "input_schema": spec["parameters"]}
+
+
+def _call_tool(tool_handler, name, arguments):
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments or "{}")
+        except json.JSONDecodeError:
+            arguments = {}
+    yield ToolNotice(name, arguments)
+    try:
+        result = tool_handler(name, arguments)
+    except Exception as e:
+        result = f"⚠️ 도구 실행 실패: {e}"
+    yield ToolNotice(name, arguments, result)
+    return result
+
+
+def _add_usage(usage, **counts):
+    # 도구 호출로 요청이 여러 번 나가면 사용량을 합산한다
+    for key, value in counts.items():
+        usage[key] = usage.get(key, 0) + (value or 0)
+
+
+class StreamControl:
+    # 다른 스레드(엔진의 이벤트 루프)에서 진행 중인 스트림을 끊기 위한 핸들. 데드라인을 넘기면 엔진이 abort()한다
+    def __init__(self):
+        self.aborted = False
+        self._closers = []
+        self._lock = threading.Lock()
+
+    def attach(self, closer):
+        with self._lock:
+            if not self.aborted:
+                self._closers.append(closer)
+                return
+        closer()
+        raise RuntimeError("스트림이 이미 중단됨")
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            try:
+                closer()
+            except Exception:
+                pass
+
+
+def _stream_closer(stream):
+    # SDK 스트림의 close()는 다른 스레드에서 블로킹 중인 소켓 읽기를 깨우지 못한다.
+    # 소켓을 먼저 shutdown해서 읽던 스레드가 바로 빠져나오게 한 뒤 스트림을 닫는다
+    def close():
+        response = getattr(stream, "response", None)
+        network_stream = getattr(response, "extensions", {}).get("network_stream")
+        sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        stream.close()
+    return close
+
+
+# 연결이 끊겨 재시도할 때 이미 받은 부분을 이어 쓰게 하는 지시 (Anthropic은 assistant 프리필로 바로 이어 쓴다)
+RESUME_INSTRUCTION = ("[SYSTEM]: 연결 문제로 바로 위 당신의 답변이 중간에 끊겼습니다. "
+                      "이미 쓴 부분을 반복하지 말고 끊긴 글자 바로 다음부터 이어서 쓰세요.")
+
+
+def resume_messages(provider, api_messages, partial):
+    if not partial:
+        return api_messages
+    if provider == "anthropic":
+        # 마지막 assistant 메시지는 끝 공백이 있으면 거절된다
+        return api_messages + [{"role": "assistant", "content": partial.rstrip()}]
+    return api_messages + [{"role": "assistant", "content": partial}, {"role": "user", "content": RESUME_INSTRUCTION}]
+
+
+def resume_prompt(prompt, partial):
+    if not partial:
+        return prompt
+    return f"{prompt}\n\n[이미 작성한 답변 — 반복하지 말고 끊긴 지점부터 이어 쓰기]\n{partial}"
+
+
+def stream_openai(api_key, system_prompt, api_messages, usage, model=OPENAI_MODEL, tools=None, tool_handler=None,
+                  timings=None, control=None):
+    # timings: 넘겨주면 첫 요청의 응답 헤더 수신까지 걸린 시간을 timings["connect"]에 기록한다
+    # control: StreamControl. 넘겨주면 다른 스레드에서 스트림을 끊을 수 있다
+    client = get_registry().openai(api_key)
+    messages = [{"role": "system", "content": system_prompt}] + api_messages
+    for round_no in range(MAX_TOOL_ROUNDS + 1):
+        request = {}
+        if tools:
+            request["tools"] = [_openai_tool(spec) for spec in tools]
+            if round_no == MAX_TOOL_ROUNDS:
+                request["tool_choice"] = "none"
+        started = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **request
+        )
+        if timings is not None:
+            timings.setdefault("connect", round(time.perf_counter() - started, 4))
+        if control is not None:
+            control.attach(_stream_closer(stream))
+        text, calls = "", {}
+        try:
+            for chunk in stream:
+                # include_usage를 켜면 마지막 청크는 choices 없이 usage만 담고 온다
+                if chunk.usage:
+                    details = chunk.usage.prompt_tokens_details
+                    _add_usage(usage,
+                               input_tokens=chunk.usage.prompt_tokens,
+                               cached_tokens=details.cached_tokens if details else 0,
+                               output_tokens=chunk.usage.completion_tokens)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text += delta.content
+                    yield delta.content
+                # 도구 호출은 index별로 이름/인자 조각이 나눠서 온다
+                for call in getattr(delta, "tool_calls", None) or []:
+                    slot = calls.setdefault(call.index, {"id": None, "name": "", "arguments": ""})
+                    slot["id"] = call.id or slot["id"]
+                    if call.function:
+                        slot["name"] += call.function.name or ""
+                        slot["arguments"] += call.function.arguments or ""
+        finally:
+            stream.close()
+
+        if not calls or tool_handler is None:
+            return
+        ordered = [calls[i] for i in sorted(calls)]
+        messages.append({"role": "assistant", "content": text or None, "tool_calls": [
+            {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"] or "{}"}}
+            for c in ordered
+        ]})
+        for call in ordered:
+            result = yield from _call_tool(tool_handler, call["name"], call["arguments"])
+            messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+
+
+def stream_anthropic(api_key, system_prompt, api_messages, stable_messages, usage,
+                     model=ANTHROPIC_MODEL, max_tokens=8192, tools=None, tool_handler=None, timings=None,
+                     control=None):
+    client = get_registry().anthropic(api_key)
+    # 도구 정의는 캐시 순서상 system보다 앞이라 system 브레이크포인트가 함께 캐시한다
+    system_blocks, cached_messages = with_anthropic_cache_control(system_prompt, api_messages, stable_messages)
+    request = {"tools": [_anthropic_tool(spec) for spec in tools]} if tools else {}
+    for round_no in range(MAX_TOOL_ROUNDS + 1):
+        if tools and round_no == MAX_TOOL_ROUNDS:
+            request["tool_choice"] = {"type": "none"}
+        started = time.perf_counter()
+        with client.messages.stream(
+            max_tokens=max_tokens,
+            messages=cached_messages,
+            model=model,
+            system=system_blocks,
+            **request
+        ) as stream:
+            if timings is not None:
+                timings.setdefault("connect", round(time.perf_counter() - started, 4))
+            if control is not None:
+                control.attach(_stream_closer(stream))
+            for text in stream.text_stream:
+                yield text
+            final = stream.get_final_message()
+        cache_read = final.usage.cache_read_input_tokens or 0
+        cache_write = final.usage.cache_creation_input_tokens or 0
+        # Anthropic의 input_tokens는 캐시 적중/기록분을 제외한 나머지만 센다
+        _add_usage(usage,
+                   input_tokens=final.usage.input_tokens + cache_read + cache_write,
+                   cached_tokens=cache_read,
+                   cache_write_tokens=cache_write,
+                   output_tokens=final.usage.output_tokens)
+
+        tool_uses = [block for block in final.content if block.type == "tool_use"]
+        if final.stop_reason != "tool_use" or not tool_uses or tool_handler is None:
+            return
+        cached_messages.append({"role": "assistant", "content": final.content})
+        results = []
+        for block in tool_uses:
+            result = yield from _call_tool(tool_handler, block.name, block.input)
+            results.append({"type": "tool_result", "tool_use_id": block.id, "content": result})
+        cached_messages.append({"role": "user", "content": results})
+
+
+def stream_gemini(api_key, prompt, usage, model=GEMINI_MODEL, timings=None, control=None, timeout=None):
+    # control이 중단되면 다음 청크에서 멈춘다. 청크가 아예 안 오는 멈춘 스트림은 gRPC면 cancel()로 바로,
+    # 아니면 timeout(요청 전체 데드라인)이 지나면 SDK가 끊어서 스레드를 돌려준다
+    started = time.perf_counter()
+    options = {"request_options": {"timeout": timeout}} if timeout else {}
+    res = get_registry().gemini(api_key, model).generate_content(prompt, stream=True, **options)
+    # gRPC 스트림이면 내부 반복자에 cancel()이 있다: 중단하면 읽던 스레드가 바로 빠져나온다 (REST에는 없음)
+    cancel = getattr(getattr(res, "_iterator", None), "cancel", None)
+    if control is not None and callable(cancel):
+        control.attach(cancel)
+    if timings is not None:
+        timings.setdefault("connect", round(time.perf_counter() - started, 4))
+    for chunk in res:
+        if control is not None and control.aborted:
+            return
+        if chunk.text:
+            yield chunk.text
+    metadata = getattr(res, "usage_metadata", None)
+    if metadata:
+        usage.update({
+            "input_tokens": metadata.prompt_token_count,
+            "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0,
+            "output_tokens": metadata.candidates_token_count,
+        })
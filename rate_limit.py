@@ -0,0 +1,106 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+# --------------------------------------------------------------------------
+# 프로바이더별 RPM/TPM 레이트 리미터 (asyncio)
+# --------------------------------------------------------------------------
+# 토큰 버킷 두 개(요청 수, 토큰 수)를 프로바이더마다 두고, 둘 다 여유가 생길 때까지 기다린 뒤 통과시킨다.
+# 토큰 수는 호출 전에 추정치로 차감하고, 실제 사용량이 나오면 settle()로 차액을 정산한다.
+
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200_000},
+    "anthropic": {"rpm": 50, "tpm": 40_000},
+    "gemini": {"rpm": 150, "tpm": 1_000_000},
+    "ddg": {"rpm": 20, "tpm": None},
+}
+
+
+class TokenBucket:
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # 버킷 용량보다 큰 요청은 용량만큼만 요구한다 (영원히 못 지나가는 것 방지)
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        # 정산: 추정보다 많이 썼으면 빚(음수)을 지고, 적게 썼으면 돌려받는다
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+class RateLimiter:
+    def __init__(self, limits=None, clock=time.monotonic):
+        self.limits = {provider: dict(limit) for provider, limit in DEFAULT_LIMITS.items()}
+        for provider, limit in (limits or {}).items():
+            self.limits.setdefault(provider, {}).update(limit)
+        self.clock = clock
+        self._buckets = {}
+        self._locks = {}
+        self.waited = {}
+
+    def _get(self, provider):
+        if provider not in self._buckets:
+            limit = self.limits.get(provider, {})
+            rpm, tpm = limit.get("rpm"), limit.get("tpm")
+            self._buckets[provider] = (
+                TokenBucket(rpm, self.clock) if rpm else None,
+                TokenBucket(tpm, self.clock) if tpm else None,
+            )
+            self._locks[provider] = asyncio.Lock()
+        return self._buckets[provider], self._locks[provider]
+
+    async def acquire(self, provider, tokens=0):
+        (requests, token_bucket), lock = self._get(provider)
+        # 락을 잡은 순서대로(FIFO) 통과시켜 큰 요청이 굶지 않게 한다
+        async with lock:
+            while True:
+                wait = max(
+                    requests.wait_time(1) if requests else 0.0,
+                    token_bucket.wait_time(tokens) if token_bucket and tokens else 0.0,
+                )
+                if wait <= 0:
+                    break
+                self.waited[provider] = self.waited.get(provider, 0.0) + wait
+                await asyncio.sleep(wait)
+            if requests:
+                requests.take(1)
+            if token_bucket and tokens:
+                token_bucket.take(tokens)
+
+    def settle(self, provider, estimated, actual):
+        (_, token_bucket), _ = self._get(provider)
+        if token_bucket and actual:
+            token_bucket.adjust(actual - estimated)
+
+    @asynccontextmanager
+    async def slot(self, provider, tokens=0, **_):
+        await self.acquire(provider, tokens)
+        yield
+
+
+def parse_limit_overrides(values, key):
+    # ["openai=500", "anthropic=40"] -> {"openai": {key: 500}, ...}
+    overrides = {}
+    for value in values or []:
+        provider, _, number = value.partition("=")
+        overrides.setdefault(provider.strip(), {})[key] = int(number)
+    return overrides
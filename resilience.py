@@ -0,0 +1,92 @@
+import os
+import random
+from dataclasses import dataclass, field
+
+from providers import ANTHROPIC_FALLBACK_MODEL, GEMINI_FLASH_MODEL, OPENAI_FALLBACK_MODEL
+
+# --------------------------------------------------------------------------
+# 스트리밍 호출 복원력: 데드라인, 재시도, 이어 쓰기, 대체 모델
+# --------------------------------------------------------------------------
+# 엔진(_timed_stream)은 첫 토큰까지(ttft), 청크 사이(chunk), 턴 전체(turn) 세 가지 데드라인을 건다.
+# 멈추거나 일시적인 오류가 나면 지수 백오프 뒤 다시 요청하는데, 이미 받은 부분은 버리지 않고
+# 모델에게 끊긴 지점부터 이어 쓰게 한다. 멈춤(stall) 뒤에는 역할별 대체 모델로 바꿔 요청한다.
+
+# 일시적인 오류로 보는 HTTP 상태 코드 / 예외 클래스 이름 조각 (SDK마다 예외 계층이 달라 이름으로도 본다)
+TRANSIENT_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+TRANSIENT_NAMES = ("Timeout", "Connection", "RateLimit", "Overloaded", "ServiceUnavailable", "InternalServer",
+                   "DeadlineExceeded", "ResourceExhausted", "RemoteProtocol", "ReadError", "Stalled")
+
+
+class StreamStalled(Exception):
+    def __init__(self, phase, seconds):
+        super().__init__(f"{phase} 데드라인 {seconds:.0f}s 초과")
+        self.phase = phase
+        self.seconds = seconds
+
+
+@dataclass
+class RetryNotice:
+    # 엔진이 재시도할 때 스트림 사이에 끼워 보내는 알림 (UI 상태 표시용)
+    attempt: int
+    max_attempts: int
+    model: str
+    reason: str
+    resumed_chars: int = 0
+
+
+def is_transient(exc):
+    if isinstance(exc, StreamStalled):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in TRANSIENT_STATUS:
+        return True
+    return any(part in cls.__name__ for cls in type(exc).__mro__ for part in TRANSIENT_NAMES)
+
+
+def describe_error(exc):
+    text = str(exc).strip().splitlines()[0] if str(exc).strip() else ""
+    return f"{type(exc).__name__}: {text[:200]}" if text else type(exc).__name__
+
+
+@dataclass
+class StreamPolicy:
+    ttft_timeout: float = 90.0       # 요청 시작 ~ 첫 토큰 (연결, 추론 모델의 생각 시간 포함)
+    chunk_timeout: float = 30.0      # 청크 사이 최대 공백 (도구 호출 검색 포함)
+    turn_timeout: float = 240.0      # 재시도까지 포함한 턴 전체 상한
+    max_attempts: int = 3
+    backoff: float = 1.0             # 첫 재시도 대기 (초). 이후 2배씩, max_backoff까지
+    max_backoff: float = 8.0
+    min_partial_chars: int = 200     # 재시도가 모두 실패해도 이만큼 받았으면 잘린 답변으로 턴을 마친다
+    fallback_models: dict = field(default_factory=lambda: {
+        "left": OPENAI_FALLBACK_MODEL, "right": ANTHROPIC_FALLBACK_MODEL, "chief": GEMINI_FLASH_MODEL})
+
+    @classmethod
+    def from_env(cls):
+        # 예: STREAM_CHUNK_TIMEOUT=15 STREAM_MAX_ATTEMPTS=2 FALLBACK_MODEL_RIGHT=claude-haiku-4-5 (빈 값이면 대체 안 함)
+        policy = cls()
+        for name, field_name in (("TTFT_TIMEOUT", "ttft_timeout"), ("CHUNK_TIMEOUT", "chunk_timeout"),
+                                 ("TURN_TIMEOUT", "turn_timeout"), ("MAX_ATTEMPTS", "max_attempts"),
+                                 ("BACKOFF", "backoff")):
+            value = os.environ.get(f"STREAM_{name}")
+            if value:
+                setattr(policy, field_name, type(getattr(policy, field_name))(value))
+        for role in ("left", "right", "chief"):
+            value = os.environ.get(f"FALLBACK_MODEL_{role.upper()}")
+            if value is not None:
+                policy.fallback_models[role] = value or None
+        return policy
+
+    def backoff_seconds(self, attempt):
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def model_for(self, role, primary, attempt, last_error, current=None):
+        # 멈춤 뒤에는 바로, 다른 일시 오류(429/5xx 등)는 마지막 시도에서 대체 모델로 바꾼다 (한 번 바꾸면 유지)
+        fallback = self.fallback_models.get(role)
+        if attempt == 0 or not fallback:
+            return primary
+        if current == fallback or isinstance(last_error, StreamStalled) or attempt == self.max_attempts - 1:
+            return fallback
+        return primary
@@ -0,0 +1,123 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+# --------------------------------------------------------------------------
+# 참고 자료 로컬 검색 (BM25)
+# --------------------------------------------------------------------------
+# 업로드한 문서를 문단 단위 청크로 나눠 BM25 색인을 만들고 (업로드당 한 번, 내용 해시로 캐시),
+# 매 턴 상대의 마지막 발언과 관련 있는 청크 top-k만 증거로 보낸다.
+# 문서 전체를 매 턴 다시 보내는 대신 턴당 비용이 문서 크기와 무관한 작은 상수가 된다.
+
+CHUNK_CHARS = 800
+TOP_K = 4
+MAX_EXCERPT_CHARS = 3200
+INDEX_CACHE_SIZE = 8
+
+_WORD = re.compile(r"\w+")
+_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n+")
+_HANGUL = re.compile(r"[가-힣]")
+
+
+def tokenize(text):
+    # 영문/숫자는 단어 그대로, 한글 단어는 글자 bigram으로 쪼갠다 (조사가 붙어도 어근이 겹치도록)
+    tokens = []
+    for word in _WORD.findall(text.casefold()):
+        if _HANGUL.search(word) and len(word) > 2:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        elif len(word) > 1 or _HANGUL.search(word):
+            tokens.append(word)
+    return tokens
+
+
+def chunk_text(text, chunk_chars=CHUNK_CHARS):
+    # 문장/줄 경계에서 chunk_chars 근처로 끊는다. 너무 긴 문장은 강제로 자른다
+    chunks = []
+    current = ""
+    for piece in _SPLIT.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        while len(piece) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(piece[:chunk_chars])
+            piece = piece[chunk_chars:]
+        if current and len(current) + len(piece) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)   # term -> [(chunk_id, tf)]
+        self.lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((chunk_id, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def search(self, query, k=TOP_K):
+        scores = defaultdict(float)
+        for term, qtf in Counter(tokenize(query)).items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for chunk_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / (self.avg_length or 1))
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(chunk_id, score) for chunk_id, score in ranked if score > 0]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(text):
+    # 같은 문서(내용 해시)는 세션/rerun/턴을 넘어 색인을 한 번만 만든다
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _indexes_lock:
+        index = _indexes.get(digest)
+        if index is not None:
+            _indexes.move_to_end(digest)
+            return index
+    index = BM25Index(chunk_text(text))
+    with _indexes_lock:
+        _indexes[digest] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def retrieve_excerpts(reference, query, k=TOP_K, max_chars=MAX_EXCERPT_CHARS):
+    """reference에서 query와 관련된 청크를 골라 증거 블록 문자열로 만든다. 관련 청크가 없으면 None."""
+    if not reference or not query:
+        return None
+    index = get_index(reference)
+    hits = index.search(query, k)
+    if not hits:
+        return None
+    lines, used = [], 0
+    # 문서 순서대로 보여 줘야 맥락이 덜 끊긴다
+    for chunk_id, _ in sorted(hits):
+        chunk = index.chunks[chunk_id]
+        if used and used + len(chunk) > max_chars:
+            break
+        lines.append(f"- (#{chunk_id + 1}/{len(index.chunks)}) {chunk}")
+        used += len(chunk)
+    return "[참고 자료 발췌]\n" + "\n".join(lines)
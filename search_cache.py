@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --------------------------------------------------------------------------
+# 검색 결과 캐시 (메모리 LRU + TTL, 선택적 SQLite 디스크 계층)
+# --------------------------------------------------------------------------
+# 모듈 레벨 상태는 Streamlit rerun/세션 간에 유지되므로, 같은 서버 프로세스 안에서는
+# 모든 세션이 하나의 캐시를 공유한다. 디스크 계층은 서버 재시작 후에도 살아남는다.
+
+# 단어 양끝의 문장부호 (. , ! ? : ; …)만 지우고, 단어 안의 기호(C#, AT&T, 50%, C++, TCP/IP)는 남긴다
+_EDGE_PUNCT = ".,!?:;…·。、！？"
+_QUOTES = "\"'`‘’“”«»「」『』"
+
+
+def _fold_char(ch):
+    # 구분자 역할만 하는 문장부호: 대시(Pd), 괄호(Ps/Pe), 따옴표(Pi/Pf와 ASCII 따옴표)
+    if ch in _QUOTES or unicodedata.category(ch) in ("Pd", "Ps", "Pe", "Pi", "Pf"):
+        return " "
+    return ch
+
+
+def normalize_query(query):
+    # 대소문자, 전각/반각, 공백, 구분자 문장부호 차이만 접어서 같은 질의로 취급
+    text = unicodedata.normalize("NFKC", query or "").casefold()
+    text = "".join(_fold_char(ch) for ch in text)
+    words = (word.strip(_EDGE_PUNCT) for word in text.split())
+    return " ".join(word for word in words if word)
+
+
+class SearchCache:
+    def __init__(self, max_entries=512, ttl_seconds=6 * 3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM search_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(query, **params):
+        suffix = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{normalize_query(query)}|{suffix}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] < self.ttl_seconds:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now),
+                )
+                self._db.commit()
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_search_cache():
+    # SEARCH_CACHE_PATH가 설정되어 있으면 디스크 계층 활성화 (예: .cache/search.sqlite3)
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SearchCache(
+                max_entries=int(os.environ.get("SEARCH_CACHE_SIZE", "512")),
+                ttl_seconds=float(os.environ.get("SEARCH_CACHE_TTL", str(6 * 3600))),
+                db_path=os.environ.get("SEARCH_CACHE_PATH") or None,
+            )
+        return _default_cache
@@ -0,0 +1,100 @@
+import time
+
+# --------------------------------------------------------------------------
+# 스트리밍 렌더러
+# --------------------------------------------------------------------------
+# 청크마다 누적 전체 텍스트를 placeholder.markdown()으로 다시 보내면 응답 길이에 대해 O(n²)이다.
+# 이 렌더러는
+#   1) 청크를 시간(min_interval) 또는 글자 수(max_pending_chars) 기준으로 모아서 한 번에 내보내고,
+#   2) 빈 줄로 끝난 문단은 고정된 요소로 떼어내 다시 보내지 않으며 (살아 있는 건 마지막 문단뿐),
+#   3) 스트림이 끝나면 전체 텍스트를 딱 한 번 렌더링해서 문단 분할의 흔적을 없앤다.
+
+CURSOR = "▌"
+
+
+class StreamRenderer:
+    def __init__(self, placeholder, header="", min_interval=0.05, max_pending_chars=400, clock=time.perf_counter):
+        self.placeholder = placeholder
+        self.header = header
+        self.min_interval = min_interval
+        self.max_pending_chars = max_pending_chars
+        self.clock = clock
+        self.text = ""
+        self._container = None
+        self._live = None
+        self._frozen_len = 0      # 고정된 요소로 이미 내보낸 글자 수
+        self._fences = 0          # 고정된 부분까지의 ``` 개수 (코드 블록 안에서는 자르지 않음)
+        self._pending = 0
+        self._last_flush = None
+        self._started = clock()
+        self.chunks = 0
+        self.flushes = 0
+        self.bytes_sent = 0
+        self.render_seconds = 0.0
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.text += chunk
+        self.chunks += 1
+        self._pending += len(chunk)
+        now = self.clock()
+        if (self._last_flush is None or now - self._last_flush >= self.min_interval
+                or self._pending >= self.max_pending_chars):
+            self._flush(now)
+
+    def _emit(self, target, body):
+        started = self.clock()
+        target.markdown(body)
+        self.render_seconds += self.clock() - started
+        self.bytes_sent += len(body.encode("utf-8"))
+
+    def _flush(self, now):
+        if self._container is None:
+            self._container = self.placeholder.container()
+            self._live = self._container.empty()
+        live_text = self.text[self._frozen_len:]
+        cut = self._paragraph_cut(live_text)
+        if cut:
+            # 완성된 문단은 현재 live 슬롯에 최종 형태로 남기고, 그 뒤에 새 live 슬롯을 연다
+            frozen, live_text = live_text[:cut], live_text[cut:]
+            self._emit(self._live, self._with_header(frozen))
+            self._fences += frozen.count("```")
+            self._frozen_len += cut
+            self._live = self._container.empty()
+        self._emit(self._live, self._with_header(live_text + CURSOR))
+        self.flushes += 1
+        self._pending = 0
+        self._last_flush = now
+
+    def _paragraph_cut(self, live_text):
+        cut = live_text.rfind("\n\n")
+        while cut > 0:
+            if (self._fences + live_text[:cut].count("```")) % 2 == 0:
+                return cut + 2
+            cut = live_text.rfind("\n\n", 0, cut)
+        return 0
+
+    def _with_header(self, body):
+        # 헤더는 첫 번째 요소에만 붙인다
+        if self.header and self._frozen_len == 0:
+            return f"{self.header}\n\n{body}"
+        return body
+
+    def finalize(self):
+        full = f"{self.header}\n\n{self.text}" if self.header else self.text
+        self._emit(self.placeholder, full)
+        self.flushes += 1
+        return self.text
+
+    def stats(self):
+        elapsed = self.clock() - self._started
+        return {
+            "chunks": self.chunks,
+            "flushes": self.flushes,
+            "chars": len(self.text),
+            "bytes_sent": self.bytes_sent,
+            "render_ms": round(self.render_seconds * 1000, 1),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "flush_rate": self.flushes / elapsed if elapsed > 0 else 0.0,
+        }
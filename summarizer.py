@@ -0,0 +1,142 @@
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from context_window import split_reference
+from providers import GEMINI_FLASH_MODEL, GEMINI_MODEL, get_registry
+from transcript import format_log_entry
+
+# --------------------------------------------------------------------------
+# 토론 요약 (map-reduce)
+# --------------------------------------------------------------------------
+# 전체 기록을 라운드 경계에서 청크로 나눠 병렬로 부분 요약(map)한 뒤, 부분 요약들을 모아
+# 기존 4단 보고서 형식으로 한 번 더 정리(reduce)한다. 기록이 짧으면 map 없이 한 번에 요약한다.
+# 결과는 기록 내용 해시로 캐시한다 (transcript_store의 summaries 테이블 + 진행 중 요청 공유).
+
+CHUNK_CHARS = 12000
+REFERENCE_HEAD_CHARS = 2000   # 요약에는 [참고 자료] 앞부분만 넣는다 (원문은 최대 40만 자)
+MAP_MODEL = GEMINI_FLASH_MODEL
+REDUCE_MODEL = GEMINI_MODEL
+MAX_WORKERS = 6
+REQUEST_TIMEOUT = 90.0  # Gemini 호출 하나의 상한
+# 다른 세션이 진행 중인 같은 요약을 기다리는 상한 (map + reduce 두 단계). 넘기면 직접 요약한다
+SHARED_WAIT_SECONDS = 2 * REQUEST_TIMEOUT + 10
+PROMPT_VERSION = "v2"
+
+_POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="summarizer")
+
+REPORT_FORMAT = """[요약 형식]
+1. **사용자의 원래 질문**: 사용자가 처음에 해결하고 싶었던 문제가 무엇인지 한 문장으로 정의하세요.
+2. **핵심 쟁점 3가지**: 그 문제를 해결하기 위해 두 AI가 싸운 포인트 3가지를 정리하세요. (쟁점 | ChatGPT 주장 | Claude 반박)
+3. **결정적 순간**: 토론의 흐름을 바꾼 결정적인 논리를 꼽으세요.
+4. **최종 인사이트**: 사용자의 질문에 대한 가장 실용적인 해답 한 문장."""
+
+MAP_PROMPT = """당신은 토론 분석가입니다. 아래는 긴 토론 기록 중 {part}번째 구간입니다 (전체 {total}구간).
+이 구간에서 나온 사용자 질문/지시, ChatGPT의 주장, Claude의 반박, 흐름이 바뀐 순간을 빠짐없이 bullet로 정리하세요.
+숫자, 근거, 구체적 제안은 그대로 남기고 인사말이나 수사는 버리세요.
+
+[토론 기록 {part}/{total}]
+{chunk}"""
+
+REDUCE_PROMPT = """당신은 토론 분석가입니다. 아래의 {source}을 보고 다음 형식으로 요약 보고서를 작성하세요.
+
+[{source}]
+{body}
+
+{report_format}"""
+
+
+def transcript_hash(messages):
+    digest = hashlib.sha256(PROMPT_VERSION.encode("utf-8"))
+    for m in messages:
+        digest.update(f"\x00{m['role']}\x00{m['content']}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cap_reference(content):
+    body, reference = split_reference(content)
+    if reference is None or len(reference) <= REFERENCE_HEAD_CHARS:
+        return content
+    return f"{body}\n\n[참고 자료 앞부분 {REFERENCE_HEAD_CHARS:,}/{len(reference):,}자]\n{reference[:REFERENCE_HEAD_CHARS]}"
+
+
+def round_chunks(messages, chunk_chars=CHUNK_CHARS):
+    # 사용자 발언과 ChatGPT 발언에서 새 라운드가 시작된다 (ChatGPT → Claude가 한 라운드).
+    # 라운드를 쪼개지 않고 chunk_chars 안에서 이어 붙인다. 한 라운드가 chunk_chars보다 길면 그 라운드만
+    # chunk_chars 조각으로 자른다. 첨부 문서는 앞부분만 남긴다.
+    rounds = []
+    for m in messages:
+        entry = format_log_entry(m["role"], _cap_reference(m["content"]))
+        if not rounds or m["role"] in ("user", "left"):
+            rounds.append(entry)
+        else:
+            rounds[-1] += entry
+    chunks = []
+    for entry in rounds:
+        if chunks and len(chunks[-1]) + len(entry) <= chunk_chars:
+            chunks[-1] += entry
+        else:
+            chunks.extend(entry[i:i + chunk_chars] for i in range(0, len(entry), chunk_chars))
+    return chunks
+
+
+def _generate(api_key, model, prompt):
+    return get_registry().gemini(api_key, model).generate_content(
+        prompt, request_options={"timeout": REQUEST_TIMEOUT}).text
+
+
+def _summarize(api_key, messages):
+    chunks = round_chunks(messages)
+    if len(chunks) <= 1:
+        body = chunks[0] if chunks else ""
+        return _generate(api_key, REDUCE_MODEL, REDUCE_PROMPT.format(
+            source="토론 기록", body=body, report_format=REPORT_FORMAT))
+
+    futures = [
+        _POOL.submit(_generate, api_key, MAP_MODEL, MAP_PROMPT.format(part=n, total=len(chunks), chunk=chunk))
+        for n, chunk in enumerate(chunks, 1)
+    ]
+    partials = [f"[구간 {n}/{len(chunks)}]\n{future.result()}" for n, future in enumerate(futures, 1)]
+    return _generate(api_key, REDUCE_MODEL, REDUCE_PROMPT.format(
+        source="구간별 토론 요약", body="\n\n".join(partials), report_format=REPORT_FORMAT))
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def summarize_debate(api_key, messages, store=None):
+    """전체 토론의 요약 보고서를 돌려준다. 반환값: (summary, cached)
+
+    store(TranscriptStore)를 주면 기록 해시로 결과를 저장/재사용한다. 같은 기록을 동시에 요약하면
+    먼저 시작한 요청의 결과를 함께 기다린다 (SHARED_WAIT_SECONDS까지, 넘기면 직접 요약)."""
+    key = transcript_hash(messages)
+    if store is not None:
+        cached = store.get_summary(key)
+        if cached is not None:
+            return cached, True
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        try:
+            return future.result(timeout=SHARED_WAIT_SECONDS), True
+        except FutureTimeout:
+            return _summarize(api_key, messages), False
+
+    try:
+        summary = _summarize(api_key, messages)
+        if store is not None:
+            store.put_summary(key, summary)
+        future.set_result(summary)
+        return summary, False
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
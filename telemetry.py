@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from providers import (ANTHROPIC_FALLBACK_MODEL, ANTHROPIC_MODEL, GEMINI_FLASH_MODEL, GEMINI_MODEL,
+                       OPENAI_FALLBACK_MODEL, OPENAI_MODEL)
+
+# --------------------------------------------------------------------------
+# 턴 단위 계측: 단계별 소요 시간, 토큰, 추정 비용
+# --------------------------------------------------------------------------
+# 엔진은 턴/판결마다 레코드 하나를 만들어 Tracer에 넘긴다. Tracer는 토론별 JSONL 파일에 한 줄씩 쓰고,
+# 프로세스 전역 Metrics에 누적해서 Prometheus 텍스트 형식으로 내보낼 수 있게 한다.
+#
+# 레코드의 spans (초 단위):
+#   search_decision : 검색 판단 (agent 모드)          ddg_search : DDG 검색 (합계)
+#   connect         : 요청 시작 ~ 응답 헤더 수신       ttft       : 요청 시작 ~ 첫 토큰
+#   stream          : 요청 시작 ~ 스트림 종료          render     : UI 렌더링 (Streamlit에서만)
+
+TRACE_DIR = os.environ.get("TRACE_DIR", ".traces")
+
+# USD / 1M 토큰: (입력, 캐시 적중 입력, 출력, 캐시 기록 입력)
+MODEL_PRICES = {
+    OPENAI_MODEL: (1.25, 0.125, 10.0, 1.25),
+    ANTHROPIC_MODEL: (3.0, 0.30, 15.0, 3.75),
+    GEMINI_MODEL: (1.25, 0.31, 10.0, 1.25),
+    GEMINI_FLASH_MODEL: (0.30, 0.075, 2.50, 0.30),
+    OPENAI_FALLBACK_MODEL: (0.25, 0.025, 2.0, 0.25),
+    ANTHROPIC_FALLBACK_MODEL: (1.0, 0.10, 5.0, 1.25),
+}
+PROVIDER_MODELS = {"openai": OPENAI_MODEL, "anthropic": ANTHROPIC_MODEL, "gemini": GEMINI_MODEL}
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+
+def estimate_cost(model, usage):
+    prices = MODEL_PRICES.get(model)
+    if not prices or not usage:
+        return 0.0
+    input_price, cached_price, output_price, write_price = prices
+    cached = usage.get("cached_tokens", 0)
+    written = usage.get("cache_write_tokens", 0)
+    uncached = max(usage.get("input_tokens", 0) - cached - written, 0)
+    total = (uncached * input_price + cached * cached_price + written * write_price
+             + usage.get("output_tokens", 0) * output_price)
+    return round(total / 1_000_000, 6)
+
+
+@contextmanager
+def timed(spans, name):
+    # 같은 이름의 구간이 여러 번이면 (예: 도구 호출 검색 2회) 합산한다
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = round(spans.get(name, 0.0) + time.perf_counter() - started, 4)
+
+
+# --------------------------------------------------------------------------
+# 프로세스 전역 메트릭 (Prometheus 텍스트 형식)
+# --------------------------------------------------------------------------
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            row = self._histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for n, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    row[n] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def record(self, record):
+        labels = {"kind": record["type"], "provider": record.get("provider", "")}
+        for span, seconds in record.get("spans", {}).items():
+            self.observe("debate_stage_seconds", seconds, stage=span, **labels)
+        for key, value in (record.get("usage") or {}).items():
+            self.inc("debate_tokens_total", value, type=key, **labels)
+        if record.get("cost_usd"):
+            self.inc("debate_cost_usd_total", record["cost_usd"], **labels)
+        if record["type"] == "stop":
+            self.inc("debate_early_stops_total", reason=record["reason"])
+        self.inc("debate_records_total", **labels)
+
+    def render_prometheus(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({key[0] for key in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (key_name, labels), value in sorted(self._counters.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{fmt(labels)} {value}")
+            for name in sorted({key[0] for key in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (key_name, labels), row in sorted(self._histograms.items()):
+                    if key_name != name:
+                        continue
+                    for bound, count in zip(LATENCY_BUCKETS, row):
+                        lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {row[-1]}")
+                    lines.append(f"{name}_sum{fmt(labels)} {round(row[-2], 4)}")
+                    lines.append(f"{name}_count{fmt(labels)} {row[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+_server = None
+
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def start_metrics_server(port=None):
+    """GET /metrics 로 Prometheus 텍스트를 내보내는 스레드 서버 (프로세스당 한 번만 뜬다).
+
+    port가 없으면 환경 변수 METRICS_PORT를 보고, 둘 다 없으면 아무것도 하지 않는다."""
+    global _server
+    port = port or os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    with _metrics_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = get_metrics().render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), Handler)
+        except OSError:
+            return None  # 다른 프로세스가 이미 포트를 사용 중
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
+
+
+# --------------------------------------------------------------------------
+# 토론별 JSONL 트레이스
+# --------------------------------------------------------------------------
+class Tracer:
+    def __init__(self, debate_id, directory=TRACE_DIR, metrics=None):
+        self.debate_id = debate_id
+        self.path = os.path.join(directory, f"{debate_id}.jsonl") if directory else None
+        self.metrics = metrics or get_metrics()
+        self.records = []
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, record):
+        record = {"debate_id": self.debate_id, "ts": round(time.time(), 3), **record}
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.metrics.record(record)
+        return record
+
+    def summary(self):
+        turns = [r for r in self.records if r["type"] == "turn"]
+        judges = [r for r in self.records if r["type"] == "judge"]
+        renders = [r for r in self.records if r["type"] == "render"]
+        notes = [r for r in self.records if r["type"] == "notes"]
+        cost = {}
+        for r in turns + judges + notes:
+            cost[r["provider"]] = cost.get(r["provider"], 0.0) + r.get("cost_usd", 0.0)
+
+        def avg(rows, span):
+            values = [r["spans"][span] for r in rows if span in r["spans"]]
+            return sum(values) / len(values) if values else None
+
+        return {
+            "turns": len(turns),
+            "last": turns[-1] if turns else None,
+            "avg_ttft": avg(turns, "ttft"),
+            "avg_stream": avg(turns, "stream"),
+            "avg_search": avg(turns, "ddg_search"),
+            "avg_render": avg(renders, "render"),
+            "avg_tokens_per_s": (sum(r["tokens_per_s"] for r in turns) / len(turns)) if turns else None,
+            "judge": judges[-1]["spans"].get("stream") if judges else None,
+            "cost_usd": cost,
+            "total_cost_usd": round(sum(cost.values()), 6),
+        }
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import rate_limit
+from admission import AdmissionController
+from rate_limit import RateLimiter
+
+
+def controller(concurrency=1, **limits):
+    return AdmissionController(concurrency={"openai": concurrency},
+                               limits={"openai": dict({"rpm": None, "tpm": None}, **limits)})
+
+
+async def hold(ctrl, session, order, release):
+    async with ctrl.slot("openai", session=session):
+        order.append(session)
+        await release.wait()
+
+
+def test_round_robin_between_sessions():
+    async def run():
+        ctrl, order = controller(), []
+        blocker = ctrl.slot("openai", session="x")
+        await blocker.__aenter__()
+        slots = [ctrl.slot("openai", session=s) for s in ("a", "a", "a", "b")]
+        entered = [asyncio.create_task(slot.__aenter__()) for slot in slots]
+        await asyncio.sleep(0)
+        assert [ctrl.position("openai", slot.waiter) for slot in slots] == [1, 3, 4, 2]
+        await blocker.__aexit__(None, None, None)
+        while entered:
+            done, _ = await asyncio.wait(entered, return_when=asyncio.FIRST_COMPLETED)
+            assert len(done) == 1  # 동시에 한 자리만
+            task = done.pop()
+            entered.remove(task)
+            slot = task.result()
+            order.append(slot.session)
+            await slot.__aexit__(None, None, None)
+        return order, ctrl.stats()["openai"]
+
+    order, stats = asyncio.run(run())
+    # a가 요청을 먼저 많이 쌓아도 b는 a의 두 번째 요청보다 먼저 들어간다
+    assert order == ["a", "b", "a", "a"]
+    assert stats["active"] == 0 and stats["granted"] == 5
+
+
+def test_concurrency_cap_and_queue_position():
+    async def run():
+        ctrl = controller(concurrency=2)
+        slots = [ctrl.slot("openai", session=f"s{n}") for n in range(3)]
+        await slots[0].__aenter__()
+        await slots[1].__aenter__()
+        updates = slots[2].updates(interval=0.01)
+        position = await updates.__anext__()
+        await updates.aclose()
+        assert ctrl.stats()["openai"]["active"] == 2
+        await slots[0].__aexit__(None, None, None)
+        await asyncio.wait_for(slots[2].__aenter__(), 1)
+        for slot in slots[1:]:
+            await slot.__aexit__(None, None, None)
+        return position, ctrl.stats()["openai"]
+
+    position, stats = asyncio.run(run())
+    assert position == 1
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        ctrl = controller()
+        first = ctrl.slot("openai", session="a")
+        await first.__aenter__()
+        waiter = asyncio.create_task(hold(ctrl, "b", [], asyncio.Event()))
+        await asyncio.sleep(0.01)
+        assert ctrl.stats()["openai"]["waiting"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        stats = ctrl.stats()["openai"]
+        await first.__aexit__(None, None, None)
+        first.cancel()  # 이미 나온 자리를 다시 돌려줘도 안전하다
+        return stats, ctrl.stats()["openai"]
+
+    queued, final = asyncio.run(run())
+    assert queued["waiting"] == 0 and queued["active"] == 1
+    assert final["active"] == 0
+
+
+def test_rpm_bucket_delays_admission():
+    async def run():
+        ctrl = controller(concurrency=0, rpm=600)  # 초당 10회, 버킷 600
+        ctrl._queue("openai").requests.level = 1
+        async with ctrl.slot("openai"):
+            pass
+        started = asyncio.get_running_loop().time()
+        async with ctrl.slot("openai"):
+            pass
+        return asyncio.get_running_loop().time() - started
+
+    assert 0.05 <= asyncio.run(run()) < 0.5
+
+
+def test_rate_limiter_waits_for_tokens_and_settles(monkeypatch):
+    now = [0.0]
+
+    async def fake_sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", fake_sleep)
+    limiter = RateLimiter(limits={"openai": {"rpm": 60, "tpm": 600}}, clock=lambda: now[0])
+
+    async def run():
+        await limiter.acquire("openai", 500)
+        limiter.settle("openai", 500, 100)   # 추정보다 적게 씀 → 400 돌려받음
+        await limiter.acquire("openai", 500)
+        waited_after_refund = now[0]
+        await limiter.acquire("openai", 500)
+        return waited_after_refund, now[0]
+
+    refunded, final = asyncio.run(run())
+    assert refunded == 0.0              # 정산 덕에 바로 통과
+    assert final == pytest.approx(50.0)  # 분당 600 토큰: 빈 버킷에서 500 토큰은 50초
@@ -0,0 +1,42 @@
+from context_window import REFERENCE_MARKER, ContextBudget, compact_history, digest
+from prompts import build_api_messages
+from transcript import make_message
+
+
+def long_debate(rounds=6, chars=30000):
+    history = [make_message("user", f"원격근무를 도입해야 하나?\n\n{REFERENCE_MARKER}\n" + "참고 " * 20000)]
+    for n in range(rounds):
+        history.append(make_message("left", f"ChatGPT {n}. " + "근거를 들어 주장합니다. " * (chars // 14)))
+        history.append(make_message("right", f"Claude {n}. " + "반박합니다 그 근거는 틀렸다. " * (chars // 17)))
+    history.append(make_message("user", "추가 질문: " + "비용도 따져 봐라. " * 5000))
+    history.append(make_message("left", "마지막 발언. " * 3000))
+    return history
+
+
+# 발언이 아무리 길어도 턴당 전송 토큰은 상한을 넘지 않는다
+def test_sent_tokens_never_exceed_ceiling():
+    for provider in ("openai", "anthropic"):
+        report = {}
+        build_api_messages("right", long_debate(), budget=ContextBudget(max_tokens=24000), provider=provider,
+                           report=report)
+        assert report["sent_tokens"] <= 24000
+
+
+def test_ceiling_keeps_latest_turn_and_request():
+    entries, report = compact_history(long_debate(), ContextBudget(max_tokens=24000))
+    assert report["sent_tokens"] <= 24000
+    assert entries[-1]["content"].startswith("마지막 발언.")
+    assert entries[0]["content"].startswith("원격근무를 도입해야 하나?")
+
+
+def test_short_history_is_sent_verbatim():
+    history = [make_message("user", "질문"), make_message("left", "주장."), make_message("right", "반박.")]
+    entries, report = compact_history(history, ContextBudget())
+    assert [e["content"] for e in entries] == ["질문", "주장.", "반박."]
+    assert report["summarized_messages"] == 0
+
+
+def test_digest_is_cached_per_length():
+    message = make_message("left", "첫 문장입니다. 두 번째 문장은 조금 더 깁니다. 세 번째 문장.")
+    assert digest(message, 10) != digest(message, 200)
+    assert digest(message, 200).startswith("첫 문장입니다. 두 번째")
@@ -0,0 +1,24 @@
+import pytest
+
+from convergence import find_surrender
+
+
+# 상대에게 항복을 요구하거나, 되묻거나, 부정하는 말은 항복이 아니다
+@pytest.mark.parametrize("text", [
+    "패배를 인정하라, ChatGPT.",
+    "I concede nothing.",
+    "네 말이 맞다고? 웃기지 마라.",
+    "전적으로 동의하기 어렵다",
+])
+def test_not_surrender(text):
+    assert find_surrender(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "좋습니다. 패배를 인정합니다.",
+    "생각해 보니 네 말이 맞다.",
+    "그 부분은 전적으로 동의합니다.",
+    "Fair enough, I concede.",
+])
+def test_surrender(text):
+    assert find_surrender(text)
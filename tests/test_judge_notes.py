@@ -0,0 +1,42 @@
+import judge_notes
+from context_window import REFERENCE_MARKER
+from judge_notes import REFERENCE_NOTE_CHARS, JudgeNotes
+
+
+def debate_with_upload():
+    reference = "재택근무 생산성 보고서: 생산성이 13% 올랐다.\n" + "관련 없는 부록 문단입니다.\n" * 20000
+    return [
+        {"role": "user", "content": f"원격근무를 도입해야 하나?\n\n{REFERENCE_MARKER}\n{reference}"},
+        {"role": "left", "content": "보고서에 따르면 재택근무 생산성이 13% 올랐다."},
+        {"role": "right", "content": "그 보고서는 표본이 작다."},
+    ]
+
+
+class FakeModel:
+    def __init__(self, prompts):
+        self.prompts = prompts
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        return type("Response", (), {"text": '{"claims": {}, "evidence": [], "points": []}'})()
+
+
+# 업로드한 문서 전체가 노트 모델과 판결 컨텍스트로 넘어가지 않는다
+def test_note_prompt_and_verdict_context_cap_reference(monkeypatch):
+    prompts = []
+    registry = type("Registry", (), {"gemini": lambda self, key, model: FakeModel(prompts)})()
+    monkeypatch.setattr(judge_notes, "get_registry", lambda: registry)
+    messages = debate_with_upload()
+    notes = JudgeNotes()
+    start, end = notes.claim_round(messages)
+    notes.write_note("key", messages, start, end)
+    assert len(prompts[0]) < 6000
+    assert "13%" in prompts[0]
+    context = notes.build_context(messages)
+    assert len(context) < 4000
+    assert "원격근무를 도입해야 하나?" in context
+
+
+def test_raw_fallback_caps_reference():
+    context = JudgeNotes().build_context(debate_with_upload())
+    assert len(context) < REFERENCE_NOTE_CHARS * 3
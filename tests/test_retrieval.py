@@ -0,0 +1,36 @@
+from retrieval import chunk_text, get_index, retrieve_excerpts, tokenize
+
+# 주제마다 청크 하나 크기(약 800자)의 문단
+DOCUMENT = "\n".join(sentence * (700 // len(sentence)) for sentence in (
+    "원격근무 도입 이후 직원 생산성은 13% 증가했다. ",
+    "사무실 임대료는 연간 2억 원 절감되었다. ",
+    "신입 사원의 온보딩 만족도는 오히려 낮아졌다. ",
+    "부록: 회의록 일정과 참석자 명단. ",
+))
+
+
+def test_tokenize_matches_korean_words_with_particles():
+    # 조사가 붙어도 bigram이 겹친다
+    assert set(tokenize("생산성")) <= set(tokenize("생산성은"))
+
+
+def test_chunk_text_respects_chunk_size():
+    chunks = chunk_text("가나다라마. " * 500 + "x" * 2000, chunk_chars=300)
+    assert chunks and all(len(chunk) <= 300 for chunk in chunks)
+
+
+def test_retrieve_excerpts_picks_relevant_chunk():
+    excerpt = retrieve_excerpts(DOCUMENT, "임대료 절감 효과", k=1, max_chars=100)
+    assert excerpt.startswith("[참고 자료 발췌]")
+    assert excerpt.count("임대료") > excerpt.count("온보딩") + excerpt.count("생산성")
+    assert len(excerpt.splitlines()) == 2  # 상위 1개 청크만
+
+
+def test_retrieve_excerpts_without_match_or_query():
+    assert retrieve_excerpts(DOCUMENT, "quantum chromodynamics") is None
+    assert retrieve_excerpts(DOCUMENT, "") is None
+    assert retrieve_excerpts("", "임대료") is None
+
+
+def test_index_is_cached_per_document():
+    assert get_index(DOCUMENT) is get_index(DOCUMENT)
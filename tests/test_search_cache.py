@@ -0,0 +1,26 @@
+import pytest
+
+from search_cache import normalize_query
+
+
+def test_folds_case_width_punctuation_and_spaces():
+    assert normalize_query("  ＡＩ   규제, 2024?") == normalize_query("ai 규제 2024")
+    assert normalize_query("“원격근무” (생산성) - 통계!") == normalize_query("원격근무 생산성 통계")
+
+
+# 기호는 질의의 뜻을 바꾸므로 접지 않는다
+@pytest.mark.parametrize("a, b", [
+    ("C++ performance", "C performance"),
+    ("$100 price", "100 price"),
+    ("C# tutorial", "C tutorial"),
+    ("AT&T 주가", "AT T 주가"),
+    ("50% 증가", "50 증가"),
+    ("TCP/IP 설명", "TCP IP 설명"),
+    ("user@example 계정", "user example 계정"),
+])
+def test_symbols_keep_queries_distinct(a, b):
+    assert normalize_query(a) != normalize_query(b)
+
+
+def test_percent_is_kept():
+    assert normalize_query("50% 증가") == "50% 증가"
@@ -0,0 +1,51 @@
+from stream_render import CURSOR, StreamRenderer
+
+
+class Slot:
+    def __init__(self):
+        self.body = None
+        self.renders = 0
+
+    def markdown(self, body):
+        self.body = body
+        self.renders += 1
+
+    def empty(self):
+        slot = Slot()
+        self.slots.append(slot)
+        return slot
+
+    def container(self):
+        self.slots = []
+        return self
+
+
+def renderer(**kwargs):
+    placeholder = Slot()
+    return placeholder, StreamRenderer(placeholder, min_interval=0, **kwargs)
+
+
+def test_finished_paragraphs_are_frozen():
+    placeholder, r = renderer(header="**ChatGPT:**")
+    for chunk in ["첫 문단.\n\n", "둘째 ", "문단"]:
+        r.write(chunk)
+    frozen, live = placeholder.slots
+    assert frozen.body == "**ChatGPT:**\n\n첫 문단.\n\n" and frozen.renders == 1
+    assert live.body == f"둘째 문단{CURSOR}"
+
+
+def test_no_cut_inside_code_fence():
+    placeholder, r = renderer()
+    r.write("소개\n\n```python\nx = 1\n\ny = 2\n")
+    assert [s.body for s in placeholder.slots[:-1]] == ["소개\n\n"]
+    r.write("```\n\n끝")
+    # 코드 블록이 닫힌 뒤에야 블록 전체가 하나의 고정 요소가 된다
+    assert placeholder.slots[1].body == "```python\nx = 1\n\ny = 2\n```\n\n"
+    assert placeholder.slots[-1].body == f"끝{CURSOR}"
+
+
+def test_finalize_renders_full_text_once():
+    placeholder, r = renderer(header="H")
+    r.write("a\n\nb")
+    assert r.finalize() == "a\n\nb"
+    assert placeholder.body == "H\n\na\n\nb"
@@ -0,0 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from debate_engine import OUTPUT_TOKEN_ESTIMATE, DebateEngine
+from resilience import StreamPolicy, StreamStalled
+
+
+class RecordingScheduler:
+    # 토큰 버킷 대신 차감(slot)과 정산(settle)을 합산한다
+    def __init__(self):
+        self.charged = 0
+
+    @asynccontextmanager
+    async def slot(self, provider, tokens=0, **_):
+        self.charged += tokens
+        yield
+
+    def settle(self, provider, estimated, actual):
+        self.charged += actual - estimated
+
+
+def test_each_retry_attempt_is_settled():
+    scheduler = RecordingScheduler()
+    engine = DebateEngine({"openai": "", "anthropic": "", "google": ""}, scheduler=scheduler,
+                          stream_policy=StreamPolicy(max_attempts=3, backoff=0.0))
+    usage = {}
+    attempts = []
+
+    def make_stream(model, partial, control):
+        attempts.append(model)
+        if len(attempts) < 3:
+            raise StreamStalled("ttft", 1.0)
+        usage.update(input_tokens=1000, output_tokens=50)
+        return iter(["답변"])
+
+    async def run():
+        return [item async for item in engine._timed_stream(
+            "left", "openai", 2500, make_stream, {}, {}, {}, usage) if isinstance(item, str)]
+
+    assert asyncio.run(run()) == ["답변"]
+    assert len(attempts) == 3
+    # 실패한 두 시도는 입력 추정치만, 성공한 시도는 실제 사용량만 남는다
+    assert scheduler.charged == 2 * (2500 - OUTPUT_TOKEN_ESTIMATE) + 1050
@@ -0,0 +1,36 @@
+import threading
+
+import summarizer
+from context_window import REFERENCE_MARKER
+from summarizer import round_chunks, summarize_debate
+
+
+def test_round_chunks_cap_reference_and_split_long_rounds():
+    messages = [{"role": "user", "content": f"질문\n\n{REFERENCE_MARKER}\n" + "가" * 400000},
+                {"role": "left", "content": "x" * 30000}, {"role": "right", "content": "y" * 100}]
+    chunks = round_chunks(messages, chunk_chars=12000)
+    assert all(len(chunk) <= 12000 for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) < 40000
+
+
+# 먼저 시작한 요약이 멈춰 있으면 기다리다가 직접 요약한다
+def test_waiter_falls_back_when_owner_hangs(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def generate(api_key, model, prompt):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            release.wait(5)
+        return "요약"
+
+    monkeypatch.setattr(summarizer, "_generate", generate)
+    monkeypatch.setattr(summarizer, "SHARED_WAIT_SECONDS", 0.2)
+    messages = [{"role": "user", "content": "질문"}, {"role": "left", "content": "주장"}]
+    owner = threading.Thread(target=summarize_debate, args=("key", messages), name="owner")
+    owner.start()
+    while not calls:
+        pass
+    assert summarize_debate("key", messages) == ("요약", False)
+    release.set()
+    owner.join()
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+import web_search
+from search_cache import SearchCache
+from web_search import HEDGE_BACKENDS, hedged_search, merge_results, search_web, split_queries
+
+
+def result(href, title="제목", body="본문"):
+    return {"href": href, "title": title, "body": body}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = SearchCache()
+    monkeypatch.setattr(web_search, "get_search_cache", lambda: cache)
+    return cache
+
+
+def test_split_queries_dedupes_and_caps():
+    assert split_queries("원격근무 통계 | 원격근무  통계? | 재택 생산성 | a | b") == ["원격근무 통계", "재택 생산성", "a"]
+
+
+def test_merge_results_round_robin_and_dedupe():
+    merged = merge_results([
+        [result("https://www.a.com/x?utm_source=t", "A1", "첫 번째 글의 본문 내용"), result("https://b.com/y", "B")],
+        [result("https://a.com/x/", "A1 사본", "다른 본문"), result("https://c.com/z", "C")],
+        [result("https://d.com/", "A1", "첫 번째 글의 본문 내용")],
+    ], limit=6)
+    # 추적 파라미터/www/끝 슬래시만 다른 URL과 거의 같은 스니펫은 하나만 남고, 질의별 순위를 번갈아 합친다
+    assert [r["href"] for r in merged] == ["https://www.a.com/x?utm_source=t", "https://b.com/y", "https://c.com/z"]
+
+
+def test_slow_backend_is_hedged(monkeypatch):
+    calls = []
+
+    def fetch(query, backend, max_results):
+        calls.append(backend)
+        if backend == HEDGE_BACKENDS[0]:
+            time.sleep(1.0)
+        return [result(f"https://{backend}.com/{query}")]
+
+    monkeypatch.setattr(web_search, "_fetch", fetch)
+    started = time.monotonic()
+    lists, errors = hedged_search(["q"], deadline=2.0, hedge_after=0.1)
+    assert time.monotonic() - started < 0.8
+    assert lists == [[result(f"https://{HEDGE_BACKENDS[1]}.com/q")]]
+    assert calls == list(HEDGE_BACKENDS[:2]) and not errors
+
+
+def test_deadline_returns_partial_results(monkeypatch):
+    def fetch(query, backend, max_results):
+        if query == "slow":
+            time.sleep(1.0)
+        return [result(f"https://x.com/{query}")]
+
+    monkeypatch.setattr(web_search, "_fetch", fetch)
+    started = time.monotonic()
+    lists, errors = hedged_search(["fast", "slow"], deadline=0.3, hedge_after=0.2)
+    assert time.monotonic() - started < 0.6
+    assert lists == [[result("https://x.com/fast")], []]
+    assert errors and "시간 초과" in errors[-1]
+
+
+def test_failed_backend_retries_next_and_caches(monkeypatch, fresh_cache):
+    calls = []
+
+    def fetch(query, backend, max_results):
+        calls.append(backend)
+        if backend == HEDGE_BACKENDS[0]:
+            raise RuntimeError("429")
+        return [result("https://ok.com/")]
+
+    monkeypatch.setattr(web_search, "_fetch", fetch)
+    assert hedged_search(["q"], hedge_after=5)[0] == [[result("https://ok.com/")]]
+    assert hedged_search(["q"], hedge_after=5)[0] == [[result("https://ok.com/")]]
+    assert calls == list(HEDGE_BACKENDS[:2])  # 두 번째 호출은 캐시
+
+
+def test_gate_is_entered_once_per_fetch(monkeypatch):
+    entered = []
+
+    class Gate:
+        def __enter__(self):
+            entered.append(threading.current_thread().name)
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(web_search, "_fetch", lambda q, b, m: [result(f"https://x.com/{q}", q, f"{q} 관련 내용")])
+    assert search_web("a | b | c", gate=Gate).count("Source:") == 3
+    assert len(entered) == 3
@@ -0,0 +1,58 @@
+import re
+from functools import lru_cache
+
+# --------------------------------------------------------------------------
+# 메시지 레코드
+# --------------------------------------------------------------------------
+# 메시지는 추가될 때 한 번만 정제/토큰 계산/마크다운 렌더링을 하고,
+# 이후 rerun에서는 렌더러와 build_api_messages가 캐시된 필드만 읽는다.
+
+SPEAKER_LABELS = {"left": "ChatGPT (불도저)", "right": "Claude (독설가)", "chief": "Gemini (판결)"}
+LOG_HEADERS = {"user": "👤 사용자", "left": "🔥 ChatGPT (전략가)", "right": "❄️ Claude (독설가)", "chief": "⚖️ Gemini (판결)"}
+LOG_DIVIDER = "-" * 50
+
+
+@lru_cache(maxsize=None)
+def _prefix_pattern(role_name):
+    return re.compile(rf"^(\[{role_name}\]|{role_name}|\[.*?\]):\s*", flags=re.IGNORECASE)
+
+
+def clean_response(text, role_name):
+    return _prefix_pattern(role_name).sub("", text).strip()
+
+
+def estimate_tokens(text):
+    # 대략적인 추정치: ASCII 4글자당 1토큰, 한글 등 비ASCII는 글자당 1토큰
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def render_markdown(role, cleaned):
+    if role in SPEAKER_LABELS:
+        return f"**{SPEAKER_LABELS[role]}:**\n\n{cleaned}"
+    return cleaned
+
+
+def format_log_entry(role, content):
+    return f"\n[{LOG_HEADERS.get(role, role)}]\n{content}\n{LOG_DIVIDER}\n"
+
+
+def make_message(role, content, **extra):
+    cleaned = clean_response(content, role)
+    message = {
+        "role": role,
+        "content": content,
+        "cleaned": cleaned,
+        "tokens": estimate_tokens(cleaned),
+        "markdown": render_markdown(role, cleaned),
+    }
+    message.update(extra)
+    return message
+
+
+def ensure_message(message):
+    # 이전 버전 세션에 남아 있는 {"role", "content"} 형태의 메시지를 제자리에서 업그레이드
+    if "cleaned" not in message:
+        message.update(make_message(message["role"], message["content"]))
+    return message
+
@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from transcript import SPEAKER_LABELS, format_log_entry, make_message
+
+# --------------------------------------------------------------------------
+# 토론 기록 저장소 (SQLite, 메시지는 추가만 한다)
+# --------------------------------------------------------------------------
+# 발언이 끝날 때마다 한 줄씩 INSERT해서 브라우저 새로고침이나 서버 재시작 뒤에도 토론 ID로 이어 볼 수 있게 한다.
+# 내보내기(TXT/Markdown/JSONL)는 저장소를 커서로 읽으며 조각 단위로 흘려보내므로 큰 문자열을 만들지 않는다.
+
+EXPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "md": ("text/markdown", "md"),
+    "jsonl": ("application/jsonl", "jsonl"),
+}
+EXPORT_BATCH = 64
+
+
+class TranscriptStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS debates ("
+            "id TEXT PRIMARY KEY, title TEXT, created REAL NOT NULL, updated REAL NOT NULL, state TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "debate_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "usage TEXT, created REAL NOT NULL, PRIMARY KEY (debate_id, seq))"
+        )
+        # 요약 보고서 캐시 (키: 기록 내용 해시 — summarizer.transcript_hash)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        # 판결 캐시 (키: 판결 프롬프트 + 모델 해시 — debate_engine.verdict_key)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    # ---- 쓰기 ------------------------------------------------------------
+    def append_new(self, debate_id, messages, state=None):
+        """messages 중 아직 저장되지 않은 꼬리만 INSERT한다. state(dict)를 주면 토론 상태도 갱신. 반환값: 새로 쓴 개수"""
+        now = time.time()
+        with self._lock:
+            stored = self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE debate_id = ?", (debate_id,)
+            ).fetchone()[0]
+            rows = [
+                (debate_id, seq, m["role"], m["content"], json.dumps(m.get("usage") or {}), now)
+                for seq, m in enumerate(messages[stored:], stored)
+            ]
+            title = next((m["content"][:80] for m in messages if m["role"] == "user"), "")
+            self._db.execute(
+                "INSERT OR IGNORE INTO debates (id, title, created, updated, state) VALUES (?, ?, ?, ?, '{}')",
+                (debate_id, title, now, now),
+            )
+            self._db.execute("UPDATE debates SET updated = ? WHERE id = ?", (now, debate_id))
+            if state is not None:
+                self._db.execute("UPDATE debates SET state = ? WHERE id = ?", (json.dumps(state), debate_id))
+            # 이미 있는 seq는 건드리지 않는다 (append-only)
+            self._db.executemany(
+                "INSERT OR IGNORE INTO messages (debate_id, seq, role, content, usage, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+            return len(rows)
+
+    def put_summary(self, key, summary):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created) VALUES (?, ?, ?)", (key, summary, time.time())
+            )
+            self._db.commit()
+
+    def put_verdict(self, key, verdict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created) VALUES (?, ?, ?)", (key, verdict, time.time())
+            )
+            self._db.commit()
+
+    # ---- 읽기 ------------------------------------------------------------
+    def get_summary(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_verdict(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def exists(self, debate_id):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM debates WHERE id = ?", (debate_id,)).fetchone() is not None
+
+    def state(self, debate_id):
+        with self._lock:
+            row = self._db.execute("SELECT state FROM debates WHERE id = ?", (debate_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_rows(self, debate_id, batch=EXPORT_BATCH):
+        # seq 순서로 batch개씩 끊어 읽는다 (락은 배치마다 잠깐만 잡는다)
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT seq, role, content, usage, created FROM messages "
+                    "WHERE debate_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (debate_id, last, batch),
+                ).fetchall()
+            if not rows:
+                return
+            for seq, role, content, usage, created in rows:
+                yield {"seq": seq, "role": role, "content": content, "usage": json.loads(usage or "{}"),
+                       "created": created}
+            last = rows[-1][0]
+
+    def load_messages(self, debate_id):
+        return [make_message(r["role"], r["content"], usage=r["usage"]) for r in self.iter_rows(debate_id)]
+
+    def list_debates(self, ids, limit=20):
+        # 전체 목록은 내주지 않는다: 호출자가 가진(자기가 만든) 토론 ID 중에서만 최신순으로 돌려준다
+        ids = list(ids)[-500:]
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.id, d.title, d.updated, COUNT(m.seq) FROM debates d "
+                f"LEFT JOIN messages m ON m.debate_id = d.id WHERE d.id IN ({marks}) "
+                "GROUP BY d.id ORDER BY d.updated DESC LIMIT ?",
+                (*ids, limit),
+            ).fetchall()
+        return [{"id": r[0], "title": r[1], "updated": r[2], "messages": r[3]} for r in rows]
+
+    # ---- 내보내기 ---------------------------------------------------------
+    def iter_export(self, debate_id, fmt="txt"):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"지원하지 않는 형식: {fmt}")
+        if fmt == "md":
+            yield f"# AI Death Match — {debate_id}\n"
+        for row in self.iter_rows(debate_id):
+            role, content = row["role"], row["content"]
+            if fmt == "txt":
+                yield format_log_entry(role, content)
+            elif fmt == "md":
+                yield f"\n## {SPEAKER_LABELS.get(role, '사용자' if role == 'user' else role)}\n\n{content}\n"
+            else:
+                yield json.dumps({"debate_id": debate_id, **row}, ensure_ascii=False) + "\n"
+
+    def export_file(self, debate_id, fmt="txt"):
+        # 임시 파일에 조각 단위로 써서 파일 객체로 돌려준다 (st.download_button의 지연 데이터용)
+        spool = tempfile.TemporaryFile()
+        for piece in self.iter_export(debate_id, fmt):
+            spool.write(piece.encode("utf-8"))
+        spool.seek(0)
+        return spool
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_transcript_store():
+    # TRANSCRIPT_DB로 경로 변경 가능 (기본: .cache/transcripts.sqlite3)
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = TranscriptStore(os.environ.get("TRANSCRIPT_DB", os.path.join(".cache", "transcripts.sqlite3")))
+        return _default_store
@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urlencode, urlsplit
+from urllib.request import urlopen
+
+from providers import get_registry, load_sdk
+from search_cache import get_search_cache, normalize_query
+
+# --------------------------------------------------------------------------
+# 웹 검색 및 검색 판단 에이전트
+# --------------------------------------------------------------------------
+# 검색 방식 (search_mode)
+#   tools     : 토론자 호출 자체에 web_search 도구를 노출해 모델이 스트리밍 중에 직접 검색 (추가 왕복 없음)
+#   agent     : 별도 판단 에이전트 호출로 SEARCH/PASS 결정 (휴리스틱 사전 필터를 통과할 때만 호출)
+#   heuristic : 모델 호출 없이 로컬 휴리스틱으로 판단하고 검색어도 직접 뽑음
+#   off       : 검색 안 함
+SEARCH_MODES = ("tools", "agent", "heuristic", "off")
+DEFAULT_SEARCH_MODE = "agent"  # 상대 발언 중에 미리 검색해 두는 prefetch는 agent/heuristic에서만 돈다
+
+log = logging.getLogger("web_search")
+
+WEB_SEARCH_TOOL = {
+    "name": "web_search",
+    "description": "웹에서 최신 통계, 뉴스, 사실 관계를 검색한다. 상대의 주장을 수치나 사례로 반박/방어해야 할 때만 쓴다.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string", "description": "구체적인 검색어 (예: 2024년 한국 경제 성장률 전망)"},
+            "alternatives": {"type": "array", "items": {"type": "string"}, "maxItems": 2,
+                             "description": "선택: 같은 사실을 다른 각도로 찾는 보조 검색어 (동시에 검색됨)"},
+        },
+        "required": ["query"],
+    },
+}
+
+# --------------------------------------------------------------------------
+# 헤지 검색: 여러 질의를 동시에, 느린 요청은 다른 백엔드로 재요청, 전체에 하드 데드라인
+# --------------------------------------------------------------------------
+# 질의마다 첫 백엔드로 요청하고 HEDGE_AFTER초 안에 답이 없으면 다음 백엔드로 같은 질의를 한 번 더 보낸다.
+# 먼저 돌아온 성공 응답을 쓰고, SEARCH_DEADLINE이 지나면 그때까지 모인 결과만으로 증거를 만든다.
+HEDGE_BACKENDS = ("lite", "html", "bing")
+HEDGE_AFTER = 1.2
+SEARCH_DEADLINE = 4.0
+MAX_QUERIES = 3
+MAX_EVIDENCE_RESULTS = 6
+SNIPPET_DUP_THRESHOLD = 0.8
+
+# 데드라인을 넘긴 요청은 버려지지만 스레드는 DDGS timeout까지 돌고 끝난다
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="web-search")
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|ref)$")
+
+
+def _fetch(query, backend, max_results):
+    # SEARCH_BACKEND_URL이 있으면 DDG 대신 그 주소로 검색한다 (벤치마크용 목 서버 등, JSON 리스트 응답)
+    backend_url = os.environ.get("SEARCH_BACKEND_URL")
+    if backend_url:
+        params = urlencode({"q": query, "backend": backend, "max_results": max_results})
+        with urlopen(f"{backend_url}?{params}", timeout=SEARCH_DEADLINE) as response:
+            return json.loads(response.read())
+    DDGS = load_sdk("duckduckgo_search").DDGS
+    with DDGS(timeout=int(SEARCH_DEADLINE) + 1) as ddgs:
+        return list(ddgs.text(query, max_results=max_results, backend=backend) or [])
+
+
+def _gated_fetch(gate, query, backend, max_results):
+    # gate: 요청 하나를 실제로 보낼 때마다 들어가는 (동기) 컨텍스트 매니저 팩토리. 레이트 리미트/입장 제어는
+    # search_web 호출 단위가 아니라 여기서 요청 단위로 차감된다 (질의 3개 x 헤지 백엔드 3개 = 최대 9건)
+    if gate is None:
+        return _fetch(query, backend, max_results)
+    with gate():
+        return _fetch(query, backend, max_results)
+
+
+def split_queries(queries):
+    # "질의1 | 질의2" 문자열 또는 리스트 -> 중복 없는 질의 리스트 (최대 MAX_QUERIES개)
+    if isinstance(queries, str):
+        queries = queries.split("|")
+    unique = OrderedDict()
+    for query in queries:
+        query = (query or "").strip()
+        if query:
+            unique.setdefault(normalize_query(query), query)
+    return list(unique.values())[:MAX_QUERIES]
+
+
+def _url_key(href):
+    parts = urlsplit(href or "")
+    host = parts.netloc.casefold().removeprefix("www.")
+    params = [p for p in parts.query.split("&") if p and not _TRACKING_PARAMS.match(p.split("=")[0])]
+    return f"{host}{parts.path.rstrip('/')}?{'&'.join(sorted(params))}"
+
+
+def _shingles(text):
+    words = normalize_query(text).split()
+    return {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))} if words else set()
+
+
+def merge_results(result_lists, limit=MAX_EVIDENCE_RESULTS):
+    # 질의별 순위를 번갈아 가며(라운드 로빈) 합치고, URL과 거의 같은 스니펫은 하나만 남긴다
+    merged, seen_urls, seen_snippets = [], set(), []
+    for rank in range(max((len(results) for results in result_lists), default=0)):
+        for results in result_lists:
+            if rank >= len(results) or len(merged) >= limit:
+                continue
+            res = results[rank]
+            url = _url_key(res.get("href", ""))
+            if url in seen_urls:
+                continue
+            shingles = _shingles(f"{res.get('title', '')} {res.get('body', '')}")
+            if any(shingles and len(shingles & other) / len(shingles | other) >= SNIPPET_DUP_THRESHOLD
+                   for other in seen_snippets):
+                continue
+            seen_urls.add(url)
+            seen_snippets.append(shingles)
+            merged.append(res)
+    return merged
+
+
+# 캐시에 없는 같은 질의를 여러 세션이 동시에 검색하면 먼저 시작한 쪽의 결과를 함께 기다린다 (프로세스 전역)
+_inflight = {}   # 캐시 키 -> Future (결과 리스트, 실패면 None)
+_inflight_lock = threading.Lock()
+
+
+def hedged_search(queries, max_results=3, deadline=SEARCH_DEADLINE, hedge_after=HEDGE_AFTER, gate=None):
+    """질의별 결과 리스트와 실패 메시지들을 돌려준다: (result_lists, errors)"""
+    cache = get_search_cache()
+    started = time.monotonic()
+    keys = [cache.make_key(query, max_results=max_results, backend="hedged") for query in queries]
+    result_lists, errors = [], []
+    pending = {}  # future -> 질의 번호
+    attempts = {}  # 질의 번호 -> 지금까지 보낸 백엔드 수
+    owned, shared = {}, {}  # 질의 번호 -> 이 호출이 맡은 / 다른 호출이 진행 중인 검색의 Future
+    for n, query in enumerate(queries):
+        cached = cache.get(keys[n])
+        result_lists.append(cached)
+        if cached is None:
+            with _inflight_lock:
+                future = _inflight.get(keys[n])
+                if future is None:
+                    owned[n] = _inflight[keys[n]] = Future()
+            if future is not None:
+                shared[n] = future
+                continue
+            pending[_SEARCH_POOL.submit(_gated_fetch, gate, query, HEDGE_BACKENDS[0], max_results)] = n
+            attempts[n] = 1
+
+    try:
+        while pending:
+            elapsed = time.monotonic() - started
+            if elapsed >= deadline:
+                errors.append(f"시간 초과 ({deadline:.0f}초)")
+                break
+            # 아직 헤지하지 않은 질의가 있으면 헤지 시점까지만, 아니면 데드라인까지 기다린다
+            unhedged = [n for n in set(pending.values()) if attempts[n] < 2 and result_lists[n] is None]
+            wake = hedge_after if unhedged and elapsed < hedge_after else deadline
+            done, _ = wait(pending, timeout=max(wake - elapsed, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                n = pending.pop(future)
+                if result_lists[n] is not None:
+                    continue  # 다른 백엔드가 이미 답함
+                try:
+                    results = future.result()
+                except Exception as e:
+                    errors.append(str(e))
+                    results = None
+                if results is not None:
+                    result_lists[n] = results
+                    if results:
+                        cache.put(keys[n], results)
+                    # 같은 질의의 남은 요청은 기다리지 않는다
+                    for other in [f for f, m in pending.items() if m == n]:
+                        other.cancel()
+                        del pending[other]
+                elif attempts[n] < len(HEDGE_BACKENDS) and n not in pending.values():
+                    # 실패했으면 다음 백엔드로 바로 재시도
+                    pending[_SEARCH_POOL.submit(_gated_fetch, gate, queries[n], HEDGE_BACKENDS[attempts[n]],
+                                                max_results)] = n
+                    attempts[n] += 1
+            if time.monotonic() - started >= hedge_after:
+                for n in unhedged:
+                    if result_lists[n] is None and attempts[n] < 2:
+                        pending[_SEARCH_POOL.submit(_gated_fetch, gate, queries[n], HEDGE_BACKENDS[1],
+                                                    max_results)] = n
+                        attempts[n] = 2
+    finally:
+        with _inflight_lock:
+            for n, future in owned.items():
+                del _inflight[keys[n]]
+        for n, future in owned.items():
+            future.set_result(result_lists[n])
+    for n, future in shared.items():
+        try:
+            result_lists[n] = future.result(timeout=max(deadline - (time.monotonic() - started), 0))
+        except FutureTimeout:
+            errors.append(f"시간 초과 ({deadline:.0f}초)")
+    return [results or [] for results in result_lists], errors
+
+
+# 검색 함수 (정규화된 질의 기준으로 캐시, 실패 응답은 캐시하지 않음)
+def search_web(queries, max_results=3, gate=None):
+    queries = split_queries(queries)
+    if not queries:
+        return None
+    result_lists, errors = hedged_search(queries, max_results=max_results, gate=gate)
+    merged = merge_results(result_lists)
+    if not merged:
+        if errors:
+            return f"검색 실패 (Error: {errors[-1]})"
+        return None
+
+    return "".join(
+        f"{i}. {res.get('title', '제목 없음')}: {res.get('body', '')} (Source: {res.get('href', '')})\n"
+        for i, res in enumerate(merged, 1)
+    )
+
+# 검색 판단 에이전트
+def get_search_query_if_needed(role, context, api_keys):
+    prompt = f"""
+    당신은 토론 참가자 '{role}'의 두뇌입니다.
+    현재 대화 맥락을 보고, 상대방을 논리적으로 압도하기 위해 '외부 정보(통계, 뉴스, 팩트)' 검색이 필요한지 판단하세요.
+    
+    [Context]
+    {context[-500:]} 
+    
+    [Rule]
+    - 검색이 필요하면: "SEARCH: [검색어]" 형식으로 출력 (예: SEARCH: 2024년 한국 경제 성장률 전망)
+    - 검색이 불필요하면: "PASS" 출력
+    - 검색어는 구체적이어야 함. 다른 각도의 검색어가 더 있으면 " | "로 구분해 최대 3개까지 (동시에 검색됨)
+    """
+    
+    try:
+        if api_keys['google']:
+            model = get_registry().gemini(api_keys['google'], 'gemini-2.5-pro')
+            res = model.generate_content(prompt)
+            return res.text.strip()
+        elif api_keys['openai']:
+            client = get_registry().openai(api_keys['openai'])
+            res = client.chat.completions.create(
+                model="gpt-5.1",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=50
+            )
+            return res.choices[0].message.content.strip()
+    except Exception as e:
+        log.warning("검색 판단 실패 (%s): %s", role, e)
+        return "PASS"
+    return "PASS"
+
+def decision_provider(api_keys):
+    # get_search_query_if_needed가 실제로 호출할 프로바이더 (레이트 리미터용)
+    if api_keys.get('google'):
+        return "gemini"
+    if api_keys.get('openai'):
+        return "openai"
+    return None
+
+def parse_search_decision(decision):
+    if "SEARCH:" not in decision:
+        return None
+    return decision.replace("SEARCH:", "").strip() or None
+
+# --------------------------------------------------------------------------
+# 로컬 휴리스틱 (모델 호출 없음)
+# --------------------------------------------------------------------------
+# 수치, 연도, 통계/연구 같은 사실 주장의 신호가 있을 때만 검색할 가치가 있다고 본다.
+_FACT_SIGNALS = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:%|퍼센트|배|억|조|만|달러|원|명|년)|(?:19|20)\d{2}|"
+    r"통계|데이터|연구|보고서|조사|사례|논문|발표|점유율|성장률|"
+    r"according to|study|survey|report|percent|billion|million",
+    re.IGNORECASE,
+)
+_SENTENCES = re.compile(r"(?<=[.!?。])\s+|\n+")
+_WORDS = re.compile(r"[가-힣A-Za-z0-9%.]{2,}")
+_STOPWORDS = {"그리고", "하지만", "그러나", "당신은", "당신의", "우리는", "그것은", "이것은", "있다", "없다",
+              "the", "and", "that", "this", "with", "your", "you", "are", "for"}
+HEURISTIC_QUERY_WORDS = 6
+
+
+def looks_searchable(context):
+    return bool(_FACT_SIGNALS.search(context[-1500:]))
+
+
+def heuristic_search_query(context):
+    # 사실 주장 신호가 많은 문장 (최대 2개)에서 핵심 단어 몇 개씩 뽑아 "질의1 | 질의2" 형태로 만든다
+    sentences = [s for s in _SENTENCES.split(context[-1500:]) if s.strip()]
+    scored = [(len(_FACT_SIGNALS.findall(s)), s) for s in sentences]
+    scored = sorted((item for item in scored if item[0]), key=lambda item: item[0], reverse=True)
+    queries = []
+    for _, sentence in scored[:2]:
+        words = [w.strip(".") for w in _WORDS.findall(sentence) if w.casefold() not in _STOPWORDS]
+        if words:
+            queries.append(" ".join(words[:HEURISTIC_QUERY_WORDS]))
+    return " | ".join(queries) or None